@@ -0,0 +1,88 @@
+# benchmarks/bench_adaptive_radius.py
+# Fixed full-radius Overpass query vs adaptive expanding rings, against the fake
+# Overpass server replaying the Lyon fixture.
+#
+#   python benchmarks/bench_adaptive_radius.py [--radius 20000] [--limit 5] [--start 1000] [--growth 2]
+#
+# The fixed path is the planner's single `around:radius` query (tile cache off,
+# so every query really goes to Overpass). Results must be identical for every
+# query (exit status 1 otherwise); the interesting numbers are the bytes and
+# elements each mode pulls from Overpass, and what the extra round trips cost.
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_overpass_server import FakeOverpassServer  # noqa: E402
+
+POINTS = [  # city centre, inner suburbs, outskirts, countryside edge of the fixture
+    (45.7640, 4.8357), (45.7578, 4.8320), (45.7485, 4.8467), (45.7797, 4.8522), (45.7700, 4.8800),
+    (45.7300, 4.8600), (45.6970, 4.8870), (45.8050, 4.7700), (45.7300, 4.9300), (45.6200, 4.7200),
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--radius", type=int, default=20000)
+    ap.add_argument("--limit", type=int, default=5)
+    ap.add_argument("--start", type=float, default=1000)
+    ap.add_argument("--growth", type=float, default=2.0)
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    args = ap.parse_args()
+
+    server = FakeOverpassServer(latency_ms=args.latency_ms).start()
+    os.environ.update({
+        "LOCATOR_OVERPASS_URL": server.url,
+        "LOCATOR_TILE_CACHE_SIZE": "0",
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+        "LOCATOR_GEOCODE_DB": os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"),
+        "LOCATOR_RATE_LIMIT": "0",  # the fakes are not rate limited; measure the code path itself
+        "LOCATOR_ADAPTIVE_START_M": str(args.start),
+        "LOCATOR_ADAPTIVE_GROWTH": str(args.growth),
+    })
+    import locator_service as loc
+
+    print(f"{len(POINTS)} points, radius {args.radius} m, limit {args.limit}, rings from {args.start:.0f} m x{args.growth:g}\n")
+    print(f"{'point':<20} {'fixed KiB':>9} {'ms':>6} | {'rings':>5} {'KiB':>7} {'elements':>8} {'ms':>6}  same radii")
+    totals = {"fixed_bytes": 0, "fixed_ms": 0.0, "adaptive_bytes": 0, "adaptive_ms": 0.0, "rings": 0}
+    mismatches = 0
+    for lat, lon in POINTS:
+        server.reset_stats()
+        start = time.perf_counter()
+        fixed = loc.find_pharmacies_overpass(lat, lon, radius=args.radius, limit=args.limit)
+        fixed_ms = (time.perf_counter() - start) * 1000
+        fixed_s = dict(server.stats)
+
+        server.reset_stats()
+        start = time.perf_counter()
+        adaptive, search = loc.find_pharmacies_adaptive(lat, lon, radius=args.radius, limit=args.limit)
+        adaptive_ms = (time.perf_counter() - start) * 1000
+        adaptive_bytes = sum(r["bytes"] for r in search["rings"])
+        adaptive_elements = sum(r["elements"] for r in search["rings"])
+
+        same = fixed == adaptive and search["exact"]
+        mismatches += not same
+        totals["fixed_bytes"] += fixed_s["bytes_sent"]
+        totals["fixed_ms"] += fixed_ms
+        totals["adaptive_bytes"] += adaptive_bytes
+        totals["adaptive_ms"] += adaptive_ms
+        totals["rings"] += len(search["rings"])
+        print(f"{lat:.4f},{lon:.4f}      {fixed_s['bytes_sent'] / 1024:9.1f} {fixed_ms:6.0f} | "
+              f"{len(search['rings']):5d} {adaptive_bytes / 1024:7.1f} {adaptive_elements:8d} {adaptive_ms:6.0f}  "
+              f"{'yes' if same else 'NO':<4} {[r['radius_m'] for r in search['rings']]}")
+    server.stop()
+
+    print(f"\nbytes from Overpass {totals['fixed_bytes'] / 1024:.1f} -> {totals['adaptive_bytes'] / 1024:.1f} KiB, "
+          f"mean rings {totals['rings'] / len(POINTS):.1f}, "
+          f"total latency {totals['fixed_ms']:.0f} -> {totals['adaptive_ms']:.0f} ms")
+    print(f"identical results: {len(POINTS) - mismatches}/{len(POINTS)}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/bench_autocomplete.py
+# Canonical geocode keys and the local autocomplete index, against the fake
+# Nominatim/Photon server.
+#
+#   python benchmarks/bench_autocomplete.py [--places 50000] [--queries 2000]
+#
+# "Spellings" geocodes groups of queries that name the same place ("Lahore",
+# "Lahore, Pakistan", "LAHORE (Pakistan)", full-width and unaccented forms...)
+# and counts upstream calls: the old strip().lower() key paid one per distinct
+# string, canonical keys one per place. Places that differ only by country
+# must still get their own geocode. "Autocomplete" fills a geocode store with
+# --places labelled entries, times loading them into the index at startup,
+# then times prefix queries of 1-8 characters. Exit status 1 when a check fails.
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_geocoder_server import FakeGeocoderServer  # noqa: E402
+
+SPELLINGS = [
+    ["Lahore", "Lahore, Pakistan", "LAHORE (Pakistan)", " lahore ,  PAKISTAN "],
+    ["Saint-Étienne", "saint etienne", "Saint Etienne, France", "SAINT-ÉTIENNE"],
+    ["Lyon", "lyon", "Ｌｙｏｎ", "Lyon, France", "LYON (France)"],
+    ["Bellecour, Lyon", "Lyon, Bellecour", "bellecour lyon", "Bellecour - Lyon, France"],
+    ["Gare de la Part-Dieu, Lyon", "gare de la part dieu lyon", "Lyon: Gare de la Part-Dieu"],
+]
+STREETS = ["Rue", "Avenue", "Boulevard", "Place", "Quai", "Chemin", "Impasse", "Allée", "Cours", "Route"]
+NAMES = ["Victor Hugo", "de la République", "Jean Jaurès", "Pasteur", "du Général de Gaulle", "Gambetta",
+         "Voltaire", "des Lilas", "de la Gare", "Émile Zola", "Saint-Martin", "des Écoles", "du Moulin",
+         "de Verdun", "Carnot", "Foch", "de l'Église", "du Stade", "des Tilleuls", "Paul Bert"]
+CITIES = ["Lyon", "Villeurbanne", "Vénissieux", "Bron", "Caluire-et-Cuire", "Écully", "Oullins", "Saint-Priest",
+          "Vaulx-en-Velin", "Décines", "Meyzieu", "Rillieux", "Tassin", "Givors", "Lahore", "Karachi", "Marseille",
+          "Paris", "Grenoble", "Annecy"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def synthetic_labels(n, rng):
+    labels = set()
+    while len(labels) < n:
+        labels.add(f"{rng.randint(1, 199)} {rng.choice(STREETS)} {rng.choice(NAMES)}, {rng.choice(CITIES)}")
+    return sorted(labels)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--places", type=int, default=50000)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args()
+
+    server = FakeGeocoderServer(nominatim_latency_ms=20, jitter_ms=0).start()
+    work = tempfile.mkdtemp()
+    os.environ.update({
+        "LOCATOR_NOMINATIM_URL": server.nominatim_url, "LOCATOR_PHOTON_URL": server.photon_url,
+        "LOCATOR_GEOCODE_DB": os.path.join(work, "geocode.sqlite3"),
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+        "LOCATOR_SNAPSHOT_PATH": os.path.join(work, "no-snapshot.bin"),
+        "LOCATOR_RATE_LIMIT": "0",
+    })
+    import locator_service as loc
+    from geocode_store import GeocodeStore
+    from place_search import PlaceIndex, canonical_key
+
+    # Spellings of one place
+    server.reset_stats()
+    answers = {}
+    for group in SPELLINGS:
+        answers[group[0]] = {loc.geocode_location(q)[:2] for q in group}
+    calls = server.stats["nominatim"] + server.stats["photon"]
+    old_calls = len({q.strip().lower() for group in SPELLINGS for q in group})
+    queries = sum(len(group) for group in SPELLINGS)
+    print(f"{queries} spellings of {len(SPELLINGS)} places: {old_calls} upstream calls with strip().lower() keys, "
+          f"{calls} with canonical keys")
+    for group in SPELLINGS:
+        print(f"  {canonical_key(group[0]):<28} <- {', '.join(repr(q) for q in group[1:])}")
+
+    valencia = loc.geocode_location("Valencia")[:2], loc.geocode_location("Valencia, Venezuela")[:2]
+    lahore = loc.geocode_location("Lahore")[:2], loc.geocode_location("Lahore, Pakistan")[:2]
+    print(f"Valencia {valencia[0]} vs Valencia, Venezuela {valencia[1]}")
+
+    # Autocomplete over a large store
+    rng = random.Random(7)
+    labels = synthetic_labels(args.places, rng)
+    store = GeocodeStore(os.path.join(work, "big.sqlite3"), max_entries=2 * args.places)
+    for i, label in enumerate(labels):
+        store.put(canonical_key(label), 45.0 + i * 1e-5, 4.8, {"display_name": f"{label}, France"}, label=label)
+    start = time.perf_counter()
+    index = PlaceIndex()
+    index.load((k, label, lat, lon, meta) for k, label, lat, lon, meta in store.entries() if label)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    by_len = {}
+    for _ in range(args.queries):
+        label = rng.choice(labels)
+        words = label.split()
+        # Typing the street name, or the city and then the street, a few characters in
+        text = " ".join(words[1:]) if rng.random() < 0.5 else f"{words[-1]} {words[1]}"
+        n = rng.randint(1, 8)
+        prefix = text[:n]
+        start = time.perf_counter()
+        index.suggest(prefix, 5)
+        by_len.setdefault(n, []).append((time.perf_counter() - start) * 1e6)
+    all_us = [us for v in by_len.values() for us in v]
+    print(f"\nautocomplete over {len(index)} places ({index.stats()['tokens']} tokens): loaded from the store in "
+          f"{load_ms:.0f}ms")
+    for n in sorted(by_len):
+        print(f"  {n} chars: p50 {percentile(by_len[n], 0.5):6.1f}us  p99 {percentile(by_len[n], 0.99):7.1f}us")
+    print(f"  all:     p50 {percentile(all_us, 0.5):6.1f}us  p95 {percentile(all_us, 0.95):6.1f}us  "
+          f"p99 {percentile(all_us, 0.99):7.1f}us  "
+          f"(truncated scans {index.stats()['truncated']})")
+
+    start = time.perf_counter()
+    index.add("new place", "Pharmacie du Nouveau Quartier, Lyon", 45.7, 4.8, {})
+    add_ms = (time.perf_counter() - start) * 1000
+    new = index.suggest("lyon nouv", 5)
+
+    # The endpoint, on the places geocoded above
+    server.reset_stats()
+    client = loc.app.test_client()
+    body = client.get("/locator/autocomplete?q=sain&limit=3").get_json()
+    lahore_hits = client.get("/locator/autocomplete?q=laho").get_json()["suggestions"]
+    print(f"\nadding one place to the big index: {add_ms:.2f}ms; "
+          f"GET /locator/autocomplete?q=sain -> {[s['label'] for s in body['suggestions']]}")
+    endpoint_calls = server.stats["nominatim"] + server.stats["photon"]
+    server.stop()
+
+    checks = {
+        "one upstream call per place, whatever the spelling": calls == len(SPELLINGS),
+        "every spelling got the same answer": all(len(v) == 1 for v in answers.values()),
+        "a different country is a different place": valencia[0] != valencia[1],
+        "the bare name reuses the country-qualified answer": lahore[0] == lahore[1],
+        "autocomplete p95 under 1ms": percentile(all_us, 0.95) < 1000,
+        "places added after startup are suggested": any(s["label"].startswith("Pharmacie du Nouveau") for s in new),
+        "endpoint answers without upstream calls": endpoint_calls == 0 and body["suggestions"] and lahore_hits,
+    }
+    print()
+    for name, ok in checks.items():
+        print(f"  {'ok ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
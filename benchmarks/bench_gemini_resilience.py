@@ -0,0 +1,85 @@
+# benchmarks/bench_gemini_resilience.py
+# Drives triageAgent against the local fake Gemini server under injected faults.
+#
+#   python benchmarks/bench_gemini_resilience.py [--requests 200] [--concurrency 16]
+#
+# Scenarios: healthy upstream, a slow tail with and without hedging, and a full
+# outage followed by recovery (breaker opens, fails fast, then half-open probe
+# closes it again). Prints latency percentiles, fallback counts and breaker state.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_gemini_server import FakeGeminiServer  # noqa: E402
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run(agent, label, n, concurrency, tag):
+    def one(i):
+        start = time.perf_counter()
+        result = agent.triage_text(f"sore throat and mild cough case {tag}-{i}")
+        return time.perf_counter() - start, result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        out = list(pool.map(one, range(n)))
+    wall = time.perf_counter() - start
+    lat = [t for t, _ in out]
+    fallbacks = sum(r["explanation"] == agent.UNAVAILABLE_RESPONSE["explanation"] for _, r in out)
+    breaker = agent.breaker_for(agent.MODEL_NAME).stats()
+    print(f"{label:<27} p50 {percentile(lat, .5)*1000:7.0f}ms  p95 {percentile(lat, .95)*1000:7.0f}ms  "
+          f"p99 {percentile(lat, .99)*1000:7.0f}ms  {n/wall:6.1f} req/s  fallbacks {fallbacks:4d}  "
+          f"breaker {breaker['state']:<9} hedges {agent.gemini_stats['hedges']} (won {agent.gemini_stats['hedge_wins']})")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+
+    server = FakeGeminiServer(latency_ms=80, jitter_ms=20, chunk_delay_ms=5).start()
+    os.environ.update({
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_API_ENDPOINT": server.url,
+        "TRIAGE_CACHE_SIZE": "0",
+        "GEMINI_TIMEOUT_S": "2",
+        "GEMINI_BREAKER_FAILURES": "5",
+        "GEMINI_BREAKER_RESET_S": "1",
+    })
+    import triageAgent as agent
+    agent.print = lambda *a, **k: None  # silence per-request debug output
+
+    run(agent, "healthy", args.requests, args.concurrency, "a")
+
+    server.update(slow_rate=0.1, slow_ms=1500)
+    run(agent, "slow tail, no hedge", args.requests, args.concurrency, "b")
+    agent.GEMINI_HEDGE = True
+    agent.GEMINI_HEDGE_DELAY_S = 0.2
+    run(agent, "slow tail, hedge 200ms", args.requests, args.concurrency, "c")
+    agent.GEMINI_HEDGE = False
+    server.update(slow_rate=0.0)
+
+    server.update(error_rate=1.0)
+    run(agent, "outage", args.requests, args.concurrency, "d")
+    server.update(error_rate=0.0)
+    time.sleep(1.1)
+    run(agent, "recovery (half-open probe)", args.requests, args.concurrency, "e")
+    run(agent, "recovered", args.requests, args.concurrency, "f")
+
+    print("\nfake server:", server.stats)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
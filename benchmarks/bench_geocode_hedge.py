@@ -0,0 +1,126 @@
+# benchmarks/bench_geocode_hedge.py
+# Geocoding through locator_service against the fake Nominatim/Photon servers.
+#
+#   python benchmarks/bench_geocode_hedge.py [--requests 200] [--concurrency 8] [--hedge-delay 0.3]
+#
+# Compares the old per-call requests.get path (new TCP connection per call,
+# Photon only after Nominatim fails) with pooled sessions, sequential and in race
+# mode, under a healthy upstream, a slow Nominatim tail, and a Nominatim that
+# hangs until its timeout. Every location is unique, so the geocode cache never answers.
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_geocoder_server import FakeGeocoderServer  # noqa: E402
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def legacy_geocode(loc, location):
+    """The pre-session geocode path: bare requests.get, Photon only after Nominatim fails."""
+    try:
+        r = requests.get(loc.NOMINATIM_URL, params={"q": location, "format": "jsonv2", "limit": 1},
+                         headers=loc.HEADERS, timeout=loc.NOMINATIM_TIMEOUT_S)
+        r.raise_for_status()
+        data = r.json()
+        if data:
+            return float(data[0]["lat"]), float(data[0]["lon"]), data[0]
+    except Exception:
+        pass
+    try:
+        r = requests.get(loc.PHOTON_URL, params={"q": location, "limit": 1}, headers=loc.HEADERS,
+                         timeout=loc.PHOTON_TIMEOUT_S)
+        r.raise_for_status()
+        hit = (r.json().get("features") or [None])[0]
+        if hit:
+            lon, lat = hit["geometry"]["coordinates"][:2]
+            return lat, lon, hit["properties"]
+    except Exception:
+        pass
+    return None
+
+
+def run(server, label, fn, n, concurrency, tag):
+    server.reset_stats()
+
+    def one(i):
+        start = time.perf_counter()
+        result = fn(f"Town {tag}-{i}")
+        return time.perf_counter() - start, result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        out = list(pool.map(one, range(n)))
+    wall = time.perf_counter() - start
+    lat = [t for t, _ in out]
+    failed = sum(r is None for _, r in out)
+    s = server.stats
+    print(f"{label:<34} p50 {percentile(lat, .5) * 1000:6.0f}ms  p95 {percentile(lat, .95) * 1000:6.0f}ms  "
+          f"p99 {percentile(lat, .99) * 1000:6.0f}ms  {n / wall:6.1f} req/s  failed {failed:3d}  "
+          f"connections {s['connections']:4d}  photon calls {s['photon']:4d}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--hedge-delay", type=float, default=0.3)
+    args = ap.parse_args()
+
+    server = FakeGeocoderServer().start()
+    os.environ.update({
+        "LOCATOR_NOMINATIM_URL": server.nominatim_url,
+        "LOCATOR_PHOTON_URL": server.photon_url,
+        "LOCATOR_NOMINATIM_TIMEOUT_S": "3",
+        "LOCATOR_GEOCODE_DB": os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"),
+        "LOCATOR_RATE_LIMIT": "0",  # the fakes are not rate limited; measure the code path itself
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+    })
+    import locator_service as loc
+    loc.print = lambda *a, **k: None  # silence per-call upstream errors
+    loc.GEOCODE_HEDGE_DELAY_S = args.hedge_delay
+    n, c = args.requests, args.concurrency
+
+    def sequential(location):
+        loc.GEOCODE_HEDGE = False
+        return loc.geocode_location(location)
+
+    def race(location):
+        loc.GEOCODE_HEDGE = True
+        return loc.geocode_location(location)
+
+    print(f"{n} unique locations, concurrency {c}, hedge delay {args.hedge_delay * 1000:.0f}ms, "
+          f"Nominatim timeout {loc.NOMINATIM_TIMEOUT_S:.0f}s\n")
+    print("healthy upstreams")
+    run(server, "  requests.get per call (old)", lambda q: legacy_geocode(loc, q), n, c, "a")
+    run(server, "  pooled sessions", sequential, n, c, "b")
+    run(server, "  pooled sessions, race", race, n, c, "c")
+
+    server.update(nominatim_slow_rate=0.1, nominatim_slow_ms=2500)
+    print("Nominatim slow tail (10% at 2.5s)")
+    run(server, "  pooled sessions", sequential, n, c, "d")
+    run(server, "  pooled sessions, race", race, n, c, "e")
+
+    server.update(nominatim_slow_rate=1.0, nominatim_slow_ms=5000)
+    print("Nominatim hanging past its timeout")
+    run(server, "  pooled sessions", sequential, n // 4, c, "f")
+    run(server, "  pooled sessions, race", race, n // 4, c, "g")
+
+    print("\nupstream stats:", loc.geocode_stats)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
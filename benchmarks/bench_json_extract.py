@@ -0,0 +1,80 @@
+# benchmarks/bench_json_extract.py
+# Correctness and speed of model-output JSON extraction over a recorded corpus.
+#
+#   python benchmarks/bench_json_extract.py [--corpus benchmarks/fixtures/model_outputs.jsonl] [--repeat 200]
+#
+# Every corpus line is {"name", "output", "expected"}. The incremental extractor
+# must reproduce `expected` for every case (exit status 1 otherwise); the old
+# greedy-regex extractor is shown alongside for comparison. "stop at" is how
+# much of the output a streaming caller has to read before the object closes.
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from json_extract import IncrementalJSONExtractor, extract_json_object  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "fixtures" / "model_outputs.jsonl"
+
+
+def legacy_extract(text: str):
+    match = re.search(r'\{.*\}', text, re.S)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except Exception:
+            pass
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+def streamed_stop(text: str, chunk: int = 8):
+    ex = IncrementalJSONExtractor()
+    for i in range(0, len(text), chunk):
+        if ex.feed(text[i:i + chunk]) is not None:
+            return min(i + chunk, len(text))
+    return len(text)
+
+
+def time_us(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    legacy_ok = 0
+    print(f"{'case':<26} {'legacy':>6} {'new':>4} {'legacy us':>10} {'new us':>8} {'stop at':>12}")
+    for case in cases:
+        text, expected = case["output"], case["expected"]
+        got_legacy = legacy_extract(text)
+        got_new = extract_json_object(text)
+        ok_legacy = got_legacy == expected
+        ok_new = got_new == expected
+        legacy_ok += ok_legacy
+        failures += not ok_new
+        print(f"{case['name']:<26} {'ok' if ok_legacy else 'FAIL':>6} {'ok' if ok_new else 'FAIL':>4} "
+              f"{time_us(legacy_extract, text, args.repeat):>10.1f} {time_us(extract_json_object, text, args.repeat):>8.1f} "
+              f"{streamed_stop(text):>5}/{len(text):<6}")
+
+    print(f"\nlegacy: {legacy_ok}/{len(cases)} correct, incremental: {len(cases) - failures}/{len(cases)} correct")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_locator_batch.py
+# One /locator call per item vs locate_batch, against the fake geocoders and the
+# fake Overpass server.
+#
+#   python benchmarks/bench_locator_batch.py [--items 200] [--unique 60] [--radius 3000]
+#
+# Items mix repeated location strings with raw lat/lon points. Each mode starts
+# from an empty geocode store and tile cache and gets its own location strings,
+# so neither profits from the other's caches. The batch results are then checked
+# against per-item get_nearest_pharmacies (exit status 1 on any difference).
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_geocoder_server import FakeGeocoderServer  # noqa: E402
+from fake_overpass_server import FakeOverpassServer  # noqa: E402
+
+
+def make_items(tag, n, unique, seed=5):
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        if rng.random() < 0.2:
+            items.append({"id": i, "lat": round(45.70 + rng.random() * 0.12, 5), "lon": round(4.78 + rng.random() * 0.14, 5)})
+        else:
+            items.append({"id": i, "location": f"Quartier {tag}-{rng.randrange(unique)}"})
+    return items
+
+
+def serial(loc, items, radius, limit):
+    out = []
+    for item in items:
+        if "location" in item:
+            out.append(loc.get_nearest_pharmacies("", item["location"], radius_m=radius, limit=limit)["results"])
+        else:
+            out.append(loc.find_pharmacies_overpass(item["lat"], item["lon"], radius=radius, limit=limit))
+    return out
+
+
+def fresh_caches(loc, use_tiles):
+    loc.geocode_store = loc.GeocodeStore(os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"))
+    loc.tile_cache = loc.TileCache(loc._fetch_overpass) if use_tiles else None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=200)
+    ap.add_argument("--unique", type=int, default=60)
+    ap.add_argument("--radius", type=int, default=3000)
+    ap.add_argument("--limit", type=int, default=5)
+    args = ap.parse_args()
+
+    geocoder = FakeGeocoderServer().start()
+    overpass = FakeOverpassServer().start()
+    os.environ.update({
+        "LOCATOR_NOMINATIM_URL": geocoder.nominatim_url,
+        "LOCATOR_PHOTON_URL": geocoder.photon_url,
+        "LOCATOR_OVERPASS_URL": overpass.url,
+        "LOCATOR_GEOCODE_DB": os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"),
+        "LOCATOR_RATE_LIMIT": "0",  # the fakes are not rate limited; measure the code path itself
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+    })
+    import locator_service as loc
+
+    print(f"{args.items} items ({args.unique} distinct locations + raw points), radius {args.radius} m, limit {args.limit}\n")
+    failed = False
+    for use_tiles in (True, False):
+        print("tile cache on" if use_tiles else "tile cache off")
+        runs = {}
+        for label, tag in (("per-item /locator", "s"), ("locate_batch", "b")):
+            items = make_items(tag + str(use_tiles), args.items, args.unique)
+            fresh_caches(loc, use_tiles)
+            geocoder.reset_stats()
+            overpass.reset_stats()
+            start = time.perf_counter()
+            if label == "locate_batch":
+                out = loc.locate_batch(items, radius_m=args.radius, limit=args.limit)
+                got = [item["results"] for item in out["items"]]
+            else:
+                got = serial(loc, items, args.radius, args.limit)
+            wall = time.perf_counter() - start
+            runs[label] = (items, got)
+            g, o = geocoder.stats, overpass.stats
+            print(f"  {label:<18} {wall * 1000:8.0f}ms  geocoder calls {g['nominatim'] + g['photon']:4d}  "
+                  f"overpass requests {o['requests']:4d}  area scans {o['statements']:4d}")
+
+        items, got = runs["locate_batch"]
+        expected = serial(loc, items, args.radius, args.limit)  # warm geocode store, same coordinates
+        same = sum(a == b for a, b in zip(got, expected))
+        failed = failed or same != len(items)
+        print(f"  identical per-item results: {same}/{len(items)}\n")
+
+    geocoder.stop()
+    overpass.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
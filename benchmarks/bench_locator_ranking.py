@@ -0,0 +1,105 @@
+# benchmarks/bench_locator_ranking.py
+# Scalar vs vectorized contact-first ranking over synthetic candidate sets.
+#
+#   python benchmarks/bench_locator_ranking.py [--sizes 10000 30000 100000] [--limit 5] [--repeat 5]
+#
+# "scalar" is the per-element path: full record + haversine_m for every element,
+# then a full sort. "elements" is _rank_elements (NumPy distances over raw
+# Overpass elements, records built for the winners only). "arrays" is
+# nearest_contact_first on coordinates that are already arrays, as the tile
+# cache and offline index hold them. Results must match (exit status 1 otherwise).
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("LOCATOR_GEOCODE_DB", os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"))
+os.environ.setdefault("LOCATOR_RATE_LIMIT", "0")
+os.environ.setdefault("LOCATOR_INDEX_PATH", str(ROOT / "benchmarks" / "no-such-index.json"))
+import locator_service  # noqa: E402
+from pharmacy_index import (element_position, element_record, has_contact, haversine_m,  # noqa: E402
+                            nearest_contact_first, rank_contact_first)
+
+CENTER = (45.7640, 4.8357)
+
+
+def synthetic_elements(n: int, radius_m: float, seed: int = 7):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        r = radius_m * math.sqrt(rng.random())
+        th = rng.random() * 2 * math.pi
+        lat = CENTER[0] + r * math.cos(th) / 111320
+        lon = CENTER[1] + r * math.sin(th) / (111320 * math.cos(math.radians(CENTER[0])))
+        tags = {"amenity": "pharmacy", "name": f"Pharmacie {i}", "addr:street": "Rue Garibaldi",
+                "addr:housenumber": str(i % 200), "addr:city": "Lyon", "addr:postcode": "69003"}
+        if rng.random() < 0.4:
+            tags["phone"] = f"+33 4 {i:08d}"
+        if rng.random() < 0.5:
+            tags["opening_hours"] = "Mo-Sa 09:00-19:30"
+        if rng.random() < 0.85:
+            out.append({"type": "node", "id": i, "lat": lat, "lon": lon, "tags": tags})
+        else:
+            out.append({"type": "way", "id": i, "center": {"lat": lat, "lon": lon}, "tags": tags})
+    return out
+
+
+def scalar_rank(elements, lat, lon, limit):
+    candidates = []
+    for elem in elements:
+        record = element_record(elem)
+        if record is not None:
+            candidates.append((haversine_m(lat, lon, record["lat"], record["lon"]),
+                               has_contact(elem.get("tags") or {}), record))
+    return rank_contact_first(candidates, limit)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000])
+    ap.add_argument("--limit", type=int, default=5)
+    ap.add_argument("--radius", type=float, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    lat, lon = CENTER[0] + 0.01, CENTER[1] - 0.02
+    failed = False
+    print(f"{'candidates':>10} {'scalar':>10} {'elements':>10} {'arrays':>10} {'speedup':>8} {'(arrays)':>9}  match")
+    for n in args.sizes:
+        elements = synthetic_elements(n, args.radius)
+        records = [element_record(e) for e in elements]
+        pos = [element_position(e) for e in elements]
+        lats = np.array([p[0] for p in pos])
+        lons = np.array([p[1] for p in pos])
+        contact = np.array([has_contact(e["tags"]) for e in elements])
+
+        ref, t_scalar = timed(lambda: scalar_rank(elements, lat, lon, args.limit), args.repeat)
+        via_elements, t_elements = timed(lambda: locator_service._rank_elements(elements, lat, lon, args.limit), args.repeat)
+        via_arrays, t_arrays = timed(lambda: nearest_contact_first(lat, lon, lats, lons, contact, records.__getitem__,
+                                                                   args.limit), args.repeat)
+        ok = ref == via_elements == via_arrays
+        failed = failed or not ok
+        print(f"{n:>10} {t_scalar:>8.1f}ms {t_elements:>8.1f}ms {t_arrays:>8.2f}ms {t_scalar / t_elements:>7.1f}x "
+              f"{t_scalar / t_arrays:>8.0f}x  {'yes' if ok else 'NO'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
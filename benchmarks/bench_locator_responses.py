@@ -0,0 +1,101 @@
+# benchmarks/bench_locator_responses.py
+# Response size and serialization time of /locator per output mode.
+#
+#   python benchmarks/bench_locator_responses.py [--limits 5 50] [--repeat 300]
+#
+# Geocoding and the pharmacy lookup are replaced by fixed answers (a full
+# Nominatim jsonv2 item with addressdetails/extratags, and the nearest
+# pharmacies from the Lyon fixture), so only shaping, encoding and Flask's
+# response handling are timed. "encode" is the JSON encoder alone on the
+# response object; "request" is a whole test-client round trip.
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("LOCATOR_GEOCODE_DB", os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"))
+os.environ.setdefault("LOCATOR_RATE_LIMIT", "0")
+os.environ.setdefault("LOCATOR_INDEX_PATH", str(ROOT / "benchmarks" / "no-such-index.json"))
+import locator_service as loc  # noqa: E402
+
+FIXTURE = ROOT / "benchmarks" / "fixtures" / "overpass_pharmacies_lyon.json"
+LAT, LON = 45.7578137, 4.8320114
+GEOCODE = {
+    "place_id": 88066702, "licence": "Data © OpenStreetMap contributors, ODbL 1.0. http://osm.org/copyright",
+    "osm_type": "relation", "osm_id": 120965, "lat": str(LAT), "lon": str(LON), "category": "boundary",
+    "type": "administrative", "place_rank": 12, "importance": 0.7868, "addresstype": "city", "name": "Lyon",
+    "display_name": "Lyon, Métropole de Lyon, Rhône, Auvergne-Rhône-Alpes, France métropolitaine, France",
+    "address": {"city": "Lyon", "municipality": "Lyon", "county": "Métropole de Lyon", "state_district": "Rhône",
+                "ISO3166-2-lvl6": "FR-69M", "state": "Auvergne-Rhône-Alpes", "ISO3166-2-lvl4": "FR-ARA",
+                "region": "France métropolitaine", "country": "France", "country_code": "fr"},
+    "extratags": {"wikidata": "Q456", "wikipedia": "fr:Lyon", "population": "522250", "linked_place": "city",
+                  "ref:INSEE": "69123", "website": "https://www.lyon.fr/", "capital": "6", "postal_code": "69001;69002;69003",
+                  "population:date": "2021", "source:population": "INSEE 2024"},
+    "boundingbox": ["45.7073666", "45.8082628", "4.7718134", "4.8983774"],
+}
+MODES = [  # label, format, payload extras
+    ("json", "json", {}),
+    ("json, compact", "json", {"compact": True}),
+    ("json, fields", "json", {"fields": "name,lat,lon,distance_m,phone,opening_hours"}),
+    ("ndjson", "ndjson", {}),
+    ("ndjson, compact", "ndjson", {"compact": True}),
+    ("pretty", "pretty", {}),
+]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limits", type=int, nargs="+", default=[5, 50])
+    ap.add_argument("--repeat", type=int, default=300)
+    args = ap.parse_args()
+
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        elements = json.load(f)["elements"]
+    loc.geocode_location = lambda text: (LAT, LON, GEOCODE)
+    client = loc.app.test_client()
+    encoders = ["json"] + (["orjson"] if loc.orjson is not None else [])
+    if loc.orjson is None:
+        print("orjson not installed; only the jsonify path is measured")
+
+    for limit in args.limits:
+        results = loc._rank_elements(elements, LAT, LON, limit)
+        loc.find_pharmacies_overpass = lambda lat, lon, radius=0, limit=0, _r=results, **_: _r
+        print(f"\nlimit {limit}")
+        print(f"  {'mode':<18} {'encoder':<7} {'bytes':>7} {'gzip':>6} {'encode':>9} {'request':>9}")
+        for label, fmt, extra in MODES:
+            payload = dict({"location": "Lyon", "limit": limit, "format": fmt}, **extra)
+            for encoder in encoders if fmt != "pretty" else ["-"]:
+                loc.JSON_ENCODER = encoder
+                body = client.post("/locator", json=payload).data
+                encode_us = ""
+                if fmt == "json":
+                    shaped = loc.shape_output(loc.get_nearest_pharmacies("", "Lyon", limit=limit),
+                                              loc.parse_fields(extra.get("fields")), extra.get("compact", False))
+                    if encoder == "json":
+                        with loc.app.app_context():
+                            us = best_of(lambda: loc.jsonify(shaped), args.repeat)
+                    else:
+                        us = best_of(lambda: loc.dumps_json(shaped), args.repeat)
+                    encode_us = f"{us:7.1f}us"
+                request_us = best_of(lambda: client.post("/locator", json=payload).data, max(20, args.repeat // 10))
+                print(f"  {label:<18} {encoder:<7} {len(body):7d} {len(gzip.compress(body)):6d} {encode_us:>9} "
+                      f"{request_us:7.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# benchmarks/bench_locator_suite.py
+# Locator benchmark suite against recorded upstream responses (replay_server),
+# with results written as JSON so runs can be compared across commits.
+#
+#   python benchmarks/bench_locator_suite.py [--concurrency 1 4 16] [--requests 300] [--out FILE] [--compare FILE]
+#
+# Drives get_nearest_pharmacies in-process and POST /locator over HTTP (the
+# Flask app on a threaded local server) with 1, 4, 16... concurrent clients.
+# Each run starts from an empty geocode store and tile cache and is repeated
+# (--repeat), keeping the median by throughput. Queries are the recorded places
+# drawn with a Zipf-like skew, so popular places repeat as in real traffic.
+# Per run it reports:
+# - p50/p95/p99 latency and throughput
+# - upstream calls per server, plus replay misses (places the recording lacks)
+# - geocode and tile cache hit ratios
+#
+# Results go to benchmarks/results/locator_suite-<commit>.json unless --out is
+# given. --compare OLD prints the change against an earlier result file and
+# exits 1 on a regression beyond --threshold: slower p95, lower throughput or
+# more upstream calls. Failed requests also exit 1. Upstream latency comes from
+# the replay profile, so compare runs made with the same options.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from replay_server import DEFAULT_POOL, DEFAULT_PROFILE, DEFAULT_RECORDING, ReplayServer  # noqa: E402
+
+FORMAT_VERSION = 1
+MIN_CHANGE_MS = 5.0  # p95 changes below this are noise, whatever the ratio
+GEOCODE_STATS = ("nominatim", "photon", "failed", "rate_limited")  # lookups that went upstream
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def workload(places, n, skew, seed=11):
+    """`n` queries over `places`, rank r drawn with weight 1 / r**skew."""
+    rng = random.Random(seed)
+    weights = [1.0 / (r + 1) ** skew for r in range(len(places))]
+    return rng.choices(places, weights=weights, k=n)
+
+
+def reset_caches(loc, work):
+    # A fresh worker's caches: empty geocode store and tile cache
+    from geocode_store import GeocodeStore
+    from tile_cache import TileCache
+    path = tempfile.mkstemp(suffix=".sqlite3", dir=work)[1]
+    loc.geocode_store = GeocodeStore(path, ttl_s=loc.GEOCODE_TTL_S, max_entries=loc.GEOCODE_MAX_ENTRIES)
+    if loc.tile_cache is not None:
+        loc.tile_cache = TileCache(lambda q: loc._fetch_overpass(q), ttl_s=loc.TILE_TTL_S, max_tiles=loc.TILE_CACHE_SIZE)
+
+
+def call_function(loc, args):
+    def call(query):
+        out = loc.get_nearest_pharmacies("", query, radius_m=args.radius, limit=args.limit)
+        return out.get("status") == "ok" and bool(out.get("results"))
+    return call
+
+
+def call_endpoint(url, args):
+    local = threading.local()
+
+    def call(query):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        r = session.post(url, json={"location": query, "radius_m": args.radius, "limit": args.limit}, timeout=60)
+        return r.status_code == 200 and r.json().get("status") == "ok" and bool(r.json().get("results"))
+    return call
+
+
+def run(loc, server, target, call, queries, concurrency, work):
+    reset_caches(loc, work)
+    server.reset_stats()
+    geo_before = {k: loc.geocode_stats[k] for k in GEOCODE_STATS}
+    flight_before = loc._geocode_flight.stats()
+    latencies, failures = [], []
+
+    def one(query):
+        start = time.perf_counter()
+        try:
+            ok = call(query)
+        except Exception as e:
+            ok = False
+            failures.append(repr(e))
+        latencies.append((time.perf_counter() - start) * 1000)
+        return ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        oks = list(pool.map(one, queries))
+    elapsed = time.perf_counter() - start
+
+    upstream_geocodes = sum(loc.geocode_stats[k] - geo_before[k] for k in GEOCODE_STATS)
+    flight = loc._geocode_flight.stats()
+    tiles = loc.tile_cache.stats() if loc.tile_cache is not None else {}
+    stats = dict(server.stats)
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": oks.count(False),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(queries) / elapsed, 2),
+        "latency_ms": {"p50": round(percentile(latencies, 0.5), 2), "p95": round(percentile(latencies, 0.95), 2),
+                       "p99": round(percentile(latencies, 0.99), 2), "max": round(max(latencies), 2),
+                       "mean": round(sum(latencies) / len(latencies), 2)},
+        "upstream": {"nominatim": stats["nominatim"], "photon": stats["photon"], "overpass": stats["overpass"],
+                     "total": stats["nominatim"] + stats["photon"] + stats["overpass"],
+                     "replay_misses": stats["missed"], "overpass_evaluated": stats["evaluated"]},
+        "cache": {"geocode_hit_ratio": round(1 - upstream_geocodes / len(queries), 4),
+                  "geocode_coalesced": {k: flight[k] - flight_before.get(k, 0) for k in ("leaders", "deduplicated")},
+                  "tile_hit_ratio": tiles.get("tile_hit_ratio"),
+                  "overpass_avoided_ratio": tiles.get("hit_ratio")},
+        "failures": sorted(set(failures))[:5],
+    }
+
+
+def print_run(r):
+    lat, up, cache = r["latency_ms"], r["upstream"], r["cache"]
+    tile = "-" if cache["tile_hit_ratio"] is None else f"{cache['tile_hit_ratio']:.2f}"
+    print(f"{r['target']:<9} x{r['concurrency']:<3} p50 {lat['p50']:8.1f}  p95 {lat['p95']:8.1f}  p99 {lat['p99']:8.1f} ms  "
+          f"{r['throughput_rps']:7.1f} req/s  errors {r['errors']:3d}  upstream nom {up['nominatim']:3d} "
+          f"photon {up['photon']:3d} overpass {up['overpass']:4d}  hit geocode {cache['geocode_hit_ratio']:.2f} tile {tile}")
+
+
+def compare(old, new, threshold):
+    """Lines describing changes from `old` to `new` results, and whether any is a regression."""
+    before = {(r["target"], r["concurrency"]): r for r in old["runs"]}
+    lines, regressed = [], False
+    for r in new["runs"]:
+        o = before.get((r["target"], r["concurrency"]))
+        if o is None:
+            continue
+        p95 = r["latency_ms"]["p95"] / o["latency_ms"]["p95"] - 1 if o["latency_ms"]["p95"] else 0.0
+        rps = r["throughput_rps"] / o["throughput_rps"] - 1 if o["throughput_rps"] else 0.0
+        calls = r["upstream"]["total"] - o["upstream"]["total"]
+        flags = []
+        if p95 > threshold and r["latency_ms"]["p95"] - o["latency_ms"]["p95"] > MIN_CHANGE_MS:
+            flags.append("p95")
+        if rps < -threshold:
+            flags.append("throughput")
+        if calls > max(1, threshold * o["upstream"]["total"]):  # concurrent runs vary by a call or two
+            flags.append("upstream calls")
+        regressed |= bool(flags)
+        lines.append(f"{r['target']:<9} x{r['concurrency']:<3} p95 {o['latency_ms']['p95']:8.1f} -> {r['latency_ms']['p95']:8.1f} ms "
+                     f"({p95:+6.1%})  throughput {rps:+6.1%}  upstream calls {calls:+d}"
+                     + (f"  REGRESSION: {', '.join(flags)}" if flags else ""))
+    return lines, regressed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--requests", type=int, default=300, help="requests per run")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per target and concurrency; the median is kept")
+    ap.add_argument("--targets", nargs="+", default=["function", "endpoint"], choices=["function", "endpoint"])
+    ap.add_argument("--radius", type=int, default=3000)
+    ap.add_argument("--limit", type=int, default=5)
+    ap.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the place mix")
+    ap.add_argument("--recording", default=str(DEFAULT_RECORDING))
+    ap.add_argument("--overpass-pool", default=str(DEFAULT_POOL))
+    ap.add_argument("--rate-limit", action="store_true", help="keep the upstream rate limits on (off by default)")
+    for key, value in DEFAULT_PROFILE.items():
+        ap.add_argument("--" + key.replace("_", "-"), type=float, default=value)
+    ap.add_argument("--out", help="result file (default benchmarks/results/locator_suite-<commit>.json)")
+    ap.add_argument("--compare", help="earlier result file to compare against")
+    ap.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression")
+    args = ap.parse_args()
+
+    profile = {k: getattr(args, k) for k in DEFAULT_PROFILE}
+    server = ReplayServer(args.recording, args.overpass_pool, **profile).start()
+    work = tempfile.mkdtemp()
+    os.environ.update({
+        "LOCATOR_NOMINATIM_URL": server.nominatim_url, "LOCATOR_PHOTON_URL": server.photon_url,
+        "LOCATOR_OVERPASS_URL": server.overpass_url,
+        "LOCATOR_CACHE_PATH": os.path.join(work, "no-legacy-cache.json"),
+        "LOCATOR_GEOCODE_DB": os.path.join(work, "geocode.sqlite3"),
+        "LOCATOR_INDEX_PATH": os.path.join(work, "no-index.json"),
+        "LOCATOR_SNAPSHOT_PATH": os.path.join(work, "no-snapshot.bin"),
+        "LOCATOR_WARMUP_AREAS": "",
+        "LOCATOR_RATE_LIMIT": "1" if args.rate_limit else "0",
+        "LOCATOR_RATE_LIMIT_DB": os.path.join(work, "ratelimit.sqlite3"),
+    })
+    import locator_service as loc
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    httpd = make_server("127.0.0.1", 0, loc.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{httpd.server_port}/locator"
+
+    places = server.queries("nominatim")
+    queries = workload(places, args.requests, args.skew)
+    print(f"{len(server)} recorded exchanges, {len(places)} places, {args.requests} requests per run "
+          f"({len(set(queries))} distinct), radius {args.radius} m; upstream latency nominatim {args.nominatim_ms:.0f}ms "
+          f"photon {args.photon_ms:.0f}ms overpass {args.overpass_ms:.0f}+{args.statement_ms:.0f}ms/scan\n")
+    callers = {"function": call_function(loc, args), "endpoint": call_endpoint(endpoint, args)}
+    runs = []
+    for target in args.targets:
+        for concurrency in args.concurrency:
+            # Cold-start runs are short and their tail is a few slow upstream calls; keep the median of --repeat
+            tries = sorted((run(loc, server, target, callers[target], queries, concurrency, work)
+                            for _ in range(args.repeat)), key=lambda r: r["throughput_rps"])
+            runs.append(dict(tries[len(tries) // 2], repeats=args.repeat))
+            print_run(runs[-1])
+    httpd.shutdown()
+    server.stop()
+
+    git = git_info()
+    result = {
+        "suite": "locator",
+        "format": FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git,
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "requests": args.requests, "repeat": args.repeat, "concurrency": args.concurrency, "radius_m": args.radius, "limit": args.limit,
+            "skew": args.skew, "distinct_queries": len(set(queries)), "recording": Path(args.recording).name,
+            "replay_profile": profile, "rate_limit": args.rate_limit, "search_mode": loc.SEARCH_MODE,
+            "tile_cache_size": loc.TILE_CACHE_SIZE, "geocode_hedge": loc.GEOCODE_HEDGE,
+        },
+        "runs": runs,
+    }
+    out = Path(args.out) if args.out else ROOT / "benchmarks" / "results" / f"locator_suite-{(git['commit'] or 'unknown')[:10]}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"\nresults written to {out}")
+
+    errors = sum(r["errors"] for r in runs)
+    misses = sum(r["upstream"]["replay_misses"] for r in runs)
+    if errors or misses:
+        print(f"{errors} failed requests, {misses} geocodes missing from the recording")
+    regressed = False
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"\ncompared with {args.compare} ({old['git'].get('commit', '')[:10]}, {old['created']}):")
+        if old.get("config", {}).get("replay_profile") != profile:
+            print("  note: different replay latency profile, latencies are not comparable")
+        lines, regressed = compare(old, result, args.threshold)
+        for line in lines:
+            print("  " + line)
+    sys.exit(1 if errors or regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_opening_hours.py
+# opening_hours compilation and open-at filtering over a corpus of OSM values.
+#
+#   python benchmarks/bench_opening_hours.py [--candidates 20000] [--repeat 5]
+#
+# The corpus (fixtures/opening_hours_pharmacies.tsv) is expanded by its counts
+# and shuffled, so repeats are as frequent as in real extracts. Reported:
+# coverage (how many values compile), cold compile cost per distinct value,
+# per-value evaluation without and with the compile cache, open_mask over a
+# candidate set, and the cost the open filter adds to ranking. A few hand-checked
+# cases must evaluate as expected (exit status 1 otherwise).
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from opening_hours import compile_opening_hours, is_open, open_mask  # noqa: E402
+from pharmacy_index import nearest_contact_first  # noqa: E402
+
+CORPUS = ROOT / "benchmarks" / "fixtures" / "opening_hours_pharmacies.tsv"
+CHECKS = [  # (value, local time, expected)
+    ("Mo-Sa 09:00-19:30", datetime(2026, 10, 17, 19, 29), True),  # Saturday
+    ("Mo-Sa 09:00-19:30", datetime(2026, 10, 18, 10, 0), False),  # Sunday
+    ("Mo-Fr 09:00-12:30,14:00-19:30; Sa 09:00-12:30", datetime(2026, 10, 16, 13, 0), False),
+    ("Mo-Fr 09:00-12:30,14:00-19:30; Sa 09:00-12:30", datetime(2026, 10, 16, 14, 0), True),
+    ("Mo 14:00-19:30; Tu-Sa 09:00-12:30,14:00-19:30", datetime(2026, 10, 19, 10, 0), False),  # Monday morning
+    ("Mo-Fr 09:00-19:00; We off", datetime(2026, 10, 14, 10, 0), False),
+    ("Fr-Sa 09:00-02:00; Su-Th 09:00-22:00", datetime(2026, 10, 18, 1, 30), True),  # Saturday's night
+    ("Fr-Sa 09:00-02:00; Su-Th 09:00-22:00", datetime(2026, 10, 19, 1, 30), False),  # Sunday's night
+    ("Su 20:00-02:00", datetime(2026, 10, 19, 1, 0), True),  # wraps into Monday
+    ("24/7", datetime(2026, 10, 18, 3, 0), True),
+    ("Mo-Sa 09:00-19:00; Su,PH 10:00-12:00", datetime(2026, 10, 18, 11, 0), True),
+    ("Mo-Fr 09:00-19:00, Sa 09:00-12:00", datetime(2026, 10, 17, 11, 0), True),
+    ("Mo-Fr 09:00-19:30; Sa 09:00-19:00; Dec 25 off", datetime(2026, 10, 17, 11, 0), None),  # dates: unknown
+    ("sunrise-sunset", datetime(2026, 10, 17, 11, 0), None),
+    (None, datetime(2026, 10, 17, 11, 0), None),
+]
+
+
+def load_corpus():
+    values = []
+    for line in CORPUS.read_text(encoding="utf-8").splitlines():
+        if not line or line.startswith("#"):
+            continue
+        value, count = line.rsplit("\t", 1)
+        values.append((value, int(count)))
+    return values
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--candidates", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    distinct = load_corpus()
+    corpus = [v for v, n in distinct for _ in range(n)]
+    random.Random(3).shuffle(corpus)
+    compile_raw = compile_opening_hours.__wrapped__
+    understood = {v for v, _ in distinct if compile_raw(v) is not None}
+    weighted = sum(n for v, n in distinct if v in understood) / len(corpus)
+    print(f"corpus: {len(corpus)} values, {len(distinct)} distinct; compiled {len(understood)}/{len(distinct)} distinct, "
+          f"{weighted:.1%} of all values (the rest evaluate as unknown)\n")
+
+    t = best_of(lambda: [compile_raw(v) for v, _ in distinct], args.repeat)
+    print(f"cold compile, per distinct value     {t / len(distinct) * 1e6:8.2f} us")
+
+    when = datetime(2026, 10, 16, 21, 30)  # a Friday evening
+    t_raw = best_of(lambda: [None if (h := compile_raw(v)) is None else h.is_open(when) for v in corpus[:5000]], 1)
+    t_cached = best_of(lambda: [is_open(v, when) for v in corpus], args.repeat)
+    print(f"is_open, parsing every value         {t_raw / 5000 * 1e6:8.2f} us/value")
+    print(f"is_open, compile cache               {t_cached / len(corpus) * 1e6:8.2f} us/value  "
+          f"({t_raw / 5000 / (t_cached / len(corpus)):.0f}x)")
+
+    values = (corpus * (args.candidates // len(corpus) + 1))[:args.candidates]
+    t_mask = best_of(lambda: open_mask(values, when), args.repeat)
+    mask = open_mask(values, when)
+    print(f"open_mask over {args.candidates} candidates      {t_mask * 1000:8.2f} ms  ({mask.mean():.1%} open at {when:%a %H:%M})")
+
+    rng = np.random.default_rng(5)
+    lats = 45.76 + rng.normal(0, 0.05, args.candidates)
+    lons = 4.84 + rng.normal(0, 0.07, args.candidates)
+    contact = rng.random(args.candidates) < 0.4
+    record_at = lambda i: {"name": f"p{i}", "lat": float(lats[i]), "lon": float(lons[i]), "osm_type": "node", "osm_id": i}  # noqa: E731
+    t_plain = best_of(lambda: nearest_contact_first(45.76, 4.84, lats, lons, contact, record_at, 5), args.repeat)
+    t_open = best_of(lambda: nearest_contact_first(45.76, 4.84, lats, lons, contact, record_at, 5,
+                                                   mask=open_mask(values, when)), args.repeat)
+    print(f"top-5 ranking of {args.candidates}: {t_plain * 1000:.2f} ms, with open filter {t_open * 1000:.2f} ms")
+
+    failed = [(v, w, e, is_open(v, w)) for v, w, e in CHECKS if is_open(v, w) != e]
+    for v, w, e, got in failed:
+        print(f"  CHECK FAILED {v!r} at {w:%a %H:%M}: expected {e}, got {got}")
+    print(f"\nchecks: {len(CHECKS) - len(failed)}/{len(CHECKS)} as expected")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_overpass_planner.py
+# Old two-query Overpass plan vs the single nwr query, against the fake Overpass
+# server replaying a recorded fixture.
+#
+#   python benchmarks/bench_overpass_planner.py [--latency-ms 150] [--statement-ms 20]
+#
+# The old plan sends 45 `around` statements (15 contact keys x node/way/relation)
+# and, when fewer than `limit` pharmacies have contact tags, a second request for
+# all pharmacies. The new plan sends one `nwr ... (around:...)` statement and ranks
+# in-process. Results must be identical for every query (exit status 1 otherwise).
+#
+# Query bytes always shrink. Response bytes shrink when the old plan needed its
+# second request (the contact set no longer comes back twice) and grow when the
+# contact set alone filled `limit`, since all pharmacies in range are returned.
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_overpass_server import FakeOverpassServer  # noqa: E402
+
+PHONE_KEYS = ["phone", "contact:phone", "telephone", "tel", "mobile", "contact:mobile"]
+EMAIL_KEYS = ["email", "contact:email", "e-mail"]
+WEBSITE_KEYS = ["website", "contact:website"]
+
+QUERIES = [  # (lat, lon, radius_m, limit) around the fixture's area
+    (45.7640, 4.8357, 1000, 5), (45.7640, 4.8357, 5000, 5), (45.7640, 4.8357, 20000, 5),
+    (45.7578, 4.8320, 2000, 10), (45.7797, 4.8522, 3000, 5), (45.7485, 4.8467, 800, 3),
+    (45.6970, 4.8870, 5000, 5), (45.8050, 4.7700, 10000, 20), (45.7300, 4.9300, 20000, 50),
+    (45.7640, 4.8357, 300, 5),
+]
+
+
+def legacy_find(url, lat, lon, radius, limit):
+    """The pre-planner find_pharmacies_overpass, condensed but with the same queries and ordering."""
+    from locator_service import HEADERS
+    from pharmacy_index import element_record, haversine_m
+
+    def run(query):
+        r = requests.post(url, data=query, headers=HEADERS, timeout=30)
+        r.raise_for_status()
+        return r.json().get("elements", [])
+
+    def collect(elems, seen):
+        out = []
+        for elem in elems:
+            key = f"{elem.get('type')}/{elem.get('id')}"
+            if key in seen:
+                continue
+            seen.add(key)
+            rec = element_record(elem)
+            if rec is None:
+                continue
+            d = round(haversine_m(lat, lon, rec["lat"], rec["lon"]), 1)
+            out.append(dict({"name": rec["name"], "lat": rec["lat"], "lon": rec["lon"], "distance_m": d}, **rec))
+        out.sort(key=lambda x: x["distance_m"])
+        return out
+
+    subqueries = []
+    for k in PHONE_KEYS + EMAIL_KEYS + WEBSITE_KEYS:
+        for kind in ("node", "way", "relation"):
+            subqueries.append(f'{kind}["amenity"="pharmacy"]["{k}"](around:{radius},{lat},{lon});')
+    seen = set()
+    with_contact = collect(run("[out:json][timeout:25];(" + "\n".join(subqueries) + ");out center tags;"), seen)
+    if len(with_contact) >= limit:
+        return with_contact[:limit]
+    all_query = (f'[out:json][timeout:25];(node["amenity"="pharmacy"](around:{radius},{lat},{lon});'
+                 f'way["amenity"="pharmacy"](around:{radius},{lat},{lon});'
+                 f'relation["amenity"="pharmacy"](around:{radius},{lat},{lon}););out center tags;')
+    return (with_contact + collect(run(all_query), seen))[:limit]
+
+
+def measure(server, label, fn):
+    server.reset_stats()
+    results, lat_ms = [], []
+    for q in QUERIES:
+        start = time.perf_counter()
+        results.append(fn(*q))
+        lat_ms.append((time.perf_counter() - start) * 1000)
+    s = server.stats
+    ordered = sorted(lat_ms)
+    print(f"{label:<22} requests {s['requests']:3d}  area scans {s['statements']:4d}  "
+          f"sent {s['bytes_received'] / 1024:6.1f} KiB  received {s['bytes_sent'] / 1024:7.1f} KiB  mean {sum(lat_ms) / len(lat_ms):7.1f}ms  "
+          f"p95 {ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]:7.1f}ms")
+    return results, dict(s, total_ms=sum(lat_ms))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    ap.add_argument("--statement-ms", type=float, default=20.0)
+    args = ap.parse_args()
+
+    server = FakeOverpassServer(latency_ms=args.latency_ms, statement_ms=args.statement_ms).start()
+    os.environ.update({
+        "LOCATOR_OVERPASS_URL": server.url,
+        "LOCATOR_TILE_CACHE_SIZE": "0",  # measure the query plan itself, not the tile cache
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+        "LOCATOR_GEOCODE_DB": os.path.join(tempfile.mkdtemp(), "geocode.sqlite3"),
+        "LOCATOR_RATE_LIMIT": "0",  # the fakes are not rate limited; measure the code path itself
+    })
+    import locator_service
+
+    print(f"{len(QUERIES)} queries, fixture of {len(server.elements)} pharmacies, "
+          f"latency {args.latency_ms:.0f}ms + {args.statement_ms:.0f}ms per area scan\n")
+    old, old_s = measure(server, "two queries (old)", lambda *q: legacy_find(server.url, *q))
+    new, new_s = measure(server, "single nwr (planner)", locator_service.find_pharmacies_overpass)
+    server.stop()
+
+    mismatches = [q for q, a, b in zip(QUERIES, old, new) if a != b]
+    print(f"\nround trips {old_s['requests']} -> {new_s['requests']}, "
+          f"area scans {old_s['statements']} -> {new_s['statements']}, "
+          f"query bytes {old_s['bytes_received']} -> {new_s['bytes_received']}, "
+          f"response {old_s['bytes_sent'] / 1024:.1f} -> {new_s['bytes_sent'] / 1024:.1f} KiB, "
+          f"total latency {old_s['total_ms']:.0f} -> {new_s['total_ms']:.0f} ms")
+    print(f"identical results: {len(QUERIES) - len(mismatches)}/{len(QUERIES)}")
+    for q in mismatches:
+        print("  MISMATCH", q)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/bench_pharmacy_records.py
+# Result dicts vs slotted Pharmacy records on a large synthetic Overpass dump.
+#
+#   python benchmarks/bench_pharmacy_records.py [--elements 100000]
+#
+# "dict records" is the previous normalization: every element became a full
+# result dict (address dict, formatted address, contact lookups) as soon as it
+# was fetched, which is what tiles and the offline index held. "Pharmacy" keeps
+# position, identity and the result-relevant tags, and builds the dict on demand.
+# Memory is what stays allocated once the parsed elements are gone (tracemalloc).
+# Every Pharmacy.to_dict() must equal the old dict (exit status 1 otherwise).
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from pharmacy_index import (PHONE_KEYS, Pharmacy, PharmacyIndex, element_position,  # noqa: E402
+                            format_address_from_tags, normalize_elements)
+
+STREETS = ["Rue de la République", "Avenue Jean Jaurès", "Cours Lafayette", "Rue Garibaldi", "Boulevard des Belges"]
+
+
+def legacy_record(elem):
+    """element_record before Pharmacy: the full result dict, built eagerly."""
+    pos = element_position(elem)
+    if pos is None:
+        return None
+    tags = elem.get("tags") or {}
+    addr = {k: v for k, v in tags.items() if k.startswith("addr:") or k in ("postal_code", "city", "village", "street")}
+    return {
+        "name": tags.get("name") or tags.get("shop") or "Pharmacy",
+        "lat": pos[0],
+        "lon": pos[1],
+        "address_tags": addr,
+        "formatted_address": format_address_from_tags(tags) or addr,
+        "phone": next((tags[k] for k in PHONE_KEYS if tags.get(k)), None),
+        "email": tags.get("email") or tags.get("contact:email"),
+        "website": tags.get("website") or tags.get("contact:website"),
+        "opening_hours": tags.get("opening_hours"),
+        "osm_type": elem.get("type"),
+        "osm_id": elem.get("id"),
+    }
+
+
+def synthetic_dump(n, seed=11):
+    """Overpass-shaped pharmacies with the tag mix real OSM data has (brands, refs, check dates...)."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        lat, lon = 43.0 + rng.random() * 6, -1.0 + rng.random() * 8
+        tags = {"amenity": "pharmacy", "healthcare": "pharmacy", "dispensing": "yes",
+                "addr:street": rng.choice(STREETS), "addr:housenumber": str(rng.randrange(1, 300)),
+                "addr:postcode": f"{rng.randrange(1000, 95999):05d}", "addr:city": f"Commune {i % 3000}",
+                "ref:FR:FINESS": f"{rng.randrange(10 ** 8, 10 ** 9)}", "source": "survey", "check_date": "2024-05-12",
+                "wheelchair": rng.choice(["yes", "limited", "no"])}
+        if rng.random() < 0.9:
+            tags["name"] = f"Pharmacie {rng.choice(['du Centre', 'de la Gare', 'des Halles', 'Saint-Jean'])} {i}"
+        if rng.random() < 0.3:
+            tags.update({"brand": "Pharmavie", "brand:wikidata": "Q111111111", "operator": "SELARL Pharmavie"})
+        if rng.random() < 0.5:
+            tags["phone"] = f"+33 4 {rng.randrange(10 ** 7, 10 ** 8)}"
+        if rng.random() < 0.2:
+            tags["contact:email"] = f"contact{i}@example.fr"
+        if rng.random() < 0.3:
+            tags["website"] = f"https://pharmacie{i}.example.fr/"
+        if rng.random() < 0.6:
+            tags["opening_hours"] = "Mo-Fr 08:30-19:30; Sa 09:00-19:00"
+        if rng.random() < 0.8:
+            out.append({"type": "node", "id": i, "lat": lat, "lon": lon, "tags": tags})
+        else:
+            out.append({"type": "way", "id": i, "center": {"lat": lat, "lon": lon}, "tags": tags})
+    return out
+
+
+def held_bytes(text, build):
+    """Bytes still allocated by build()'s result once the parsed elements are dropped."""
+    elements = json.loads(text)["elements"]
+    gc.collect()
+    tracemalloc.start()
+    out = build(elements)
+    del elements
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del out
+    return size
+
+
+def trimmed(elements):
+    out = []
+    for elem in elements:
+        p = Pharmacy.from_element(elem)
+        if p is not None:
+            p.tags = p.result_tags()
+            out.append(p)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--elements", type=int, default=100000)
+    args = ap.parse_args()
+
+    text = json.dumps({"elements": synthetic_dump(args.elements)})
+    print(f"{args.elements} elements, {len(text) / 1e6:.1f} MB of Overpass JSON\n")
+
+    variants = [
+        ("dict records (old)", lambda els: [r for r in map(legacy_record, els) if r is not None]),
+        ("Pharmacy, result tags", trimmed),
+    ]
+    print(f"{'held records':<24} {'build':>9} {'retained':>10}")
+    held = {}
+    for label, build in variants:
+        elements = json.loads(text)["elements"]
+        start = time.perf_counter()
+        held[label] = build(elements)
+        ms = (time.perf_counter() - start) * 1000
+        print(f"{label:<24} {ms:7.0f}ms {held_bytes(text, build) / 1e6:8.1f}MB")
+
+    # Transient ranking input: positions + contact flags, records only for winners
+    elements = json.loads(text)["elements"]
+    start = time.perf_counter()
+    record_at, lats, lons, contact = normalize_elements(elements)
+    ms = (time.perf_counter() - start) * 1000
+    print(f"{'normalize_elements':<24} {ms:7.0f}ms  (positions and contact flags; records built per winner)")
+
+    t_old = time.perf_counter()
+    old_dicts = [legacy_record(e) for e in elements]
+    t_old = (time.perf_counter() - t_old) * 1000
+    t_new = time.perf_counter()
+    new_dicts = [record_at(i).to_dict() for i in range(len(lats))]
+    t_new = (time.perf_counter() - t_new) * 1000
+    trimmed_dicts = [p.to_dict() for p in held["Pharmacy, result tags"]]
+    print(f"\nresult dicts for all {len(lats)}: old {t_old:.0f}ms, Pharmacy.to_dict {t_new:.0f}ms")
+    same = old_dicts == new_dicts == trimmed_dicts
+
+    # Offline index files: version 1 stored result dicts, version 2 stores [type, id, lat, lon, tags]
+    tmp = Path(tempfile.mkdtemp())
+    index = PharmacyIndex.from_elements(elements)
+    index.save(tmp / "v2.json")
+    v1 = {"version": 1, "built_at": index.built_at, "source": "", "region": list(index.region),
+          "cell_deg": index.cell_deg, "records": [p.to_dict() for p in index.records], "contact": index.contact}
+    with open(tmp / "v1.json", "w", encoding="utf-8") as f:
+        json.dump(v1, f, separators=(",", ":"))
+    for name in ("v1.json", "v2.json"):
+        start = time.perf_counter()
+        loaded = PharmacyIndex.load(tmp / name)
+        ms = (time.perf_counter() - start) * 1000
+        same = same and [p.to_dict() for p in loaded.records] == [p.to_dict() for p in index.records]
+        print(f"index {name}: {os.path.getsize(tmp / name) / 1e6:.1f} MB, load {ms:.0f}ms")
+
+    print(f"\nidentical result dicts: {'yes' if same else 'NO'}")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# benchmarks/bench_rate_limit.py
+# Shared upstream rate limiting across worker processes, against the fake
+# geocoders enforcing Nominatim's limit (429 above --max-rps).
+#
+#   python benchmarks/bench_rate_limit.py [--workers 4] [--threads 4] [--seconds 6] [--rate 4] [--max-rps 5]
+#
+# Each worker process runs the locator's geocode_location from several threads
+# on distinct places for a fixed time, every 5th call as an EMERGENCY request.
+# "unlimited" (LOCATOR_RATE_LIMIT=0) is every worker firing at once: most
+# calls are 429s, which used to become "Could not geocode" and now at least
+# come back as busy. "shared bucket" limits all workers together at --rate;
+# calls that cannot get a token in time come back as busy (503 with
+# Retry-After in the service) without being sent.
+# Also checked: identical concurrent lookups share one upstream call, and a 429
+# pauses the bucket for every worker. Exit status 1 when a check fails.
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_geocoder_server import FakeGeocoderServer  # noqa: E402
+
+EMERGENCY_EVERY = 5
+
+
+def worker(env, n_threads, seconds, seed):
+    os.environ.update(env)
+    sys.stdout = open(os.devnull, "w")  # upstream error logs of the worker
+    import locator_service as loc
+    from rate_limit import RateLimited, priority_scope
+
+    out = {"ok": 0, "busy": 0, "failed": 0, "ms_routine": [], "ms_emergency": []}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+    calls = itertools.count(1)  # across the worker's threads: each thread only gets a few calls in
+
+    def run(t):
+        i = 0
+        while time.monotonic() < stop:
+            i += 1
+            emergency = next(calls) % EMERGENCY_EVERY == 0
+            start = time.perf_counter()
+            try:
+                with priority_scope(emergency):
+                    outcome = "ok" if loc.geocode_location(f"place {seed}-{t}-{i}") else "failed"
+            except RateLimited:
+                outcome = "busy"
+            ms = (time.perf_counter() - start) * 1000
+            with lock:
+                out[outcome] += 1
+                if outcome == "ok":
+                    out["ms_emergency" if emergency else "ms_routine"].append(ms)
+            if outcome != "ok":
+                time.sleep(0.2)  # a client backing off before its next request
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in range(n_threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    out["limiter"] = loc.limiters["nominatim"].stats()
+    return out
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def run_fleet(ctx, server, env, args, label):
+    server.reset_stats()
+    start = time.perf_counter()
+    with ctx.Pool(args.workers) as pool:
+        outs = pool.starmap(worker, [(env, args.threads, args.seconds, w) for w in range(args.workers)])
+    elapsed = time.perf_counter() - start
+    total = {k: sum(o[k] for o in outs) for k in ("ok", "busy", "failed")}
+    routine = [ms for o in outs for ms in o["ms_routine"]]
+    emergency = [ms for o in outs for ms in o["ms_emergency"]]
+    sent = server.stats["nominatim"]
+    print(f"{label:<14} upstream calls {sent:4d} ({sent / elapsed:5.1f}/s)  429s {server.stats['throttled']:4d}  "
+          f"ok {total['ok']:4d}  busy {total['busy']:4d}  failed {total['failed']:4d}  "
+          f"p50 routine {percentile(routine, 0.5):7.1f}ms  emergency {percentile(emergency, 0.5):7.1f}ms")
+    return dict(total, sent=sent, throttled=server.stats["throttled"], elapsed=elapsed,
+                routine=routine, emergency=emergency, limiters=[o["limiter"] for o in outs])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=6.0)
+    ap.add_argument("--rate", type=float, default=4.0, help="shared Nominatim budget, requests/s")
+    ap.add_argument("--max-rps", type=float, default=5.0, help="the fake Nominatim's own limit")
+    args = ap.parse_args()
+
+    server = FakeGeocoderServer(nominatim_latency_ms=40, photon_error_rate=1.0, jitter_ms=5,
+                                nominatim_max_rps=args.max_rps).start()
+    work = tempfile.mkdtemp()
+    base = {
+        "LOCATOR_NOMINATIM_URL": server.nominatim_url, "LOCATOR_PHOTON_URL": server.photon_url,
+        "LOCATOR_GEOCODE_DB": os.path.join(work, "geocode.sqlite3"),
+        "LOCATOR_RATE_LIMIT_DB": os.path.join(work, "ratelimit.sqlite3"),
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+        "LOCATOR_SNAPSHOT_PATH": os.path.join(work, "no-snapshot.bin"),
+        "LOCATOR_NOMINATIM_RATE": str(args.rate), "LOCATOR_PHOTON_RATE": "0",
+        "LOCATOR_RATE_MAX_WAIT_S": "3",
+    }
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.workers} workers x {args.threads} threads for {args.seconds:.0f}s, Nominatim allows {args.max_rps:.0f}/s, "
+          f"shared budget {args.rate:.0f}/s, Photon down, every {EMERGENCY_EVERY}th call EMERGENCY\n")
+    old = run_fleet(ctx, server, dict(base, LOCATOR_RATE_LIMIT="0", LOCATOR_GEOCODE_DB=os.path.join(work, "old.sqlite3")),
+                    args, "unlimited")
+    new = run_fleet(ctx, server, dict(base, LOCATOR_RATE_LIMIT="1", LOCATOR_GEOCODE_DB=os.path.join(work, "new.sqlite3")),
+                    args, "shared bucket")
+    waits = [lim.get("wait_ms", {}).get("p95", 0.0) for lim in new["limiters"]]
+    rejected = sum(lim["rejected_queue_full"] + lim["rejected_timeout"] for lim in new["limiters"])
+    print(f"\nshared bucket: queue wait p95 per worker {waits} ms, rejected {rejected}, "
+          f"upstream rate {new['sent'] / new['elapsed']:.2f}/s (budget {args.rate:.0f}/s)")
+
+    # Coalescing and 429 handling, in this process
+    os.environ.update(dict(base, LOCATOR_RATE_LIMIT="1", LOCATOR_NOMINATIM_RATE="50"))
+    import locator_service as loc
+    from rate_limit import RateLimited, SharedBucket
+
+    server.reset_stats()
+    server.update(nominatim_max_rps=0, nominatim_latency_ms=200)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(loc.geocode_location("Same Place, Lyon"))) for _ in range(32)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    coalesced = server.stats["nominatim"]
+    print(f"32 concurrent lookups of one place: {coalesced} upstream call(s), {sum(1 for r in results if r)} answered")
+
+    server.reset_stats()
+    server.update(nominatim_max_rps=2, nominatim_latency_ms=5)
+    outcomes, other_worker = [], None
+    for i in range(8):
+        try:
+            outcomes.append("ok" if loc.geocode_location(f"burst {i}") else "failed")
+        except RateLimited as e:
+            outcomes.append(f"busy({e.retry_after_s:.1f}s)")
+            if other_worker is None:
+                other_worker = SharedBucket(base["LOCATOR_RATE_LIMIT_DB"], "nominatim", 50.0).state()
+    other_worker = other_worker or {"paused_s": 0.0}
+    print(f"limiter set above the upstream's limit: {outcomes}; upstream saw {server.stats['nominatim']} calls, "
+          f"{server.stats['throttled']} 429s; after the first, another worker saw the bucket paused for "
+          f"{other_worker['paused_s']:.2f}s")
+    server.stop()
+
+    checks = {
+        "unlimited fleet hits 429s": old["throttled"] > 0,
+        "shared bucket sends no request Nominatim rejects": new["throttled"] == 0,
+        "shared bucket stays within budget": new["sent"] <= args.rate * new["elapsed"] + 1,
+        "no silent geocode failures with the limiter": new["failed"] == 0,
+        "emergency calls wait less than routine ones": percentile(new["emergency"], 0.5) < percentile(new["routine"], 0.5),
+        "identical lookups coalesce": coalesced == 1 and all(results),
+        "a 429 pauses the bucket for all workers": other_worker["paused_s"] > 0.5,
+    }
+    print()
+    for name, ok in checks.items():
+        print(f"  {'ok ' if ok else 'FAIL'} {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
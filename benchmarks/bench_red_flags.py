@@ -0,0 +1,67 @@
+# benchmarks/bench_red_flags.py
+# Per-request cost of red-flag matching as the lexicon grows.
+#
+#   python benchmarks/bench_red_flags.py [--sizes 12,1000,10000,50000] [--repeat 2000]
+#
+# Compares the old linear `in` scan with the compiled RedFlagMatcher. The
+# matcher's time should stay roughly flat while the linear scan grows.
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from red_flags import BUILTIN_RED_FLAGS, RedFlagMatcher  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "I have had a fever and headache since yesterday, and a bit of a sore throat.",
+    "My father is confused and has slurred speech since this morning.",
+    "Mild rash on the left arm after gardening, itchy but no swelling.",
+    "Persistent dry cough for two weeks, worse at night, no fever.",
+    "She fainted in the kitchen and now complains of chest pain.",
+]
+
+
+def synthetic_lexicon(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    phrases = list(BUILTIN_RED_FLAGS)
+    while len(phrases) < size:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                 for _ in range(rng.randint(1, 3))]
+        phrases.append(" ".join(words))
+    return phrases[:size]
+
+
+def linear_scan(phrases, text):
+    t = text.lower()
+    return [p for p in phrases if p in t]
+
+
+def time_per_request(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="12,1000,10000,50000")
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    print(f"{'lexicon':>8} {'build ms':>9} {'linear us/req':>14} {'matcher us/req':>15}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        phrases = synthetic_lexicon(size)
+        t0 = time.perf_counter()
+        matcher = RedFlagMatcher((p, p) for p in phrases)
+        build_ms = (time.perf_counter() - t0) * 1000
+        linear_us = time_per_request(lambda t: linear_scan(phrases, t), args.repeat)
+        matcher_us = time_per_request(matcher.find_all, args.repeat)
+        print(f"{size:>8} {build_ms:>9.1f} {linear_us:>14.1f} {matcher_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# benchmarks/bench_warmup_snapshot.py
+# First-request latency after a deploy, with and without a warm-up snapshot,
+# against the fake Nominatim/Photon and Overpass servers.
+#
+#   python benchmarks/bench_warmup_snapshot.py [--geocode-ms 120] [--overpass-ms 150] [--radius 5000] [--memory-size 200000]
+#
+# "cold" is a fresh worker: empty geocode store and tile cache, every place
+# pays Nominatim and Overpass. "snapshot" is the same worker started with a
+# snapshot of the configured areas. Also measured: snapshot build and load
+# time, private (anonymous) memory of loading a --memory-size synthetic set as
+# a snapshot vs as the JSON offline index, and request latency while a
+# background rebuild runs. Results must match the cold path and requests must
+# not wait for the rebuild (exit status 1 otherwise).
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from fake_geocoder_server import FakeGeocoderServer  # noqa: E402
+from fake_overpass_server import FakeOverpassServer  # noqa: E402
+
+AREAS = ["Lyon", "Villeurbanne"]
+PLACES = ["Bellecour, Lyon", "Part-Dieu, Lyon", "Croix-Rousse, Lyon", "Confluence, Lyon", "Gerland, Lyon",
+          "Vaise, Lyon", "Monplaisir, Lyon", "Brotteaux, Lyon"]
+
+
+def rss_anon_kib() -> int:
+    # Private memory; pages of a file mapping count as RssFile and are shared between processes
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return -1
+
+
+def run(queries, radius, fn):
+    out, lat_ms = [], []
+    for q in queries:
+        start = time.perf_counter()
+        out.append(fn(q, radius))
+        lat_ms.append((time.perf_counter() - start) * 1000)
+    return out, lat_ms
+
+
+def summary(label, lat_ms):
+    ordered = sorted(lat_ms)
+    print(f"{label:<26} first {lat_ms[0]:7.1f}ms  mean {sum(lat_ms) / len(lat_ms):7.1f}ms  "
+          f"p95 {ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]:7.1f}ms  max {ordered[-1]:7.1f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--geocode-ms", type=float, default=120.0)
+    ap.add_argument("--overpass-ms", type=float, default=150.0)
+    ap.add_argument("--radius", type=int, default=5000)
+    ap.add_argument("--memory-size", type=int, default=200000)
+    args = ap.parse_args()
+
+    geo = FakeGeocoderServer(nominatim_latency_ms=args.geocode_ms, jitter_ms=0).start()
+    overpass = FakeOverpassServer(latency_ms=args.overpass_ms, statement_ms=20).start()
+    work = tempfile.mkdtemp()
+    os.environ.update({
+        "LOCATOR_NOMINATIM_URL": geo.nominatim_url, "LOCATOR_PHOTON_URL": geo.photon_url,
+        "LOCATOR_OVERPASS_URL": overpass.url,
+        "LOCATOR_INDEX_PATH": str(ROOT / "benchmarks" / "no-such-index.json"),
+        "LOCATOR_GEOCODE_DB": os.path.join(work, "cold.sqlite3"),
+        "LOCATOR_RATE_LIMIT": "0",
+        "LOCATOR_SNAPSHOT_PATH": os.path.join(work, "snapshot.bin"),
+        "LOCATOR_WARMUP_AREAS": "",  # the cold worker has no snapshot
+    })
+    import locator_service as loc
+    from geocode_store import GeocodeStore
+    from locator_snapshot import Snapshot, SnapshotManager, build_snapshot, write_snapshot
+    from pharmacy_index import Pharmacy, PharmacyIndex, has_contact
+    from tile_cache import TileCache
+
+    def locate(q, radius):
+        lat, lon, _ = loc.geocode_location(q)
+        return loc.find_pharmacies_overpass(lat, lon, radius=radius, limit=5)
+
+    def fresh_worker(db_name):
+        loc.geocode_store = GeocodeStore(os.path.join(work, db_name))
+        loc.tile_cache = TileCache(lambda q: loc._fetch_overpass(q), ttl_s=loc.TILE_TTL_S, max_tiles=loc.TILE_CACHE_SIZE)
+
+    queries = AREAS + PLACES
+    print(f"{len(queries)} places, radius {args.radius} m, fixture of {len(overpass.elements)} pharmacies, "
+          f"geocode {args.geocode_ms:.0f}ms, Overpass {args.overpass_ms:.0f}ms\n")
+    cold, cold_ms = run(queries, args.radius, locate)
+    summary("cold worker", cold_ms)
+
+    snap_path = Path(os.environ["LOCATOR_SNAPSHOT_PATH"])
+    start = time.perf_counter()
+    header = build_snapshot(snap_path, AREAS, PLACES, geocode=lambda q: loc.geocode_location(q, use_snapshot=False),
+                            fetch=loc.snapshot_fetch, margin_m=loc.WARMUP_MARGIN_M,
+                            timeout_s=loc.SNAPSHOT_TIMEOUT_S)
+    build_s = time.perf_counter() - start
+
+    # Load cost on a larger synthetic set, same pharmacies in both formats
+    from bench_locator_ranking import synthetic_elements
+    elements = synthetic_elements(args.memory_size, 60000)
+    big = [Pharmacy.from_element(e) for e in elements]
+    contact = [has_contact(e["tags"]) for e in elements]
+    for r in big:
+        r.tags = r.result_tags()
+    big_path, index_path = Path(work) / "big.bin", Path(work) / "index.json"
+    write_snapshot(big_path, big, contact, {"version": 1, "built_at": time.time(), "areas": [], "geocodes": {}})
+    PharmacyIndex(big, contact, (45.0, 4.0, 46.5, 5.5)).save(index_path)
+    del elements, big, contact
+    gc.collect()
+    before = rss_anon_kib()
+    start = time.perf_counter()
+    snap = Snapshot(big_path)
+    load_ms = (time.perf_counter() - start) * 1000
+    snap.nearest(45.76, 4.83, 20000, 5)
+    snap_anon = rss_anon_kib() - before
+    before = rss_anon_kib()
+    start = time.perf_counter()
+    index = PharmacyIndex.load(index_path)
+    index_load_ms = (time.perf_counter() - start) * 1000
+    index.nearest(45.76, 4.83, 20000, 5)
+    index_anon = rss_anon_kib() - before
+    del index, snap
+
+    fresh_worker("warm.sqlite3")
+    overpass.reset_stats()
+    geo.reset_stats()
+    loc.snapshots = SnapshotManager(snap_path, AREAS, PLACES, build=loc._build_snapshot, refresh_s=3600, check_s=0.05)
+    warm, warm_ms = run(queries, args.radius, locate)
+    summary("worker with snapshot", warm_ms)
+    upstream_calls = overpass.stats["requests"] + geo.stats["nominatim"] + geo.stats["photon"]
+
+    # Background rebuild: the snapshot is made stale and upstreams slowed down; requests keep flowing
+    loc.WARMUP_AREAS, loc.WARMUP_PLACES = AREAS, PLACES
+    overpass.update(latency_ms=1000)
+    loc.geocode_store = GeocodeStore(os.path.join(work, "rebuild.sqlite3"))  # the rebuild pays for geocodes too
+    loc.snapshots._snapshot.built_at -= 7200
+    loads = loc.snapshots.stats()["loads"]
+    done = threading.Event()
+
+    def watch():
+        while loc.snapshots.stats()["loads"] == loads:
+            time.sleep(0.01)
+        done.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    loc.snapshots.refresh_now()
+    during_ms = []
+    while not done.is_set():
+        during_ms.extend(run(queries, args.radius, locate)[1])
+    rebuild = loc.snapshots.stats()
+    summary("during background rebuild", during_ms)
+    geo.stop()
+    overpass.stop()
+
+    mismatches = [q for q, a, b in zip(queries, cold, warm) if a != b]
+    blocked = max(during_ms) > 200
+    print(f"\nsnapshot: {header['count']} pharmacies, {len(header['geocodes'])} geocodes, "
+          f"{snap_path.stat().st_size / 1024:.1f} KiB, built in {build_s:.2f}s")
+    print(f"{args.memory_size} pharmacies: load {load_ms:.2f}ms and {snap_anon / 1024:.1f} MiB private as a snapshot "
+          f"({big_path.stat().st_size / 2**20:.1f} MiB file, shared), {index_load_ms:.0f}ms and "
+          f"{index_anon / 1024:.1f} MiB private as the JSON index")
+    print(f"upstream calls with snapshot: {upstream_calls}; first request {cold_ms[0]:.0f} -> {warm_ms[0]:.1f} ms, "
+          f"total {sum(cold_ms):.0f} -> {sum(warm_ms):.1f} ms")
+    print(f"background rebuild took {rebuild['last_build_s']}s, {len(during_ms)} requests meanwhile, "
+          f"max {max(during_ms):.1f}ms, snapshot hits {rebuild['hits']}")
+    print(f"identical results: {len(queries) - len(mismatches)}/{len(queries)}")
+    for q in mismatches:
+        print("  MISMATCH", q)
+    if blocked:
+        print("  requests waited for the rebuild")
+    sys.exit(1 if mismatches or blocked or upstream_calls else 0)
+
+
+if __name__ == "__main__":
+    main()
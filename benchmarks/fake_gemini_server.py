@@ -0,0 +1,189 @@
+# benchmarks/fake_gemini_server.py
+# Local stand-in for the Gemini REST API with injectable latency and errors.
+#
+#   python benchmarks/fake_gemini_server.py --port 8089 --latency-ms 300 --slow-rate 0.05 --slow-ms 4000 --error-rate 0.1
+#
+# Point triageAgent at it with:
+#   GEMINI_API_ENDPOINT=http://127.0.0.1:8089 GEMINI_API_KEY=fake python triageAgent.py
+#
+# Serves :generateContent, :streamGenerateContent, :countTokens and the legacy :generateText.
+# The fault profile can be changed while running:
+#   curl -X POST localhost:8089/_control -d '{"error_rate": 1.0}'
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PROFILE = {
+    "latency_ms": 200.0,  # base latency per call
+    "jitter_ms": 50.0,  # uniform +/- jitter
+    "slow_rate": 0.0,  # fraction of calls that take slow_ms instead
+    "slow_ms": 3000.0,
+    "error_rate": 0.0,  # fraction of calls answered with 503
+    "chunk_delay_ms": 30.0,  # gap between streamed chunks
+}
+
+
+def triage_answer(prompt: str) -> str:
+    """Deterministic triage JSON for a prompt, loosely keyed on the symptom words."""
+    m = re.search(r'"""(.*?)"""', prompt, re.S)
+    symptoms = (m.group(1) if m else prompt).lower()
+    if any(w in symptoms for w in ("fever", "vomit", "infection", "weeks")):
+        urgency, actions, conditions = "MODERATE", ["pharmacy", "consult_doctor"], ["Viral infection", "Influenza"]
+    else:
+        urgency, actions, conditions = "LOW", ["self_care", "pharmacy"], ["Common cold"]
+    return "```json\n" + json.dumps({
+        "urgency": urgency,
+        "possible_conditions": conditions,
+        "recommended_actions": actions,
+        "explanation": "Generated by the fake Gemini server.",
+    }, indent=2) + "\n```"
+
+
+class FakeGeminiServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **profile):
+        self.profile = dict(DEFAULT_PROFILE, **profile)
+        self.stats = {"requests": 0, "errors": 0, "slow": 0}
+        self._lock = threading.Lock()
+        self._rng = random.Random(1234)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def update(self, **profile):
+        with self._lock:
+            self.profile.update(profile)
+
+    def _plan(self):
+        """Decide latency and failure for one call."""
+        with self._lock:
+            p = dict(self.profile)
+            self.stats["requests"] += 1
+            fail = self._rng.random() < p["error_rate"]
+            slow = self._rng.random() < p["slow_rate"]
+            jitter = self._rng.uniform(-p["jitter_ms"], p["jitter_ms"])
+            self.stats["errors"] += fail
+            self.stats["slow"] += slow
+        delay_ms = p["slow_ms"] if slow else max(0.0, p["latency_ms"] + jitter)
+        return delay_ms / 1000.0, fail, p["chunk_delay_ms"] / 1000.0
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status: int, obj):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/_stats"):
+                    return self._json(200, dict(server.stats, profile=server.profile))
+                # models.get, used by warm-up probes
+                m = re.search(r"/models/([^/?:]+)", self.path)
+                if m:
+                    return self._json(200, {"name": f"models/{m.group(1)}", "supportedGenerationMethods": ["generateContent"]})
+                self._json(404, {"error": {"code": 404, "message": "not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b"{}"
+                if self.path.startswith("/_control"):
+                    server.update(**json.loads(raw or b"{}"))
+                    return self._json(200, server.profile)
+                try:
+                    body = json.loads(raw or b"{}")
+                except ValueError:
+                    body = {}
+
+                if ":countTokens" in self.path:
+                    # used by warm-up probes; no latency or faults injected
+                    return self._json(200, {"totalTokens": 1})
+
+                delay, fail, chunk_delay = server._plan()
+                time.sleep(delay)
+                if fail:
+                    return self._json(503, {"error": {"code": 503, "message": "injected failure", "status": "UNAVAILABLE"}})
+
+                if ":generateText" in self.path:
+                    prompt = (body.get("prompt") or {}).get("text", "")
+                    return self._json(200, {"candidates": [{"output": triage_answer(prompt)}]})
+
+                parts = ((body.get("contents") or [{}])[-1].get("parts") or [{}])
+                prompt = "".join(p.get("text", "") for p in parts)
+                text = triage_answer(prompt)
+                if ":streamGenerateContent" in self.path:
+                    return self._stream(text, chunk_delay)
+                self._json(200, {"candidates": [_candidate(text)]})
+
+            def _stream(self, text: str, chunk_delay: float):
+                # REST streaming without alt=sse: one JSON array, written element by element
+                pieces = [text[i:i + 24] for i in range(0, len(text), 24)]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def write(data: str):
+                    b = data.encode("utf-8")
+                    self.wfile.write(f"{len(b):x}\r\n".encode() + b + b"\r\n")
+                    self.wfile.flush()
+
+                write("[")
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(chunk_delay)
+                    write(("," if i else "") + json.dumps({"candidates": [_candidate(piece)]}))
+                write("]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def _candidate(text: str):
+    return {"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake Gemini REST server for local testing")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    for key, value in DEFAULT_PROFILE.items():
+        ap.add_argument("--" + key.replace("_", "-"), type=float, default=value)
+    args = ap.parse_args()
+    profile = {k: getattr(args, k) for k in DEFAULT_PROFILE}
+    server = FakeGeminiServer(args.host, args.port, **profile).start()
+    print(f"Fake Gemini listening on {server.url} with {profile}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
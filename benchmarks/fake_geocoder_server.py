@@ -0,0 +1,206 @@
+# benchmarks/fake_geocoder_server.py
+# Local stand-ins for Nominatim (/search) and Photon (/api/) with per-upstream
+# latency, slow-tail, error and empty-answer injection, and optionally their rate limits
+# (429 with Retry-After above `<upstream>_max_rps` requests in any second).
+#
+#   python benchmarks/fake_geocoder_server.py --port 8091
+#
+# Point locator_service at it with:
+#   LOCATOR_NOMINATIM_URL=http://127.0.0.1:8091/search LOCATOR_PHOTON_URL=http://127.0.0.1:8091/api/ \
+#   python locator_service.py
+#
+# Every query geocodes unless an empty answer is injected: known places come
+# from a small gazetteer, anything else gets stable pseudo-random coordinates
+# near Lyon. Connections opened are counted, so keep-alive reuse is visible in
+# the stats.
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+GAZETTEER = {
+    "lyon": (45.7578137, 4.8320114),
+    "paris": (48.8588897, 2.3200410),
+    "villeurbanne": (45.7733105, 4.8869339),
+    "marseille": (43.2961743, 5.3699525),
+    "bellecour, lyon": (45.7577285, 4.8321296),
+    "lahore": (31.5656822, 74.3141829, "pk"),
+    "lahore, pakistan": (31.5656822, 74.3141829, "pk"),
+    "valencia": (39.4697065, -0.3763353, "es"),
+    "valencia, venezuela": (10.1621751, -68.0076786, "ve"),
+}
+COUNTRY_NAMES = {"fr": "France", "pk": "Pakistan", "es": "España", "ve": "Venezuela"}
+
+DEFAULT_PROFILE = {
+    "nominatim_latency_ms": 120.0,
+    "nominatim_slow_rate": 0.0,  # fraction of calls that take nominatim_slow_ms instead
+    "nominatim_slow_ms": 4000.0,
+    "nominatim_error_rate": 0.0,
+    "nominatim_empty_rate": 0.0,  # fraction of calls answered with no results
+    "photon_latency_ms": 90.0,
+    "photon_slow_rate": 0.0,
+    "photon_slow_ms": 4000.0,
+    "photon_error_rate": 0.0,
+    "photon_empty_rate": 0.0,
+    "nominatim_max_rps": 0.0,  # 0 = no server-side rate limit
+    "photon_max_rps": 0.0,
+    "jitter_ms": 20.0,
+}
+
+
+def locate(query: str):
+    """(lat, lon, country code)."""
+    q = " ".join(query.lower().split())
+    if q in GAZETTEER:
+        return (GAZETTEER[q] + ("fr",))[:3]
+    h = int(hashlib.sha1(q.encode("utf-8")).hexdigest()[:12], 16)
+    return 45.60 + (h % 30000) / 100000.0, 4.70 + (h // 30000 % 30000) / 100000.0, "fr"
+
+
+class FakeGeocoderServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **profile):
+        self.profile = dict(DEFAULT_PROFILE, **profile)
+        self.stats = {"nominatim": 0, "photon": 0, "errors": 0, "slow": 0, "throttled": 0, "connections": 0}
+        self._recent = {"nominatim": deque(), "photon": deque()}  # arrival times within the last second
+        self._lock = threading.Lock()
+        self._rng = random.Random(99)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def nominatim_url(self) -> str:
+        return self.base_url + "/search"
+
+    @property
+    def photon_url(self) -> str:
+        return self.base_url + "/api/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def update(self, **profile):
+        with self._lock:
+            self.profile.update(profile)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {k: 0 for k in self.stats}
+
+    def _plan(self, upstream: str):
+        with self._lock:
+            p = self.profile
+            self.stats[upstream] += 1
+            if p[f"{upstream}_max_rps"] > 0:
+                now, recent = time.monotonic(), self._recent[upstream]
+                while recent and now - recent[0] >= 1.0:
+                    recent.popleft()
+                if len(recent) >= p[f"{upstream}_max_rps"]:
+                    self.stats["throttled"] += 1
+                    return None, False, False
+                recent.append(now)
+            fail = self._rng.random() < p[f"{upstream}_error_rate"]
+            slow = self._rng.random() < p[f"{upstream}_slow_rate"]
+            empty = self._rng.random() < p[f"{upstream}_empty_rate"]
+            jitter = self._rng.uniform(-p["jitter_ms"], p["jitter_ms"])
+            self.stats["errors"] += fail
+            self.stats["slow"] += slow
+            delay_ms = p[f"{upstream}_slow_ms"] if slow else max(0.0, p[f"{upstream}_latency_ms"] + jitter)
+        return delay_ms / 1000.0, fail, empty
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes on keep-alive
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.stats["connections"] += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status: int, obj, headers=None):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up on a hedged call
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                if url.path.startswith("/_stats"):
+                    return self._json(200, dict(server.stats, profile=server.profile))
+                upstream = "nominatim" if url.path.startswith("/search") else "photon" if url.path.startswith("/api") else None
+                if upstream is None:
+                    return self._json(404, {"error": "not found"})
+                delay, fail, empty = server._plan(upstream)
+                if delay is None:
+                    return self._json(429, {"error": "rate limited"}, {"Retry-After": "1"})
+                time.sleep(delay)
+                if fail:
+                    return self._json(503, {"error": "injected failure"})
+                if empty:
+                    return self._json(200, [] if upstream == "nominatim" else {"type": "FeatureCollection", "features": []})
+                query = (params.get("q") or [""])[0]
+                lat, lon, cc = locate(query)
+                country = COUNTRY_NAMES.get(cc, cc.upper())
+                if upstream == "nominatim":
+                    return self._json(200, [{
+                        "place_id": zlib.crc32(query.encode("utf-8")), "lat": f"{lat:.7f}", "lon": f"{lon:.7f}",
+                        "display_name": f"{query}, {country}", "type": "city", "importance": 0.7,
+                        "address": {"city": query.title(), "country": country, "country_code": cc},
+                    }])
+                return self._json(200, {"type": "FeatureCollection", "features": [{
+                    "type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"name": query.title(), "country": country, "osm_key": "place", "osm_value": "city"},
+                }]})
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake Nominatim/Photon geocoders for local testing")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8091)
+    for key, value in DEFAULT_PROFILE.items():
+        ap.add_argument("--" + key.replace("_", "-"), type=float, default=value)
+    args = ap.parse_args()
+    profile = {k: getattr(args, k) for k in DEFAULT_PROFILE}
+    server = FakeGeocoderServer(args.host, args.port, **profile).start()
+    print(f"Fake geocoders on {server.nominatim_url} and {server.photon_url} with {profile}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
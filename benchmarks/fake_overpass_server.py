@@ -0,0 +1,179 @@
+# benchmarks/fake_overpass_server.py
+# Local stand-in for the Overpass API, answering from a fixture of elements.
+#
+#   python benchmarks/fake_overpass_server.py --port 8090 --fixture benchmarks/fixtures/overpass_pharmacies_lyon.json
+#
+# Point locator_service at it with:
+#   LOCATOR_OVERPASS_URL=http://127.0.0.1:8090/api/interpreter python locator_service.py
+#
+# Understands the statement forms the locator sends: node/way/relation/nwr with
+# ["key"="value"] / ["key"] filters and an (around:r,lat,lon) or (s,w,n,e) area.
+# Each statement is a separate area scan, charged `statement_ms` on top of the
+# per-request `latency_ms`, which is roughly how Overpass cost scales.
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+DEFAULT_FIXTURE = Path(__file__).resolve().parent / "fixtures" / "overpass_pharmacies_lyon.json"
+DEFAULT_PROFILE = {
+    "latency_ms": 150.0,  # round trip + request overhead
+    "statement_ms": 20.0,  # server-side cost of one area scan
+    "error_rate": 0.0,
+}
+
+_STATEMENT = re.compile(r'\b(node|way|relation|nwr)((?:\[[^\]]*\])*)\(([^)]*)\)\s*;')
+_FILTER = re.compile(r'\["([^"]+)"(?:="([^"]*)")?\]')
+
+
+def _haversine_m(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 6371000.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _position(elem):
+    if elem["type"] == "node":
+        return elem["lat"], elem["lon"]
+    c = elem.get("center") or {}
+    return c.get("lat"), c.get("lon")
+
+
+def run_query(elements, query: str):
+    """(matching elements, number of area statements) for an Overpass QL union query."""
+    out, seen, statements = [], set(), 0
+    for m in _STATEMENT.finditer(query):
+        kind, filters, area = m.groups()
+        statements += 1
+        conds = _FILTER.findall(filters)
+        if area.startswith("around:"):
+            r, lat, lon = (float(x) for x in area[len("around:"):].split(","))
+            inside = lambda la, lo: _haversine_m(lat, lon, la, lo) <= r  # noqa: E731
+        else:
+            s, w, n, e = (float(x) for x in area.split(","))
+            inside = lambda la, lo: s <= la <= n and w <= lo <= e  # noqa: E731
+        for elem in elements:
+            if kind != "nwr" and elem["type"] != kind:
+                continue
+            key = (elem["type"], elem["id"])
+            if key in seen:
+                continue
+            tags = elem.get("tags") or {}
+            if any((k not in tags) if v == "" else (tags.get(k) != v) for k, v in conds):
+                continue
+            la, lo = _position(elem)
+            if la is not None and inside(la, lo):
+                seen.add(key)
+                out.append(elem)
+    return out, statements
+
+
+class FakeOverpassServer:
+    def __init__(self, fixture=DEFAULT_FIXTURE, host: str = "127.0.0.1", port: int = 0, **profile):
+        with open(fixture, "r", encoding="utf-8") as f:
+            self.elements = json.load(f)["elements"]
+        self.profile = dict(DEFAULT_PROFILE, **profile)
+        self.stats = {"requests": 0, "statements": 0, "bytes_received": 0, "bytes_sent": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+        self._failures = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/interpreter"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def update(self, **profile):
+        with self._lock:
+            self.profile.update(profile)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {k: 0 for k in self.stats}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes on keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/_stats"):
+                    return self._reply(200, json.dumps(dict(server.stats, profile=server.profile)).encode())
+                self._reply(404, b'{"error":"not found"}')
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                if self.path.startswith("/_control"):
+                    server.update(**json.loads(raw or "{}"))
+                    return self._reply(200, json.dumps(server.profile).encode())
+                query = parse_qs(raw)["data"][0] if raw.startswith("data=") else raw
+                elements, statements = run_query(server.elements, query)
+                with server._lock:
+                    p = dict(server.profile)
+                    server.stats["requests"] += 1
+                    server.stats["statements"] += statements
+                    server.stats["bytes_received"] += len(raw.encode("utf-8"))
+                    server._failures += p["error_rate"]
+                    fail = server._failures >= 1.0
+                    if fail:
+                        server._failures -= 1.0
+                        server.stats["errors"] += 1
+                time.sleep((p["latency_ms"] + statements * p["statement_ms"]) / 1000.0)
+                if fail:
+                    return self._reply(429, b'{"remark":"rate_limited"}')
+                body = json.dumps({"version": 0.6, "generator": "fake-overpass", "elements": elements},
+                                  ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                with server._lock:
+                    server.stats["bytes_sent"] += len(body)
+                self._reply(200, body)
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake Overpass API for local testing")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--fixture", default=str(DEFAULT_FIXTURE))
+    for key, value in DEFAULT_PROFILE.items():
+        ap.add_argument("--" + key.replace("_", "-"), type=float, default=value)
+    args = ap.parse_args()
+    profile = {k: getattr(args, k) for k in DEFAULT_PROFILE}
+    server = FakeOverpassServer(args.fixture, args.host, args.port, **profile).start()
+    print(f"Fake Overpass listening on {server.url} with {len(server.elements)} elements, {profile}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
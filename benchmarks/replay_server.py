@@ -0,0 +1,283 @@
+# benchmarks/replay_server.py
+# Local stand-in for Nominatim, Photon and Overpass that replays recorded
+# responses, so locator changes can be measured without the live servers.
+#
+#   python benchmarks/replay_server.py --port 8092 [--recording benchmarks/fixtures/locator_recording.jsonl]
+#   python benchmarks/replay_server.py --port 8092 --record   # misses go to the live servers and are appended
+#
+# Point locator_service at it with:
+#   LOCATOR_NOMINATIM_URL=http://127.0.0.1:8092/nominatim/search \
+#   LOCATOR_PHOTON_URL=http://127.0.0.1:8092/photon/api/ \
+#   LOCATOR_OVERPASS_URL=http://127.0.0.1:8092/overpass/api/interpreter python locator_service.py
+#
+# A recording is JSON lines, one exchange each: {"upstream", "request", "status",
+# "ms", "body"}, where "request" holds the geocoder's q or the Overpass query.
+# Geocoder queries match with case and spacing folded; one that was not recorded
+# gets an empty answer, like a place the live server does not know. Overpass
+# queries depend on the locator's tile and search settings, so one that was not
+# recorded is answered from the pool of recorded elements (the --overpass-pool
+# dump plus every recorded Overpass body) with fake_overpass_server's evaluator.
+#
+# Latency is `<upstream>_ms` per call (plus `statement_ms` per Overpass area scan,
+# +/- jitter_ms), or the recorded "ms" times `latency_scale` with
+# `recorded_latency` set. Misses are counted, so a benchmark can tell its
+# recording does not cover its workload.
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from fake_overpass_server import run_query
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_RECORDING = FIXTURES / "locator_recording.jsonl"
+DEFAULT_POOL = FIXTURES / "overpass_pharmacies_lyon.json"
+LIVE_URLS = {
+    "nominatim": "https://nominatim.openstreetmap.org/search",
+    "photon": "https://photon.komoot.io/api/",
+    "overpass": "https://overpass-api.de/api/interpreter",
+}
+PATHS = {"/nominatim/search": "nominatim", "/photon/api/": "photon", "/overpass/api/interpreter": "overpass"}
+
+DEFAULT_PROFILE = {
+    "nominatim_ms": 150.0,
+    "photon_ms": 100.0,
+    "overpass_ms": 250.0,
+    "statement_ms": 20.0,  # per Overpass area scan
+    "jitter_ms": 20.0,
+    "recorded_latency": 0.0,  # 1 = sleep the recorded "ms" (times latency_scale) when there is one
+    "latency_scale": 1.0,
+}
+
+
+def request_key(upstream: str, text: str) -> str:
+    if upstream == "overpass":
+        return " ".join(text.split())
+    return " ".join(text.lower().split())
+
+
+def request_text(exchange) -> str:
+    return exchange["request"]["data" if exchange["upstream"] == "overpass" else "q"]
+
+
+def load_recording(path) -> list:
+    exchanges = []
+    if path is not None and Path(path).exists():
+        with open(path, "r", encoding="utf-8") as f:
+            exchanges = [json.loads(line) for line in f if line.strip()]
+    return exchanges
+
+
+class ReplayServer:
+    def __init__(self, recording=DEFAULT_RECORDING, overpass_pool=DEFAULT_POOL, host: str = "127.0.0.1", port: int = 0,
+                 record: bool = False, live_urls=None, **profile):
+        self.recording = Path(recording) if recording is not None else None
+        self.record = record
+        self.live_urls = dict(LIVE_URLS, **(live_urls or {}))
+        self.profile = dict(DEFAULT_PROFILE, **profile)
+        self.stats = {"nominatim": 0, "photon": 0, "overpass": 0, "replayed": 0, "missed": 0, "evaluated": 0,
+                      "recorded": 0, "statements": 0, "bytes_sent": 0}
+        self._exchanges = {}
+        self._pool, self._pool_ids = [], set()
+        if overpass_pool is not None:
+            with open(overpass_pool, "r", encoding="utf-8") as f:
+                self._add_to_pool(json.load(f)["elements"])
+        for ex in load_recording(self.recording):
+            self._remember(ex)
+        self._lock = threading.Lock()
+        self._rng = random.Random(42)
+        self._live = requests.Session()
+        self._live_lock = threading.Lock()
+        self._live.headers["User-Agent"] = os.getenv("LOCATOR_USER_AGENT", "MyLocatorAgent/1.0 (youremail@example.com)")
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    def _add_to_pool(self, elements):
+        for elem in elements:
+            key = (elem["type"], elem["id"])
+            if key not in self._pool_ids:
+                self._pool_ids.add(key)
+                self._pool.append(elem)
+
+    def _remember(self, ex):
+        self._exchanges[(ex["upstream"], request_key(ex["upstream"], request_text(ex)))] = ex
+        if ex["upstream"] == "overpass" and ex.get("status") == 200:
+            self._add_to_pool(ex["body"].get("elements", []))
+
+    def __len__(self) -> int:
+        return len(self._exchanges)
+
+    def queries(self, upstream: str = "nominatim") -> list:
+        """Recorded request texts of one upstream, in recording order."""
+        return [request_text(ex) for (u, _), ex in self._exchanges.items() if u == upstream]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def nominatim_url(self) -> str:
+        return self.base_url + "/nominatim/search"
+
+    @property
+    def photon_url(self) -> str:
+        return self.base_url + "/photon/api/"
+
+    @property
+    def overpass_url(self) -> str:
+        return self.base_url + "/overpass/api/interpreter"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def update(self, **profile):
+        with self._lock:
+            self.profile.update(profile)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {k: 0 for k in self.stats}
+
+    def _record_live(self, upstream: str, text: str):
+        # Misses in record mode: ask the live server (one call at a time, Nominatim at most
+        # once a second per its usage policy) and keep its answer
+        with self._live_lock:
+            start = time.perf_counter()
+            if upstream == "overpass":
+                r = self._live.post(self.live_urls[upstream], data={"data": text}, timeout=180)
+            else:
+                params = {"q": text, "limit": 1}
+                if upstream == "nominatim":
+                    params.update(format="jsonv2", addressdetails=1, extratags=1)
+                r = self._live.get(self.live_urls[upstream], params=params, timeout=30)
+            elapsed = time.perf_counter() - start
+            if upstream == "nominatim":
+                time.sleep(max(0.0, 1.0 - elapsed))
+        ex = {"upstream": upstream, "request": {"data" if upstream == "overpass" else "q": text}, "status": r.status_code,
+              "ms": round(elapsed * 1000), "body": r.json() if r.ok else None}
+        with self._lock:
+            self._remember(ex)
+            self.stats["recorded"] += 1
+            if self.recording is not None:
+                with open(self.recording, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(ex, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return ex
+
+    def answer(self, upstream: str, text: str):
+        """(status, body, seconds to wait) for one request."""
+        ex = self._exchanges.get((upstream, request_key(upstream, text)))
+        if ex is None and self.record:
+            ex = self._record_live(upstream, text)
+        with self._lock:
+            p = dict(self.profile)
+            self.stats[upstream] += 1
+            jitter = self._rng.uniform(-p["jitter_ms"], p["jitter_ms"])
+        statements = 0
+        if ex is not None:
+            status, body = ex["status"], ex["body"]
+            stat = "replayed"
+        elif upstream == "overpass":
+            elements, statements = run_query(self._pool, text)
+            status, body = 200, {"version": 0.6, "generator": "replay", "elements": elements}
+            stat = "evaluated"
+        else:
+            status, body = 200, [] if upstream == "nominatim" else {"type": "FeatureCollection", "features": []}
+            stat = "missed"
+        if ex is not None and p["recorded_latency"] and ex.get("ms") is not None:
+            ms = ex["ms"] * p["latency_scale"]
+        else:
+            ms = max(0.0, p[f"{upstream}_ms"] + statements * p["statement_ms"] + jitter)
+        with self._lock:
+            self.stats[stat] += 1
+            self.stats["statements"] += statements
+        return status, body, ms / 1000.0
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes on keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, obj):
+                body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                with server._lock:
+                    server.stats["bytes_sent"] += len(body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up on a hedged call
+
+            def _serve(self, upstream, text):
+                if upstream is None:
+                    return self._reply(404, {"error": "not found"})
+                status, body, delay = server.answer(upstream, text)
+                time.sleep(delay)
+                self._reply(status, body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith("/_stats"):
+                    return self._reply(200, dict(server.stats, profile=server.profile, exchanges=len(server)))
+                upstream = PATHS.get(url.path)
+                if upstream == "overpass":
+                    return self._serve(upstream, (parse_qs(url.query).get("data") or [""])[0])
+                self._serve(upstream, (parse_qs(url.query).get("q") or [""])[0])
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                if self.path.startswith("/_control"):
+                    server.update(**json.loads(raw or "{}"))
+                    return self._reply(200, server.profile)
+                upstream = PATHS.get(urlparse(self.path).path)
+                self._serve(upstream, parse_qs(raw)["data"][0] if raw.startswith("data=") else raw)
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded Nominatim/Photon/Overpass responses for local testing")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8092)
+    ap.add_argument("--recording", default=str(DEFAULT_RECORDING))
+    ap.add_argument("--overpass-pool", default=str(DEFAULT_POOL))
+    ap.add_argument("--record", action="store_true", help="send misses to the live servers and append them")
+    for key, value in DEFAULT_PROFILE.items():
+        ap.add_argument("--" + key.replace("_", "-"), type=float, default=value)
+    args = ap.parse_args()
+    profile = {k: getattr(args, k) for k in DEFAULT_PROFILE}
+    server = ReplayServer(args.recording, args.overpass_pool, args.host, args.port, record=args.record, **profile).start()
+    print(f"Replaying {len(server)} exchanges from {args.recording} on {server.base_url} "
+          f"({'recording misses' if args.record else 'replay only'}), {profile}")
+    print(f"  LOCATOR_NOMINATIM_URL={server.nominatim_url} LOCATOR_PHOTON_URL={server.photon_url} "
+          f"LOCATOR_OVERPASS_URL={server.overpass_url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
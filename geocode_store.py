@@ -0,0 +1,183 @@
+# geocode_store.py
+# Persistent geocode cache for locator_service.
+#
+# One SQLite file in WAL mode: an insert is a single indexed row write instead of
+# rewriting the whole cache, readers never block the writer, and several worker
+# processes can share the file safely. Entries expire after a TTL and the table
+# is kept under a size bound by dropping the oldest rows.
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    key TEXT PRIMARY KEY,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    meta TEXT NOT NULL,
+    created REAL NOT NULL,
+    label TEXT
+);
+CREATE INDEX IF NOT EXISTS geocode_created ON geocode (created);
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class GeocodeStore:
+    def __init__(self, path, ttl_s: float = 30 * 86400, max_entries: int = 100000, evict_every: int = 256):
+        self.path = str(path)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.evict_every = evict_every  # puts between eviction passes
+        self._local = threading.local()  # one connection per thread
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evicted": 0, "errors": 0}
+        db = self._db()
+        db.executescript(SCHEMA)
+        if "label" not in [row[1] for row in db.execute("PRAGMA table_info(geocode)")]:
+            db.execute("ALTER TABLE geocode ADD COLUMN label TEXT")  # files from before labels were kept
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit mode; busy_timeout makes writers from other processes wait instead of failing
+            db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _bump(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl_s <= 0 or now - created < self.ttl_s
+
+    def get(self, key: str) -> Optional[Tuple[float, float, Dict]]:
+        try:
+            row = self._db().execute("SELECT lat, lon, meta, created FROM geocode WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            self._bump("errors")
+            print("Warning: geocode store read failed:", e)
+            return None
+        if row is None:
+            self._bump("misses")
+            return None
+        lat, lon, meta, created = row
+        if not self._fresh(created, time.time()):
+            self._bump("expired")
+            self._bump("misses")
+            return None  # removed by the next eviction pass
+        self._bump("hits")
+        return lat, lon, json.loads(meta)
+
+    def put(self, key: str, lat: float, lon: float, meta: Dict, label: Optional[str] = None):
+        """`label` is the query text as the user typed it (shown by autocomplete)."""
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO geocode (key, lat, lon, meta, created, label) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, float(lat), float(lon), json.dumps(meta, separators=(",", ":")), time.time(), label),
+            )
+        except sqlite3.Error as e:
+            self._bump("errors")
+            print("Warning: geocode store write failed:", e)
+            return
+        with self._lock:
+            self._stats["stores"] += 1
+            self._puts_since_evict += 1
+            due = self._puts_since_evict >= self.evict_every
+            if due:
+                self._puts_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired rows, then the oldest rows beyond max_entries. Returns rows removed."""
+        db = self._db()
+        removed = 0
+        try:
+            if self.ttl_s > 0:
+                removed += db.execute("DELETE FROM geocode WHERE created < ?", (time.time() - self.ttl_s,)).rowcount
+            excess = db.execute("SELECT COUNT(*) FROM geocode").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += db.execute(
+                    "DELETE FROM geocode WHERE key IN (SELECT key FROM geocode ORDER BY created LIMIT ?)", (excess,)
+                ).rowcount
+        except sqlite3.Error as e:
+            self._bump("errors")
+            print("Warning: geocode store eviction failed:", e)
+        self._bump("evicted", removed)
+        return removed
+
+    def migrate_json(self, json_path) -> int:
+        """
+        One-time import of the old locator_cache.json ({key: {"lat", "lon", "meta"}}).
+        Recorded in store_meta so later starts (and other workers) skip it; a file that
+        cannot be read is not marked and is tried again next time. Returns rows imported.
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        db = self._db()
+        try:
+            db.execute("BEGIN IMMEDIATE")  # one process migrates, the others wait and then see the marker
+            done = db.execute("SELECT value FROM store_meta WHERE key = 'migrated_json'").fetchone()
+            if done:
+                db.execute("COMMIT")
+                return 0
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    legacy = json.load(f)
+            except Exception as e:
+                # No marker: an unreadable or half-written file is retried on the next start
+                print("Warning: could not read legacy geocode cache:", e)
+                db.execute("ROLLBACK")
+                return 0
+            now = time.time()
+            rows = []
+            for key, entry in (legacy.items() if isinstance(legacy, dict) else ()):
+                try:
+                    rows.append((key, float(entry["lat"]), float(entry["lon"]),
+                                 json.dumps(entry.get("meta", {}), separators=(",", ":")), now))
+                except (KeyError, TypeError, ValueError):
+                    continue
+            # Existing rows are newer than the JSON file, so they win
+            db.executemany("INSERT OR IGNORE INTO geocode (key, lat, lon, meta, created) VALUES (?, ?, ?, ?, ?)", rows)
+            db.execute("INSERT INTO store_meta (key, value) VALUES ('migrated_json', ?)", (str(json_path),))
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            print("Warning: geocode cache migration failed:", e)
+            return 0
+        return len(rows)
+
+    def entries(self) -> Iterator[Tuple[str, Optional[str], float, float, Dict]]:
+        """(key, label, lat, lon, meta) for every fresh entry, oldest first."""
+        since = time.time() - self.ttl_s if self.ttl_s > 0 else 0.0
+        try:
+            rows = self._db().execute(
+                "SELECT key, label, lat, lon, meta FROM geocode WHERE created >= ? ORDER BY created", (since,))
+            for key, label, lat, lon, meta in rows:
+                yield key, label, lat, lon, json.loads(meta)
+        except sqlite3.Error as e:
+            self._bump("errors")
+            print("Warning: geocode store scan failed:", e)
+
+    def __len__(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+        out["size"] = len(self)
+        out["max_entries"] = self.max_entries
+        out["ttl_s"] = self.ttl_s
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
@@ -0,0 +1,233 @@
+# json_extract.py
+# Incremental extraction of the first JSON value from LLM output.
+#
+# The extractor is fed text (whole, or chunk by chunk from a token stream) and
+# tracks brace depth and string state as it goes, so it knows the moment the
+# first top-level object closes and generation can be cut off. While copying
+# the value out it repairs the defects models commonly produce: code fences
+# and prose around the JSON, single-quoted strings, trailing commas and
+# Python-style True/False/None literals.
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_PY_LITERALS = re.compile(r'"(?:\\.|[^"\\])*"|\b(True|False|None)\b')
+_PY_TO_JSON = {"True": "true", "False": "false", "None": "null"}
+_STRUCTURAL = re.compile(r"""[{}\[\]"',]""")
+_IN_DQ = re.compile(r'["\\]')
+_IN_SQ = re.compile(r"""['"\\]""")
+
+
+def _loads_repaired(text: str):
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    fixed = _PY_LITERALS.sub(lambda m: _PY_TO_JSON[m.group(1)] if m.group(1) else m.group(0), text)
+    return json.loads(fixed, strict=False)
+
+
+class IncrementalJSONExtractor:
+    """
+    Find the first complete top-level JSON object (or array) in streamed text.
+
+    feed() returns the parsed value once it closes, else None. Completed
+    top-level members are available from new_members() before that: (key, value)
+    pairs for objects, (index, element) pairs for arrays.
+    """
+
+    def __init__(self, opener: str = "{"):
+        self.opener = opener
+        self.result: Any = None
+        self.done = False
+        self._reset()
+
+    def _reset(self):
+        self._started = False
+        self._raw = []  # original chars since the opener, kept to restart after a bad candidate
+        self._out: List[str] = []  # repaired copy of the value
+        self._stack: List[str] = []
+        self._quote: Optional[str] = None
+        self._escape = False
+        self._member_start = 0
+        self._member_spans: List[Tuple[int, int]] = []
+        self._members_parsed = 0
+        self._members: List[Tuple[Any, Any]] = []
+        self._members_read = 0
+
+    # --- public API ---
+    def feed(self, chunk: str):
+        if self.done:
+            return self.result
+        text = chunk
+        i = 0
+        n = len(text)
+        while i < n:
+            if not self._started:
+                j = text.find(self.opener, i)
+                if j < 0:
+                    return None
+                self._started = True
+                self._stack.append(self.opener)
+                self._raw.append(self.opener)
+                self._out.append(self.opener)
+                self._member_start = 1
+                i = j + 1
+                continue
+            if self._escape:
+                j = i
+            else:
+                # Jump straight to the next character that can change scanner state
+                pattern = _STRUCTURAL if not self._quote else (_IN_DQ if self._quote == '"' else _IN_SQ)
+                m = pattern.search(text, i)
+                j = m.start() if m else n
+                if j > i:
+                    segment = text[i:j]
+                    self._raw.append(segment)
+                    self._out.append(segment)
+                    if j == n:
+                        break
+            ch = text[j]
+            self._raw.append(ch)
+            self._step(ch)
+            i = j + 1
+            if not self._stack:
+                if self._finish():
+                    return self.result
+                # Not valid JSON even after repair: rescan from just past this candidate's opener
+                text = "".join(self._raw)[1:] + text[i:]
+                i = 0
+                n = len(text)
+                self._reset()
+        return None
+
+    def new_members(self) -> List[Tuple[Any, Any]]:
+        self._parse_members()
+        out = self._members[self._members_read:]
+        self._members_read = len(self._members)
+        return out
+
+    def members(self) -> List[Tuple[Any, Any]]:
+        self._parse_members()
+        return list(self._members)
+
+    # --- scanner ---
+    def _step(self, ch: str):
+        out = self._out
+        if self._quote:
+            if self._escape:
+                self._escape = False
+                if ch == "'":
+                    out[-1] = "'"  # \' is not a JSON escape
+                    return
+                out.append(ch)
+                return
+            if ch == "\\":
+                self._escape = True
+                out.append(ch)
+                return
+            if ch == self._quote:
+                self._quote = None
+                out.append('"')
+                return
+            if ch == '"':  # bare double quote inside a single-quoted string
+                out.append('\\"')
+                return
+            out.append(ch)
+            return
+
+        if ch == '"' or ch == "'":
+            self._quote = ch
+            out.append('"')
+        elif ch in "{[":
+            self._stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            # Trailing comma before a closer
+            k = len(out) - 1
+            while k >= 0 and out[k].isspace():
+                k -= 1
+            if k >= 0 and out[k] == ",":
+                del out[k]
+            if self._stack:
+                self._stack.pop()
+            if not self._stack:
+                self._close_member(len(out))
+            out.append(ch)
+        elif ch == "," and len(self._stack) == 1:
+            self._close_member(len(out))
+            out.append(ch)
+            self._member_start = len(out)
+        else:
+            out.append(ch)
+
+    def _close_member(self, end: int):
+        # Only remember where the member sits; it is parsed when someone asks for it
+        if end > self._member_start:
+            self._member_spans.append((self._member_start, end))
+
+    def _parse_members(self):
+        while self._members_parsed < len(self._member_spans):
+            start, end = self._member_spans[self._members_parsed]
+            self._members_parsed += 1
+            text = "".join(self._out[start:end]).strip()
+            if not text:
+                continue
+            try:
+                if self.opener == "{":
+                    parsed = _loads_repaired("{" + text + "}")
+                    if isinstance(parsed, dict):
+                        self._members.extend(parsed.items())
+                else:
+                    self._members.append((len(self._members), _loads_repaired(text)))
+            except ValueError:
+                pass
+
+    def _finish(self) -> bool:
+        try:
+            self.result = _loads_repaired("".join(self._out))
+        except ValueError:
+            return False
+        self.done = True
+        return True
+
+
+def _whole_span(text: str, opener: str, closer: str):
+    # Fast path for well-formed output: if everything from the first opener to the
+    # last closer is one valid value, that value is necessarily the first one.
+    start = text.find(opener)
+    end = text.rfind(closer)
+    if start < 0 or end < start:
+        return None
+    try:
+        return json.loads(text[start:end + 1], strict=False)
+    except ValueError:
+        return None
+
+
+def extract_json_object(text: str, allow_partial: bool = False) -> Optional[dict]:
+    """First top-level object; with allow_partial, the members completed before a truncation."""
+    parsed = _whole_span(text, "{", "}")
+    if isinstance(parsed, dict):
+        return parsed
+    ex = IncrementalJSONExtractor("{")
+    parsed = ex.feed(text)
+    if isinstance(parsed, dict):
+        return parsed
+    if allow_partial and ex.members():
+        return dict(ex.members())
+    return None
+
+
+def extract_json_array(text: str, allow_partial: bool = False) -> Optional[list]:
+    """First top-level array; with allow_partial, the elements completed before a truncation."""
+    parsed = _whole_span(text, "[", "]")
+    if isinstance(parsed, list):
+        return parsed
+    ex = IncrementalJSONExtractor("[")
+    parsed = ex.feed(text)
+    if isinstance(parsed, list):
+        return parsed
+    if allow_partial and ex.members():
+        return [value for _, value in ex.members()]
+    return None
@@ -1,16 +1,31 @@
 # locator_service_updated.py
 import os
-import math
 import json
+import math
+import time
 import requests
+import numpy as np
 from flask import Flask, request, jsonify, Response
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from geocode_store import GeocodeStore
+from locator_snapshot import SnapshotManager, build_snapshot, parse_specs
+from pharmacy_index import PharmacyIndex, haversine_m, haversine_np, nearest_contact_first, normalize_elements
+from place_search import PlaceIndex, canonical_key, result_keys
+from opening_hours import cache_stats as opening_hours_cache_stats, is_open, open_mask
+from rate_limit import RateLimited, UpstreamLimiter, priority_scope, retry_after_s, with_priority
+from resilience import race_first
+from tile_cache import TileCache, geohash_encode, precision_for_radius
+from triage_cache import SingleFlight
 
 # Config (no Google required)
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
-PHOTON_URL = "https://photon.komoot.io/api/"
+OVERPASS_URL = os.getenv("LOCATOR_OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+NOMINATIM_URL = os.getenv("LOCATOR_NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+PHOTON_URL = os.getenv("LOCATOR_PHOTON_URL", "https://photon.komoot.io/api/")
 DEFAULT_RADIUS_M = 20000  # search radius in meters
 DEFAULT_LIMIT = 5
 
@@ -19,89 +34,128 @@ USER_AGENT = os.getenv("LOCATOR_USER_AGENT", "MyLocatorAgent/1.0 (youremail@exam
 CONTACT_EMAIL = os.getenv("LOCATOR_CONTACT_EMAIL", "youremail@example.com")
 HEADERS = {"User-Agent": USER_AGENT, "From": CONTACT_EMAIL}
 
-# Simple cache
-CACHE_PATH = Path(os.getenv("LOCATOR_CACHE_PATH", "locator_cache.json"))
-_cache: Dict[str, Dict] = {}
+# Geocode cache: SQLite (WAL) shared by all workers. The old locator_cache.json
+# is imported into it once on first start.
+CACHE_PATH = Path(os.getenv("LOCATOR_CACHE_PATH", "locator_cache.json"))  # legacy JSON cache
+GEOCODE_DB_PATH = Path(os.getenv("LOCATOR_GEOCODE_DB", "locator_geocode.sqlite3"))
+GEOCODE_TTL_S = float(os.getenv("LOCATOR_GEOCODE_TTL_S", str(30 * 86400)))
+GEOCODE_MAX_ENTRIES = int(os.getenv("LOCATOR_GEOCODE_MAX_ENTRIES", "100000"))
 
 app = Flask(__name__)
 
 # ---------- Cache ----------
-def _load_cache():
-    global _cache
-    if CACHE_PATH.exists():
-        try:
-            with open(CACHE_PATH, "r", encoding="utf-8") as f:
-                _cache = json.load(f)
-        except Exception:
-            _cache = {}
-    else:
-        _cache = {}
+geocode_store = GeocodeStore(GEOCODE_DB_PATH, ttl_s=GEOCODE_TTL_S, max_entries=GEOCODE_MAX_ENTRIES)
+_migrated = geocode_store.migrate_json(CACHE_PATH)
+if _migrated:
+    print(f"Imported {_migrated} geocode entries from {CACHE_PATH}")
 
-def _save_cache():
+# ---------- Offline pharmacy index ----------
+# Built with `python pharmacy_index.py ingest ...`; optional.
+PHARMACY_INDEX_PATH = Path(os.getenv("LOCATOR_INDEX_PATH", "pharmacy_index.json"))
+pharmacy_index: Optional[PharmacyIndex] = None
+if PHARMACY_INDEX_PATH.exists():
     try:
-        with open(CACHE_PATH, "w", encoding="utf-8") as f:
-            json.dump(_cache, f)
+        pharmacy_index = PharmacyIndex.load(PHARMACY_INDEX_PATH)
+        print(f"Loaded pharmacy index: {len(pharmacy_index)} pharmacies, region {pharmacy_index.region}")
     except Exception as e:
-        print("Warning: failed to save cache:", e)
-
-_load_cache()
-
-# ---------- Utilities ----------
-def haversine_m(lat1, lon1, lat2, lon2) -> float:
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-def _format_address_from_tags(tags: Dict) -> str:
-    parts = []
-    if not tags:
-        return ""
-    for key in ("addr:street", "addr:housenumber", "addr:city", "addr:postcode", "addr:country"):
-        v = tags.get(key)
-        if v:
-            parts.append(v)
-    if not parts:
-        for key in ("street", "city", "village", "town"):
-            v = tags.get(key)
-            if v:
-                parts.append(v)
-    return ", ".join(parts)
+        print("Warning: pharmacy index disabled:", e)
+index_stats = {"hits": 0, "overpass": 0}
+
+# ---------- HTTP sessions ----------
+# One keep-alive session per upstream, each with its own connection pool
+def _make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+nominatim_session = _make_session(int(os.getenv("LOCATOR_NOMINATIM_POOL", "8")))
+photon_session = _make_session(int(os.getenv("LOCATOR_PHOTON_POOL", "8")))
+overpass_session = _make_session(int(os.getenv("LOCATOR_OVERPASS_POOL", "4")))
+
+# ---------- Upstream rate limits ----------
+# One token bucket per upstream, shared by every worker on the host through a
+# SQLite file, with a bounded wait queue per worker. EMERGENCY requests go first.
+# A call that cannot get a token within RATE_MAX_WAIT_S is answered with 503 and
+# Retry-After instead of an empty result. LOCATOR_RATE_LIMIT=0 turns limiting off.
+RATE_LIMIT = os.getenv("LOCATOR_RATE_LIMIT", "1").lower() not in ("0", "false", "no")
+RATE_LIMIT_DB = Path(os.getenv("LOCATOR_RATE_LIMIT_DB", "locator_ratelimit.sqlite3"))
+RATE_QUEUE_MAX = int(os.getenv("LOCATOR_RATE_QUEUE_MAX", "32"))
+RATE_MAX_WAIT_S = float(os.getenv("LOCATOR_RATE_MAX_WAIT_S", "10"))
+THROTTLE_PAUSE_S = float(os.getenv("LOCATOR_THROTTLE_PAUSE_S", "30"))  # after a 429 without Retry-After
+
+def _limiter(name: str, rate: float, burst: float) -> UpstreamLimiter:
+    # LOCATOR_<NAME>_RATE (requests/s, 0 = unlimited) and LOCATOR_<NAME>_BURST override the defaults
+    rate = float(os.getenv(f"LOCATOR_{name.upper()}_RATE", str(rate))) if RATE_LIMIT else 0.0
+    burst = float(os.getenv(f"LOCATOR_{name.upper()}_BURST", str(burst)))
+    return UpstreamLimiter(name, RATE_LIMIT_DB, rate, burst=burst, max_queue=RATE_QUEUE_MAX, max_wait_s=RATE_MAX_WAIT_S)
+
+limiters = {
+    "nominatim": _limiter("nominatim", 1.0, 1.0),  # usage policy: at most 1 request/s
+    "photon": _limiter("photon", 2.0, 2.0),
+    "overpass": _limiter("overpass", 0.5, 2.0),
+}
+
+def _check_throttled(name: str, r: requests.Response):
+    # A 429 pauses the upstream for every worker and surfaces as RateLimited, not as "no result"
+    if r.status_code == 429:
+        pause_s = retry_after_s(r, THROTTLE_PAUSE_S)
+        limiters[name].throttled(pause_s)
+        raise RateLimited(name, "upstream returned 429", pause_s)
+
+def is_emergency(payload: Dict) -> bool:
+    # EMERGENCY triage (an "urgency" field, or a situation starting with it) jumps the upstream queues
+    urgency = str(payload.get("urgency") or payload.get("situation") or "")
+    return urgency.strip().upper().startswith("EMERGENCY")
+
+def busy_response(e: RateLimited) -> Response:
+    resp = json_response({"status": "error", "message": f"{e.upstream} is busy, retry later",
+                          "retry_after_s": round(e.retry_after_s, 1), "results": []}, status=503)
+    resp.headers["Retry-After"] = str(max(1, int(math.ceil(e.retry_after_s))))
+    return resp
 
 # ---------- Geocoding ----------
-def geocode_location(location: str) -> Optional[Tuple[float, float, Dict]]:
-    key = location.strip().lower()
-    if not key:
-        return None
-    if key in _cache:
-        entry = _cache[key]
-        try:
-            return float(entry["lat"]), float(entry["lon"]), entry.get("meta", {})
-        except Exception:
-            pass
+# Race mode: Photon is fired when Nominatim has not answered within the hedge delay
+# (or has already failed); the first usable answer wins.
+NOMINATIM_TIMEOUT_S = float(os.getenv("LOCATOR_NOMINATIM_TIMEOUT_S", "10"))
+PHOTON_TIMEOUT_S = float(os.getenv("LOCATOR_PHOTON_TIMEOUT_S", "8"))
+GEOCODE_HEDGE = os.getenv("LOCATOR_GEOCODE_HEDGE", "0").lower() in ("1", "true", "yes")
+GEOCODE_HEDGE_DELAY_S = float(os.getenv("LOCATOR_GEOCODE_HEDGE_DELAY_S", "0.5"))
+
+_geocode_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LOCATOR_GEOCODE_WORKERS", "16")), thread_name_prefix="geocode")
+_geocode_flight = SingleFlight()  # concurrent lookups of the same place share one upstream call
+geocode_stats = {"nominatim": 0, "photon": 0, "failed": 0, "rate_limited": 0, "hedges": 0, "primary_wins": 0, "hedge_wins": 0}
 
+# Places already geocoded, by the text they were looked up with, for /locator/autocomplete.
+# Filled from the store here and from the warm-up snapshot as it loads.
+AUTOCOMPLETE_MAX_LIMIT = int(os.getenv("LOCATOR_AUTOCOMPLETE_MAX_LIMIT", "10"))
+place_index = PlaceIndex()
+place_index.load((key, label, lat, lon, meta) for key, label, lat, lon, meta in geocode_store.entries() if label)
+
+def _geocode_nominatim(location: str) -> Optional[Tuple[float, float, Dict]]:
     params = {"q": location, "format": "jsonv2", "limit": 1, "addressdetails": 1, "extratags": 1}
+    limiters["nominatim"].acquire()
     try:
-        r = requests.get(NOMINATIM_URL, params=params, headers=HEADERS, timeout=10)
+        r = nominatim_session.get(NOMINATIM_URL, params=params, timeout=NOMINATIM_TIMEOUT_S)
+        _check_throttled("nominatim", r)
         r.raise_for_status()
         data = r.json()
         if data:
             item = data[0]
-            lat = float(item["lat"])
-            lon = float(item["lon"])
-            _cache[key] = {"lat": lat, "lon": lon, "meta": item}
-            _save_cache()
-            return lat, lon, item
+            return float(item["lat"]), float(item["lon"]), item
+    except RateLimited:
+        raise
     except Exception as e:
         print("Nominatim geocode error:", e)
+    return None
 
-    # Photon fallback
+def _geocode_photon(location: str) -> Optional[Tuple[float, float, Dict]]:
+    limiters["photon"].acquire()
     try:
-        r2 = requests.get(PHOTON_URL, params={"q": location, "limit": 1}, headers=HEADERS, timeout=8)
+        r2 = photon_session.get(PHOTON_URL, params={"q": location, "limit": 1}, timeout=PHOTON_TIMEOUT_S)
+        _check_throttled("photon", r2)
         r2.raise_for_status()
         j2 = r2.json()
         hits = j2.get("features") or []
@@ -110,140 +164,235 @@ def geocode_location(location: str) -> Optional[Tuple[float, float, Dict]]:
             coords = hits[0].get("geometry", {}).get("coordinates", [])
             if len(coords) >= 2:
                 lon_p, lat_p = coords[0], coords[1]
-                _cache[key] = {"lat": lat_p, "lon": lon_p, "meta": props}
-                _save_cache()
                 return float(lat_p), float(lon_p), props
+    except RateLimited:
+        raise
     except Exception as e2:
         print("Photon fallback error:", e2)
-
     return None
 
+_GEOCODERS = {"nominatim": _geocode_nominatim, "photon": _geocode_photon}
+
+def _geocode_from(source: str, location: str, limited: Optional[List[RateLimited]] = None):
+    try:
+        result = _GEOCODERS[source](location)
+    except RateLimited as e:
+        if limited is not None:
+            limited.append(e)
+        return None
+    return (source, result) if result is not None else None
+
+def geocode_location(location: str, use_snapshot: bool = True) -> Optional[Tuple[float, float, Dict]]:
+    key = canonical_key(location)
+    if not key:
+        return None
+    cached = geocode_store.get(key)
+    legacy = location.strip().lower()
+    if not cached and legacy != key:
+        cached = geocode_store.get(legacy)  # stored before keys were canonical
+    if cached:
+        place_index.touch(key)
+        return cached
+    snap = snapshots.current() if use_snapshot else None
+    if snap is not None:
+        hit = snap.geocode(key)
+        if hit is not None:
+            snapshots.bump("geocode_hits")
+            place_index.touch(key)
+            return hit
+    return _geocode_flight.do(key, _geocode_upstream, location, key)
+
+def _geocode_upstream(location: str, key: str) -> Optional[Tuple[float, float, Dict]]:
+    # Raises RateLimited when no geocoder answered because of rate limits
+    limited: List[RateLimited] = []
+    if GEOCODE_HEDGE:
+        found = race_first(
+            _geocode_pool,
+            [(with_priority(_geocode_from), ("nominatim", location, limited)),
+             (with_priority(_geocode_from), ("photon", location, limited))],
+            hedge_delay_s=GEOCODE_HEDGE_DELAY_S,
+            timeout_s=max(NOMINATIM_TIMEOUT_S, PHOTON_TIMEOUT_S),
+            stats=geocode_stats,
+        )
+    else:
+        # Photon fallback only after Nominatim has failed (or is rate limited)
+        found = _geocode_from("nominatim", location, limited) or _geocode_from("photon", location, limited)
+
+    source, result = found or (None, None)
+    if result is None:
+        if limited:
+            geocode_stats["rate_limited"] += 1
+            raise min(limited, key=lambda e: e.retry_after_s)
+        geocode_stats["failed"] += 1
+        return None
+    geocode_stats[source] += 1
+    lat, lon, meta = result
+    for k in result_keys(key, meta):
+        geocode_store.put(k, lat, lon, meta, label=location.strip() if k == key else None)
+    place_index.add(key, location, lat, lon, meta)
+    return lat, lon, meta
+
 # ---------- Overpass ----------
+OVERPASS_TIMEOUT_S = float(os.getenv("LOCATOR_OVERPASS_TIMEOUT_S", "30"))
+
+def _fetch_overpass_sized(query: str, timeout_s: Optional[float] = None) -> Tuple[List[Dict], int]:
+    limiters["overpass"].acquire()
+    r = overpass_session.post(OVERPASS_URL, data=query, timeout=OVERPASS_TIMEOUT_S if timeout_s is None else timeout_s)
+    _check_throttled("overpass", r)
+    r.raise_for_status()
+    return r.json().get("elements", []), len(r.content)
+
+def _fetch_overpass(query: str, timeout_s: Optional[float] = None) -> List[Dict]:
+    return _fetch_overpass_sized(query, timeout_s)[0]
+
 def _run_overpass_query(query: str) -> List[Dict]:
     try:
-        r = requests.post(OVERPASS_URL, data=query, headers=HEADERS, timeout=30)
-        r.raise_for_status()
-        return r.json().get("elements", [])
+        return _fetch_overpass(query)
+    except RateLimited:
+        raise
     except Exception as e:
         print("Overpass error:", e)
         return []
 
-def find_pharmacies_overpass(lat: float, lon: float, radius: int = DEFAULT_RADIUS_M, limit: int = DEFAULT_LIMIT) -> List[Dict]:
-    phone_keys = ["phone", "contact:phone", "telephone", "tel", "mobile", "contact:mobile"]
-    email_keys = ["email", "contact:email", "e-mail"]
-    website_keys = ["website", "contact:website"]
-
-    contact_subqueries = []
-    for k in phone_keys + email_keys + website_keys:
-        contact_subqueries.append(f'node["amenity"="pharmacy"]["{k}"](around:{radius},{lat},{lon});')
-        contact_subqueries.append(f'way["amenity"="pharmacy"]["{k}"](around:{radius},{lat},{lon});')
-        contact_subqueries.append(f'relation["amenity"="pharmacy"]["{k}"](around:{radius},{lat},{lon});')
-
-    contact_query = "[out:json][timeout:25];(" + "\n".join(contact_subqueries) + ");out center tags;"
-    contact_elems = _run_overpass_query(contact_query)
-
-    seen = set()
-    results_with_contact = []
-    for elem in contact_elems:
-        key = f"{elem.get('type')}/{elem.get('id')}"
-        if key in seen:
-            continue
-        seen.add(key)
-        if elem.get("type") == "node":
-            lat_e, lon_e = elem.get("lat"), elem.get("lon")
-        else:
-            center = elem.get("center") or {}
-            lat_e, lon_e = center.get("lat"), center.get("lon")
-        if not lat_e or not lon_e:
-            continue
-        tags = elem.get("tags") or {}
-        name = tags.get("name") or tags.get("shop") or "Pharmacy"
-        phone = tags.get("phone") or tags.get("contact:phone") or tags.get("telephone") or tags.get("tel") or tags.get("mobile") or tags.get("contact:mobile")
-        email = tags.get("email") or tags.get("contact:email")
-        website = tags.get("website") or tags.get("contact:website")
-        opening = tags.get("opening_hours")
-        addr = {k: v for k, v in tags.items() if k.startswith("addr:") or k in ("postal_code", "city", "village", "street")}
-        formatted_addr = _format_address_from_tags(tags) or addr
-        dist = haversine_m(lat, lon, float(lat_e), float(lon_e))
-        results_with_contact.append({
-            "name": name,
-            "lat": float(lat_e),
-            "lon": float(lon_e),
-            "distance_m": round(dist, 1),
-            "address_tags": addr,
-            "formatted_address": formatted_addr,
-            "phone": phone,
-            "email": email,
-            "website": website,
-            "opening_hours": opening,
-            "osm_type": elem.get("type"),
-            "osm_id": elem.get("id"),
-        })
-
-    results_with_contact.sort(key=lambda x: x["distance_m"])
-    if len(results_with_contact) >= limit:
-        return results_with_contact[:limit]
-
-    all_query = f"""
-    [out:json][timeout:25];
-    (
-      node["amenity"="pharmacy"](around:{radius},{lat},{lon});
-      way["amenity"="pharmacy"](around:{radius},{lat},{lon});
-      relation["amenity"="pharmacy"](around:{radius},{lat},{lon});
-    );
-    out center tags;
-    """
-    all_elems = _run_overpass_query(all_query)
-    results_all = []
-    for elem in all_elems:
-        key = f"{elem.get('type')}/{elem.get('id')}"
-        if key in seen:
-            continue
-        if elem.get("type") == "node":
-            lat_e, lon_e = elem.get("lat"), elem.get("lon")
-        else:
-            center = elem.get("center") or {}
-            lat_e, lon_e = center.get("lat"), center.get("lon")
-        if not lat_e or not lon_e:
-            continue
-        tags = elem.get("tags") or {}
-        name = tags.get("name") or tags.get("shop") or "Pharmacy"
-        phone = tags.get("phone") or tags.get("contact:phone") or tags.get("telephone") or tags.get("tel") or tags.get("mobile") or tags.get("contact:mobile")
-        email = tags.get("email") or tags.get("contact:email")
-        website = tags.get("website") or tags.get("contact:website")
-        opening = tags.get("opening_hours")
-        addr = {k: v for k, v in tags.items() if k.startswith("addr:") or k in ("postal_code", "city", "village", "street")}
-        formatted_addr = _format_address_from_tags(tags) or addr
-        dist = haversine_m(lat, lon, float(lat_e), float(lon_e))
-        results_all.append({
-            "name": name,
-            "lat": float(lat_e),
-            "lon": float(lon_e),
-            "distance_m": round(dist, 1),
-            "address_tags": addr,
-            "formatted_address": formatted_addr,
-            "phone": phone,
-            "email": email,
-            "website": website,
-            "opening_hours": opening,
-            "osm_type": elem.get("type"),
-            "osm_id": elem.get("id"),
-        })
-
-    results_all.sort(key=lambda x: x["distance_m"])
-    merged = results_with_contact + results_all
-    final = []
-    seen_ids = set()
-    for r in merged:
-        oid = f"{r.get('osm_type')}/{r.get('osm_id')}"
-        if oid in seen_ids:
-            continue
-        seen_ids.add(oid)
-        final.append(r)
-        if len(final) >= limit:
+# Overpass results cached per geohash tile; TILE_CACHE_SIZE=0 queries Overpass directly
+TILE_CACHE_SIZE = int(os.getenv("LOCATOR_TILE_CACHE_SIZE", "4096"))
+TILE_TTL_S = float(os.getenv("LOCATOR_TILE_TTL_S", "86400"))
+tile_cache = TileCache(lambda q: _fetch_overpass(q), ttl_s=TILE_TTL_S, max_tiles=TILE_CACHE_SIZE) if TILE_CACHE_SIZE > 0 else None
+
+def find_pharmacies_overpass(lat: float, lon: float, radius: int = DEFAULT_RADIUS_M, limit: int = DEFAULT_LIMIT,
+                             open_at: Optional[datetime] = None, include_unknown: bool = False) -> List[Dict]:
+    # Inside the indexed region the offline index answers; Overpass covers everything else.
+    # With open_at, closed pharmacies are dropped before the top-k cut.
+    if pharmacy_index is not None and pharmacy_index.covers(lat, lon, radius):
+        index_stats["hits"] += 1
+        return pharmacy_index.nearest(lat, lon, radius, limit, open_at=open_at, include_unknown=include_unknown)
+    snap = snapshots.current()
+    if snap is not None and snap.covers(lat, lon, radius):
+        snapshots.bump("hits")
+        return snap.nearest(lat, lon, radius, limit, open_at=open_at, include_unknown=include_unknown)
+    index_stats["overpass"] += 1
+    tiles = tile_cache.candidates(lat, lon, radius) if tile_cache is not None else None
+    if tiles is not None:
+        records, lats, lons, contact = tiles
+        mask = open_mask((r.opening_hours for r in records), open_at, include_unknown) if open_at is not None else None
+        return nearest_contact_first(lat, lon, lats, lons, contact, records.__getitem__, limit, radius_m=radius, mask=mask)
+
+    # No tile cache, or a tile fetch failed: ask Overpass for the circle directly.
+    # One area scan and one round trip; contact-first ranking happens here rather than in Overpass
+    elements = _run_overpass_query(plan_overpass_query(lat, lon, radius))
+    return _rank_elements(elements, lat, lon, limit, open_at=open_at, include_unknown=include_unknown)
+
+def plan_overpass_query(lat: float, lon: float, radius: int) -> str:
+    return f'[out:json][timeout:25];nwr["amenity"="pharmacy"](around:{radius},{lat},{lon});out center tags;'
+
+def _open_mask_at(record_at, n: int, open_at: Optional[datetime], include_unknown: bool):
+    if open_at is None:
+        return None
+    return open_mask((record_at(i).opening_hours for i in range(n)), open_at, include_unknown)
+
+def _rank_elements(elements: List[Dict], lat: float, lon: float, limit: int,
+                   open_at: Optional[datetime] = None, include_unknown: bool = False) -> List[Dict]:
+    record_at, lats, lons, contact = normalize_elements(elements)
+    mask = _open_mask_at(record_at, len(lats), open_at, include_unknown)
+    return nearest_contact_first(lat, lon, lats, lons, contact, record_at, limit, mask=mask)
+
+def _answered_locally(lat: float, lon: float, radius: float) -> Optional[str]:
+    # "index" or "snapshot" when find_pharmacies_overpass needs no Overpass call for this circle
+    if pharmacy_index is not None and pharmacy_index.covers(lat, lon, radius):
+        return "index"
+    snap = snapshots.current()
+    if snap is not None and snap.covers(lat, lon, radius):
+        return "snapshot"
+    return None
+
+# ---------- Warm-up snapshot ----------
+# Geocodes and every pharmacy of the configured areas (cities or south,west,north,east
+# boxes, ";"-separated), prebuilt into one memory-mapped file. Each worker loads it at
+# startup; a background thread picks up newer files and rebuilds it once it is older
+# than SNAPSHOT_REFRESH_S (one worker per host does the upstream work). A named area
+# covers WARMUP_MARGIN_M around its geocode, so default-radius searches near it fit.
+SNAPSHOT_PATH = Path(os.getenv("LOCATOR_SNAPSHOT_PATH", "locator_snapshot.bin"))
+WARMUP_AREAS = parse_specs(os.getenv("LOCATOR_WARMUP_AREAS", ""))
+WARMUP_PLACES = parse_specs(os.getenv("LOCATOR_WARMUP_PLACES", ""))  # extra place names to pre-geocode
+WARMUP_MARGIN_M = float(os.getenv("LOCATOR_WARMUP_MARGIN_M", str(2 * DEFAULT_RADIUS_M)))
+SNAPSHOT_REFRESH_S = float(os.getenv("LOCATOR_SNAPSHOT_REFRESH_S", str(6 * 3600)))
+SNAPSHOT_CHECK_S = float(os.getenv("LOCATOR_SNAPSHOT_CHECK_S", "60"))
+# Whole-area queries run far longer than a search: Overpass gets this long ([timeout:N])
+# and the HTTP read a little more, so its own timeout error still reaches us
+SNAPSHOT_TIMEOUT_S = float(os.getenv("LOCATOR_SNAPSHOT_TIMEOUT_S", "180"))
+
+def snapshot_fetch(query: str) -> List[Dict]:
+    return _fetch_overpass(query, timeout_s=SNAPSHOT_TIMEOUT_S + 10)
+
+def _build_snapshot(path: Path) -> Dict:
+    # Area geocodes go through the store (and upstream), never through the snapshot being replaced
+    return build_snapshot(path, WARMUP_AREAS, WARMUP_PLACES, geocode=lambda q: geocode_location(q, use_snapshot=False),
+                          fetch=snapshot_fetch, margin_m=WARMUP_MARGIN_M, timeout_s=SNAPSHOT_TIMEOUT_S)
+
+snapshots = SnapshotManager(SNAPSHOT_PATH, WARMUP_AREAS, WARMUP_PLACES, build=_build_snapshot,
+                            refresh_s=SNAPSHOT_REFRESH_S, check_s=SNAPSHOT_CHECK_S,
+                            on_load=lambda snap: place_index.load(snap.places()))
+
+# ---------- Adaptive search ----------
+# Rings of growing radius instead of one query at the full radius. A ring is
+# final once it holds `limit` pharmacies with contact tags: under the
+# contact-first rule nothing farther out can displace them. Otherwise the
+# radius grows by ADAPTIVE_GROWTH until it reaches the caller's radius_m.
+SEARCH_MODE = os.getenv("LOCATOR_SEARCH_MODE", "fixed")  # fixed | adaptive
+ADAPTIVE_START_M = float(os.getenv("LOCATOR_ADAPTIVE_START_M", "1000"))
+ADAPTIVE_GROWTH = float(os.getenv("LOCATOR_ADAPTIVE_GROWTH", "2.0"))
+ring_stats = {"searches": 0, "rings": 0, "bytes": 0, "elements": 0, "errors": 0, "rate_limited": 0, "rings_needed": {}}
+
+def ring_radii(radius: int, start_m: float = None, growth: float = None) -> List[int]:
+    start_m = ADAPTIVE_START_M if start_m is None else start_m
+    growth = max(ADAPTIVE_GROWTH if growth is None else growth, 1.1)
+    radii, r = [], max(1.0, start_m)
+    while r < radius:
+        radii.append(int(math.ceil(r)))
+        r *= growth
+    radii.append(int(radius))
+    return radii
+
+def find_pharmacies_adaptive(lat: float, lon: float, radius: int = DEFAULT_RADIUS_M, limit: int = DEFAULT_LIMIT,
+                             open_at: Optional[datetime] = None, include_unknown: bool = False) -> Tuple[List[Dict], Dict]:
+    """(results, telemetry): find_pharmacies_overpass's answer, fetched ring by ring."""
+    source = _answered_locally(lat, lon, radius)
+    if source is not None:
+        return (find_pharmacies_overpass(lat, lon, radius=radius, limit=limit, open_at=open_at, include_unknown=include_unknown),
+                {"mode": "adaptive", "source": source, "rings": [], "exact": True})
+
+    rings, results, exact = [], [], False
+    for r in ring_radii(radius):
+        start = time.perf_counter()
+        try:
+            elements, nbytes = _fetch_overpass_sized(plan_overpass_query(lat, lon, r))
+        except RateLimited:
+            ring_stats["rate_limited"] += 1
+            if not rings:
+                raise
+            break  # the last complete ring's answer, flagged as not exact
+        except Exception as e:
+            print("Overpass error:", e)
+            ring_stats["errors"] += 1
+            break  # keep the last complete ring's answer, flagged as not exact
+        record_at, lats, lons, contact = normalize_elements(elements)
+        mask = _open_mask_at(record_at, len(lats), open_at, include_unknown)
+        results = nearest_contact_first(lat, lon, lats, lons, contact, record_at, limit, mask=mask)
+        rings.append({"radius_m": r, "elements": len(elements), "bytes": nbytes,
+                      "ms": round((time.perf_counter() - start) * 1000, 1)})
+        eligible = contact if mask is None else contact & mask
+        with_contact = int(np.count_nonzero(eligible & (haversine_np(lat, lon, lats, lons) <= r)))
+        if r >= radius or with_contact >= limit:
+            exact = True
             break
 
-    return final
+    ring_stats["searches"] += 1
+    ring_stats["rings"] += len(rings)
+    ring_stats["bytes"] += sum(x["bytes"] for x in rings)
+    ring_stats["elements"] += sum(x["elements"] for x in rings)
+    ring_stats["rings_needed"][len(rings)] = ring_stats["rings_needed"].get(len(rings), 0) + 1
+    index_stats["overpass"] += 1
+    return results, {"mode": "adaptive", "source": "overpass", "rings": rings, "exact": exact}
 
 # ---------- Unified ----------
 def get_nearest_pharmacies(
@@ -252,18 +401,300 @@ def get_nearest_pharmacies(
     provider: str = "overpass",
     radius_m: int = DEFAULT_RADIUS_M,
     limit: int = DEFAULT_LIMIT,
+    search: Optional[str] = None,
+    open_at: Optional[datetime] = None,
+    include_unknown: bool = False,
 ) -> Dict:
     geo = geocode_location(location_text)
     if not geo:
         return {"status": "error", "message": "Could not geocode location", "results": []}
     lat, lon, geo_meta = geo
-    results = find_pharmacies_overpass(lat, lon, radius=radius_m, limit=limit)
-    return {
+    out = {
         "status": "ok",
         "provider": "overpass",
         "query_location": {"input": location_text, "lat": lat, "lon": lon, "raw_geocode": geo_meta},
         "situation": situation,
-        "results": results,
+    }
+    out["results"], search_info = find_pharmacies(lat, lon, radius=radius_m, limit=limit, search=search,
+                                                  open_at=open_at, include_unknown=include_unknown)
+    if search_info is not None:
+        out["search"] = search_info
+    if open_at is not None:
+        out["open_at"] = open_at.isoformat()
+    return out
+
+def find_pharmacies(lat: float, lon: float, radius: int = DEFAULT_RADIUS_M, limit: int = DEFAULT_LIMIT,
+                    search: Optional[str] = None, open_at: Optional[datetime] = None,
+                    include_unknown: bool = False) -> Tuple[List[Dict], Optional[Dict]]:
+    # (results, adaptive telemetry or None); with open_at each result also says whether it is open then
+    if (search or SEARCH_MODE) == "adaptive":
+        results, search_info = find_pharmacies_adaptive(lat, lon, radius=radius, limit=limit, open_at=open_at,
+                                                        include_unknown=include_unknown)
+    else:
+        results, search_info = find_pharmacies_overpass(lat, lon, radius=radius, limit=limit, open_at=open_at,
+                                                        include_unknown=include_unknown), None
+    if open_at is not None:
+        for r in results:
+            r["open"] = is_open(r.get("opening_hours"), open_at)
+    return results, search_info
+
+# ---------- Opening hours ----------
+# open_now / open_at are evaluated in the request's "timezone" (IANA name), else
+# LOCATOR_TIMEZONE, else the server's local time. An open_at carrying an offset
+# is converted to that zone; a naive one is taken as local wall-clock time.
+LOCATOR_TIMEZONE = os.getenv("LOCATOR_TIMEZONE", "")
+
+def resolve_open_at(payload: Dict) -> Optional[datetime]:
+    """The moment a request filters on, or None; raises ValueError on a bad open_at or timezone."""
+    open_at, open_now = payload.get("open_at"), payload.get("open_now")
+    if not open_at and not open_now:
+        return None
+    tz_name = payload.get("timezone") or LOCATOR_TIMEZONE
+    try:
+        tz = ZoneInfo(tz_name) if tz_name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown timezone: {tz_name}")
+    if open_at:
+        try:
+            when = datetime.fromisoformat(str(open_at))
+        except ValueError:
+            raise ValueError("open_at must be an ISO 8601 date-time")
+        if when.tzinfo is not None:
+            when = when.astimezone(tz) if tz is not None else when.astimezone()
+        return when
+    return datetime.now(tz) if tz is not None else datetime.now().astimezone()
+
+# ---------- Response shaping ----------
+# compact drops raw_geocode, address_tags and null members; fields keeps only the
+# named result members. orjson, when installed, replaces jsonify for JSON bodies.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_ENCODER = os.getenv("LOCATOR_JSON_ENCODER", "orjson" if orjson is not None else "json")  # orjson | json
+COMPACT_DROP = ("address_tags",)
+
+def parse_fields(value) -> Optional[List[str]]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or not all(isinstance(f, str) for f in value):
+        raise ValueError("fields must be a list of names or a comma-separated string")
+    return [f.strip() for f in value if f.strip()]
+
+def shape_result(record: Dict, fields: Optional[List[str]] = None, compact: bool = False) -> Dict:
+    if fields is not None:
+        record = {k: record[k] for k in fields if k in record}
+    elif compact:
+        record = {k: v for k, v in record.items() if k not in COMPACT_DROP}
+    if compact:
+        record = {k: v for k, v in record.items() if v is not None}
+    return record
+
+def shape_output(out: Dict, fields: Optional[List[str]] = None, compact: bool = False) -> Dict:
+    if fields is None and not compact:
+        return out
+    shaped = dict(out)
+    if compact and isinstance(out.get("query_location"), dict):
+        shaped["query_location"] = {k: v for k, v in out["query_location"].items() if k != "raw_geocode"}
+    if "results" in out:
+        shaped["results"] = [shape_result(r, fields, compact) for r in out["results"]]
+    return shaped
+
+def dumps_json(obj) -> bytes:
+    if JSON_ENCODER == "orjson" and orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def json_response(obj, status: int = 200) -> Response:
+    # Always a Response, so callers can set headers whichever encoder is used
+    if JSON_ENCODER == "orjson" and orjson is not None:
+        return Response(dumps_json(obj), status=status, mimetype="application/json")
+    resp = jsonify(obj)
+    resp.status_code = status
+    return resp
+
+def ndjson_stream(header: Dict, lat: float, lon: float, radius: int, limit: int, search: Optional[str],
+                  fields: Optional[List[str]], compact: bool, open_at: Optional[datetime] = None,
+                  include_unknown: bool = False, priority: bool = False):
+    # Header first (sent before the pharmacy lookup), then one line per pharmacy, then a trailer.
+    # Contact-first ranking needs every candidate, so the first pharmacy is only known once the
+    # lookup has finished: the pharmacy lines save the client buffering, not server time.
+    yield dumps_json(header) + b"\n"
+    try:
+        with priority_scope(priority):  # the body runs after the view has returned
+            results, search_info = find_pharmacies(lat, lon, radius=radius, limit=limit, search=search, open_at=open_at,
+                                                   include_unknown=include_unknown)
+    except RateLimited as e:
+        yield dumps_json({"done": False, "status": "error", "message": f"{e.upstream} is busy, retry later",
+                          "retry_after_s": round(e.retry_after_s, 1)}) + b"\n"
+        return
+    for record in results:
+        yield dumps_json(shape_result(record, fields, compact)) + b"\n"
+    trailer = {"done": True, "count": len(results)}
+    if search_info is not None:
+        trailer["search"] = search_info
+    yield dumps_json(trailer) + b"\n"
+
+def pretty_text(out: Dict):
+    loc = out.get("query_location", {})
+    yield f"Top {len(out.get('results', []))} pharmacies near {loc.get('input')} (lat={loc.get('lat')}, lon={loc.get('lon')})\n---"
+    for i, r in enumerate(out.get("results", []), start=1):
+        lines = [f"{i}. {r.get('name')} — {r.get('distance_m')} m"]
+        addr = r.get('formatted_address') or r.get('address_tags') or ''
+        if isinstance(addr, dict):
+            addr = ", ".join([f"{k}:{v}" for k, v in addr.items()])
+        lines.append(f"   Address: {addr or 'N/A'}")
+        lines.append(f"   Phone: {r.get('phone') or 'N/A'}")
+        lines.append(f"   Email: {r.get('email') or 'N/A'}")
+        lines.append(f"   Website: {r.get('website') or 'N/A'}")
+        lines.append(f"   Opening: {r.get('opening_hours') or 'N/A'}")
+        lines.append(f"   Location: {r.get('lat')}, {r.get('lon')}")
+        if r.get('osm_type') and r.get('osm_id'):
+            lines.append(f"   OSM: {r.get('osm_type')}/{r.get('osm_id')}")
+        yield "\n" + "\n".join(lines) + "\n"
+
+# ---------- Batch ----------
+# Unique locations are geocoded on a small shared pool (the cap is what keeps a
+# batch within Nominatim's rate limits); points are then grouped per geohash
+# cell and each group shares one candidate lookup.
+BATCH_MAX_ITEMS = int(os.getenv("LOCATOR_BATCH_MAX_ITEMS", "500"))
+_batch_geocode_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LOCATOR_BATCH_GEOCODE_WORKERS", "4")), thread_name_prefix="batch-geocode")
+_batch_lookup_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LOCATOR_BATCH_LOOKUP_WORKERS", "4")), thread_name_prefix="batch-lookup")
+
+def _group_candidates(lat: float, lon: float, radius: float):
+    # (record_at, lats, lons, contact) for every pharmacy that may lie within `radius` of (lat, lon)
+    tiles = tile_cache.candidates(lat, lon, radius) if tile_cache is not None else None
+    if tiles is not None:
+        records, lats, lons, contact = tiles
+        return records.__getitem__, lats, lons, contact
+    return normalize_elements(_run_overpass_query(plan_overpass_query(lat, lon, int(math.ceil(radius)))))
+
+def find_pharmacies_group(points: List[Tuple[float, float]], radius: int = DEFAULT_RADIUS_M, limit: int = DEFAULT_LIMIT) -> List[List[Dict]]:
+    """find_pharmacies_overpass for nearby points, with one lookup around their centroid."""
+    out: List[Optional[List[Dict]]] = [None] * len(points)
+    rest = []
+    for j, (la, lo) in enumerate(points):
+        if _answered_locally(la, lo, radius) is not None:
+            out[j] = find_pharmacies_overpass(la, lo, radius=radius, limit=limit)
+        else:
+            rest.append(j)
+    if len(rest) == 1:
+        out[rest[0]] = find_pharmacies_overpass(*points[rest[0]], radius=radius, limit=limit)
+    elif rest:
+        index_stats["overpass"] += len(rest)
+        c_lat = sum(points[j][0] for j in rest) / len(rest)
+        c_lon = sum(points[j][1] for j in rest) / len(rest)
+        spread = max(haversine_m(c_lat, c_lon, *points[j]) for j in rest)
+        record_at, lats, lons, contact = _group_candidates(c_lat, c_lon, radius + spread + 50)  # 50 m slack for Overpass' own distance
+        for j in rest:
+            out[j] = nearest_contact_first(points[j][0], points[j][1], lats, lons, contact, record_at, limit, radius_m=radius)
+    return out
+
+def _batch_item(item, default_radius: int, default_limit: int) -> Dict:
+    # Normalizes one batch entry: a location string, {"location": ...} or {"lat": ..., "lon": ...}
+    if isinstance(item, str):
+        item = {"location": item}
+    if not isinstance(item, dict):
+        raise ValueError("item must be a string or an object")
+    out = {"id": item.get("id"), "situation": item.get("situation", ""),
+           "radius": int(item.get("radius_m", default_radius)), "limit": int(item.get("limit", default_limit))}
+    if item.get("lat") is not None and item.get("lon") is not None:
+        lat, lon = float(item["lat"]), float(item["lon"])
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            raise ValueError("lat/lon out of range")
+        out["point"] = (lat, lon)
+        return out
+    location = item.get("location") or item.get("city") or item.get("query")
+    if not location or not str(location).strip():
+        raise ValueError("No location provided")
+    out["location"] = str(location)
+    return out
+
+def locate_batch(items: List, radius_m: int = DEFAULT_RADIUS_M, limit: int = DEFAULT_LIMIT, situation: str = "") -> Dict:
+    results: List[Optional[Dict]] = [None] * len(items)
+    parsed = {}
+    for i, raw in enumerate(items):
+        try:
+            parsed[i] = _batch_item(raw, radius_m, limit)
+        except (TypeError, ValueError) as e:
+            results[i] = {"status": "error", "message": str(e), "results": []}
+
+    # Geocode each distinct location once
+    wanted = {}
+    for item in parsed.values():
+        if "location" in item:
+            wanted.setdefault(canonical_key(item["location"]), item["location"])
+    futures = {key: _batch_geocode_pool.submit(with_priority(geocode_location), text) for key, text in wanted.items()}
+    geocoded = {}
+    for key, fut in futures.items():
+        try:
+            geocoded[key] = fut.result()
+        except RateLimited as e:
+            geocoded[key] = e
+        except Exception as e:
+            print("Batch geocode error:", e)
+            geocoded[key] = None
+
+    # Group resolved points by (radius, limit, geohash cell) and look each group up once
+    groups: Dict[Tuple, List[int]] = {}
+    for i, item in parsed.items():
+        if "point" in item:
+            item["lat"], item["lon"] = item["point"]
+            item["raw_geocode"] = None
+        else:
+            geo = geocoded.get(canonical_key(item["location"]))
+            if isinstance(geo, RateLimited):
+                results[i] = {"status": "error", "message": f"{geo.upstream} is busy, retry later",
+                              "retry_after_s": round(geo.retry_after_s, 1), "results": []}
+                continue
+            if not geo:
+                results[i] = {"status": "error", "message": "Could not geocode location", "results": []}
+                continue
+            item["lat"], item["lon"], item["raw_geocode"] = geo
+        cell = geohash_encode(item["lat"], item["lon"], precision_for_radius(item["radius"]))
+        groups.setdefault((item["radius"], item["limit"], cell), []).append(i)
+
+    lookups = {key: _batch_lookup_pool.submit(with_priority(find_pharmacies_group), [(parsed[i]["lat"], parsed[i]["lon"]) for i in members],
+                                              key[0], key[1])
+               for key, members in groups.items()}
+    for key, fut in lookups.items():
+        try:
+            found = fut.result()
+        except RateLimited as e:
+            for i in groups[key]:
+                results[i] = {"status": "error", "message": f"{e.upstream} is busy, retry later",
+                              "retry_after_s": round(e.retry_after_s, 1), "results": []}
+            continue
+        except Exception as e:
+            print("Batch lookup error:", e)
+            found = [[] for _ in groups[key]]
+        for i, pharmacies in zip(groups[key], found):
+            item = parsed[i]
+            query_location = {"lat": item["lat"], "lon": item["lon"]}
+            if "location" in item:
+                query_location = {"input": item["location"], "lat": item["lat"], "lon": item["lon"], "raw_geocode": item["raw_geocode"]}
+            results[i] = {
+                "status": "ok",
+                "provider": "overpass",
+                "query_location": query_location,
+                "situation": item["situation"] or situation,
+                "results": pharmacies,
+            }
+
+    for i, raw in enumerate(items):
+        # Ids are echoed on every item, including those that could not be parsed
+        item_id = raw.get("id") if isinstance(raw, dict) else None
+        if item_id is not None:
+            results[i] = dict({"id": item_id}, **results[i])
+    return {
+        "status": "ok",
+        "count": len(items),
+        "unique_locations": len(wanted),
+        "lookups": len(groups),
+        "items": results,
     }
 
 # ---------- Flask ----------
@@ -277,36 +708,96 @@ def locator_endpoint():
     radius = int(payload.get("radius_m", DEFAULT_RADIUS_M))
     limit = int(payload.get("limit", DEFAULT_LIMIT))
     out_format = (payload.get("format") or "json").lower()
+    search = payload.get("search")
+    if search not in (None, "fixed", "adaptive"):
+        return jsonify({"status": "error", "message": "search must be 'fixed' or 'adaptive'"}), 400
+    compact = bool(payload.get("compact", False))
+    try:
+        fields = parse_fields(payload.get("fields"))
+        open_at = resolve_open_at(payload)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    include_unknown = bool(payload.get("include_unknown", False))
+    priority = is_emergency(payload)
 
-    out = get_nearest_pharmacies(situation, location_text, provider="overpass", radius_m=radius, limit=limit)
+    if out_format == "ndjson":
+        try:
+            with priority_scope(priority):
+                geo = geocode_location(location_text)
+        except RateLimited as e:
+            return busy_response(e)
+        if not geo:
+            return json_response({"status": "error", "message": "Could not geocode location", "results": []})
+        lat, lon, geo_meta = geo
+        header = shape_output({
+            "status": "ok",
+            "provider": "overpass",
+            "query_location": {"input": location_text, "lat": lat, "lon": lon, "raw_geocode": geo_meta},
+            "situation": situation,
+        }, compact=compact)
+        if open_at is not None:
+            header["open_at"] = open_at.isoformat()
+        return Response(ndjson_stream(header, lat, lon, radius, limit, search, fields, compact, open_at, include_unknown,
+                                      priority), mimetype="application/x-ndjson")
+
+    try:
+        with priority_scope(priority):
+            out = get_nearest_pharmacies(situation, location_text, provider="overpass", radius_m=radius, limit=limit,
+                                         search=search, open_at=open_at, include_unknown=include_unknown)
+    except RateLimited as e:
+        return busy_response(e)
 
     if out.get("status") != "ok":
-        return jsonify(out), 200
+        return json_response(out)
 
     if out_format == "pretty":
-        lines = []
-        loc = out.get("query_location", {})
-        header = f"Top {len(out.get('results', []))} pharmacies near {loc.get('input')} (lat={loc.get('lat')}, lon={loc.get('lon')})"
-        lines.append(header)
-        lines.append("---")
-        for i, r in enumerate(out.get("results", []), start=1):
-            lines.append(f"{i}. {r.get('name')} — {r.get('distance_m')} m")
-            addr = r.get('formatted_address') or r.get('address_tags') or ''
-            if isinstance(addr, dict):
-                addr = ", ".join([f"{k}:{v}" for k, v in addr.items()])
-            lines.append(f"   Address: {addr or 'N/A'}")
-            lines.append(f"   Phone: {r.get('phone') or 'N/A'}")
-            lines.append(f"   Email: {r.get('email') or 'N/A'}")
-            lines.append(f"   Website: {r.get('website') or 'N/A'}")
-            lines.append(f"   Opening: {r.get('opening_hours') or 'N/A'}")
-            lines.append(f"   Location: {r.get('lat')}, {r.get('lon')}")
-            if r.get('osm_type') and r.get('osm_id'):
-                lines.append(f"   OSM: {r.get('osm_type')}/{r.get('osm_id')}")
-            lines.append("")
-        text = "\n".join(lines)
-        return Response(text, mimetype='text/plain')
-
-    return jsonify(out)
+        return Response(pretty_text(out), mimetype='text/plain')
+
+    return json_response(shape_output(out, fields, compact))
+
+@app.route("/locator/batch", methods=["POST"])
+def locator_batch_endpoint():
+    payload = request.get_json(force=True)
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return jsonify({"status": "error", "message": "No items provided"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"status": "error", "message": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+    options = payload if isinstance(payload, dict) else {}
+    radius = int(options.get("radius_m", DEFAULT_RADIUS_M))
+    limit = int(options.get("limit", DEFAULT_LIMIT))
+    compact = bool(options.get("compact", False))
+    try:
+        fields = parse_fields(options.get("fields"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    with priority_scope(is_emergency(options)):
+        out = locate_batch(items, radius_m=radius, limit=limit, situation=options.get("situation", ""))
+    out["items"] = [shape_output(item, fields, compact) for item in out["items"]]
+    return json_response(out)
+
+@app.route("/locator/autocomplete", methods=["GET"])
+def locator_autocomplete():
+    # Suggestions from places already geocoded; never calls an upstream
+    query = request.args.get("q", "")
+    try:
+        limit = min(int(request.args.get("limit", DEFAULT_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+    return json_response({"status": "ok", "query": query, "suggestions": place_index.suggest(query, limit)})
+
+@app.route("/locator/stats", methods=["GET"])
+def locator_stats():
+    return jsonify({
+        "geocode": dict(geocode_store.stats(), upstream=geocode_stats, coalesced=_geocode_flight.stats()),
+        "index": dict(pharmacy_index.stats(), **index_stats) if pharmacy_index is not None else dict(index_stats, enabled=False),
+        "tiles": tile_cache.stats() if tile_cache is not None else {"enabled": False},
+        "adaptive": dict(ring_stats, mode=SEARCH_MODE, start_m=ADAPTIVE_START_M, growth=ADAPTIVE_GROWTH),
+        "opening_hours": opening_hours_cache_stats(),
+        "snapshot": snapshots.stats(),
+        "autocomplete": place_index.stats(),
+        "rate_limits": {name: limiter.stats() for name, limiter in limiters.items()},
+    })
 
 # Run
 if __name__ == "__main__":
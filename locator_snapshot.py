@@ -0,0 +1,457 @@
+# locator_snapshot.py
+# Prebuilt warm-up snapshots for locator_service's configured service areas.
+#
+# After a deploy the geocode store and tile cache are cold, so the first users
+# in every city pay full Nominatim and Overpass latency. A snapshot holds, for a
+# list of cities or bounding boxes, their geocodes and every pharmacy inside
+# each area, in one versioned file. The locator loads it at startup and answers
+# from it any search circle that lies inside a snapshot area.
+#
+#   python locator_snapshot.py build --area Lyon --area 48.80,2.25,48.92,2.42 --place "Bellecour, Lyon" -o locator_snapshot.bin
+#   python locator_snapshot.py info locator_snapshot.bin
+#   python locator_snapshot.py query locator_snapshot.bin 45.764 4.8357 --radius 2000
+#
+# The file is opened with a read-only mmap: coordinates, contact flags and
+# opening_hours ids are fixed-width arrays used in place, so workers on one host
+# share the same page-cache pages instead of each holding a copy, and a
+# pharmacy's tags are decoded only when a ranking picks it.
+#
+# Layout (little-endian): MAGIC, u64 header offset, u64 header length, the
+# arrays (8-byte aligned, records sorted by latitude), then a JSON header with
+# the version, areas, geocodes, the opening_hours value table and array offsets.
+import argparse
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from opening_hours import open_mask
+from pharmacy_index import Pharmacy, _display_name, has_contact, nearest_contact_first
+from place_search import canonical_key
+from tile_cache import circle_bbox
+
+MAGIC = b"LOCSNAP\x00"
+VERSION = 1
+_PREFIX = struct.Struct("<8sQQ")
+
+
+def parse_specs(text: str) -> List[str]:
+    """Area or place specs from a ";" or newline separated list (LOCATOR_WARMUP_AREAS style)."""
+    return [s.strip() for s in text.replace("\n", ";").split(";") if s.strip()]
+
+
+def parse_bbox(spec: str) -> Optional[Tuple[float, float, float, float]]:
+    """(south, west, north, east) when `spec` is four numbers, else None (it names a place)."""
+    parts = spec.split(",")
+    if len(parts) != 4:
+        return None
+    try:
+        s, w, n, e = (float(x) for x in parts)
+    except ValueError:
+        return None
+    if s >= n or w >= e:
+        raise ValueError(f"bbox must be south,west,north,east: {spec}")
+    return s, w, n, e
+
+
+# --- Build ---
+def build_snapshot(path, areas: Iterable[str], places: Iterable[str] = (),
+                   geocode: Callable[[str], Optional[Tuple[float, float, Dict]]] = None,
+                   fetch: Callable[[str], List[Dict]] = None, margin_m: float = 40000.0,
+                   timeout_s: float = 180.0) -> Dict:
+    """
+    Geocode every area and place, fetch all pharmacies of each area (one Overpass
+    bbox query per area, allowed `timeout_s` server-side) and write the snapshot
+    to `path`. A named area covers `margin_m` around its geocode. Raises when an
+    Overpass fetch fails, so a partial snapshot never replaces a complete one.
+    Returns the header.
+    """
+    areas, places = list(areas), list(places)
+    geocodes: Dict[str, List] = {}
+    resolved = []
+    for spec in areas:
+        bbox = parse_bbox(spec)
+        if bbox is None:
+            geo = geocode(spec)
+            if geo is None:
+                print(f"Warning: snapshot area {spec!r} could not be geocoded; skipped")
+                continue
+            geocodes[canonical_key(spec)] = [geo[0], geo[1], geo[2]]
+            bbox = circle_bbox(geo[0], geo[1], margin_m)
+        resolved.append({"spec": spec, "bbox": [round(v, 7) for v in bbox]})
+    for spec in places:
+        if canonical_key(spec) in geocodes:
+            continue
+        geo = geocode(spec)
+        if geo is None:
+            print(f"Warning: snapshot place {spec!r} could not be geocoded; skipped")
+            continue
+        geocodes[canonical_key(spec)] = [geo[0], geo[1], geo[2]]
+
+    records, contact, seen = [], [], set()
+    for area in resolved:
+        s, w, n, e = area["bbox"]
+        elements = fetch(f'[out:json][timeout:{int(timeout_s)}];nwr["amenity"="pharmacy"]({s},{w},{n},{e});out center tags;')
+        count = 0
+        for elem in elements:
+            record = Pharmacy.from_element(elem)
+            if record is None or record.oid in seen:
+                continue
+            seen.add(record.oid)
+            contact.append(has_contact(record.tags))
+            record.tags = record.result_tags()
+            records.append(record)
+            count += 1
+        area["pharmacies"] = count
+
+    header = {"format": "locator-snapshot", "version": VERSION, "built_at": time.time(),
+              "spec": {"areas": areas, "places": places, "margin_m": margin_m},
+              "areas": resolved, "geocodes": geocodes}
+    return write_snapshot(path, records, contact, header)
+
+
+def write_snapshot(path, records: List[Pharmacy], contact: List[bool], header: Dict) -> Dict:
+    """Write `records` and `header` atomically to `path`; returns the header as written."""
+    order = sorted(range(len(records)), key=lambda i: records[i].lat)
+    hours_table: Dict[str, int] = {}
+    blobs, hours = [], []
+    for i in order:
+        r = records[i]
+        blobs.append(json.dumps([r.osm_type, r.osm_id, r.tags], separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        value = r.opening_hours
+        hours.append(-1 if value is None else hours_table.setdefault(value, len(hours_table)))
+    offsets = np.zeros(len(blobs) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    arrays = {
+        "lats": np.array([records[i].lat for i in order], dtype="<f8"),
+        "lons": np.array([records[i].lon for i in order], dtype="<f8"),
+        "contact": np.array([contact[i] for i in order], dtype="u1"),
+        "hours": np.array(hours, dtype="<i4"),
+        "offsets": offsets,
+        "blob": np.frombuffer(b"".join(blobs), dtype="u1"),
+    }
+
+    header = dict(header, count=len(records), opening_hours=list(hours_table), arrays={})
+    tmp = Path(str(path) + f".tmp{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _PREFIX.size)
+        for name, arr in arrays.items():
+            pad = -f.tell() % 8
+            f.write(b"\0" * pad)
+            header["arrays"][name] = [f.tell(), str(arr.dtype.str), len(arr)]
+            f.write(arr.tobytes())
+        header_offset = f.tell()
+        raw = json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        f.write(raw)
+        f.seek(0)
+        f.write(_PREFIX.pack(MAGIC, header_offset, len(raw)))
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)  # readers (and workers mapping the old file) never see a half-written snapshot
+    return header
+
+
+# --- Read ---
+class Snapshot:
+    def __init__(self, path):
+        self.path = str(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mm)
+        if size < _PREFIX.size:
+            raise ValueError(f"{path} is truncated")
+        magic, header_offset, header_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a locator snapshot")
+        if header_offset + header_len != size:
+            raise ValueError(f"{path} is truncated or corrupt")
+        header = json.loads(self._mm[header_offset:header_offset + header_len])
+        if header.get("version") != VERSION:
+            raise ValueError(f"unsupported snapshot version {header.get('version')}")
+        for name, (off, dt, n) in header["arrays"].items():
+            if off + n * np.dtype(dt).itemsize > header_offset:
+                raise ValueError(f"{path}: array {name} runs past the data section")
+        self.header = header
+        self.built_at = header["built_at"]
+        self.areas = [tuple(a["bbox"]) for a in header["areas"]]
+        # Re-keyed on load: files written before keys were canonical used location.strip().lower()
+        self.geocodes = {canonical_key(k): v for k, v in header["geocodes"].items()}
+        self.hours_values = header["opening_hours"]
+        # Views into the mapping, not copies
+        arrays = {name: np.frombuffer(self._mm, dtype=np.dtype(dt), count=n, offset=off) if n else np.empty(0, np.dtype(dt))
+                  for name, (off, dt, n) in header["arrays"].items()}
+        self.lats, self.lons = arrays["lats"], arrays["lons"]
+        self.contact = arrays["contact"].view(bool)
+        self.hours = arrays["hours"]
+        self._offsets = arrays["offsets"]
+        self._blob_start = header["arrays"]["blob"][0]
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    @property
+    def spec(self) -> Dict:
+        return self.header.get("spec", {})
+
+    def covers(self, lat: float, lon: float, radius_m: float) -> bool:
+        """True when the whole search circle lies inside one snapshot area."""
+        s, w, n, e = circle_bbox(lat, lon, radius_m)
+        return any(rs <= s and n <= rn and rw <= w and e <= re_ for rs, rw, rn, re_ in self.areas)
+
+    def geocode(self, key: str) -> Optional[Tuple[float, float, Dict]]:
+        hit = self.geocodes.get(key)
+        return (hit[0], hit[1], hit[2]) if hit is not None else None
+
+    def places(self) -> List[Tuple[str, str, float, float, Dict]]:
+        """(key, label, lat, lon, meta) of the named areas and places, for the autocomplete index."""
+        out = []
+        for spec in self.spec.get("areas", []) + self.spec.get("places", []):
+            key = canonical_key(spec)
+            hit = self.geocodes.get(key)
+            if hit is not None:
+                out.append((key, spec, hit[0], hit[1], hit[2]))
+        return out
+
+    def record(self, i: int) -> Pharmacy:
+        a = self._blob_start + int(self._offsets[i])
+        b = self._blob_start + int(self._offsets[i + 1])
+        osm_type, osm_id, tags = json.loads(self._mm[a:b])
+        return Pharmacy(_display_name(tags), float(self.lats[i]), float(self.lons[i]), osm_type, osm_id, tags)
+
+    def _candidate_ids(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        s, w, n, e = circle_bbox(lat, lon, radius_m)
+        lo = int(np.searchsorted(self.lats, s, side="left"))
+        hi = int(np.searchsorted(self.lats, n, side="right"))
+        lons = self.lons[lo:hi]
+        return lo + np.flatnonzero((lons >= w) & (lons <= e))
+
+    def open_mask(self, ids: np.ndarray, open_at, include_unknown: bool = False) -> np.ndarray:
+        # One evaluation per distinct opening_hours value; id -1 (no value) is the last slot
+        table = np.append(open_mask(self.hours_values, open_at, include_unknown), include_unknown)
+        return table[self.hours[ids]]
+
+    def nearest(self, lat: float, lon: float, radius_m: float, limit: int, open_at=None,
+                include_unknown: bool = False) -> List[Dict]:
+        """Locator results (contact-first, then distance) from the snapshot; only those open at `open_at` if given."""
+        ids = self._candidate_ids(lat, lon, radius_m)
+        mask = self.open_mask(ids, open_at, include_unknown) if open_at is not None else None
+        return nearest_contact_first(lat, lon, self.lats[ids], self.lons[ids], self.contact[ids],
+                                     lambda i: self.record(int(ids[i])), limit, radius_m=radius_m, mask=mask)
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "version": self.header["version"],
+            "built_at": self.built_at,
+            "age_s": round(time.time() - self.built_at, 1),
+            "pharmacies": len(self),
+            "geocodes": len(self.geocodes),
+            "areas": [dict(a) for a in self.header["areas"]],
+            "bytes": len(self._mm),
+        }
+
+
+# --- Refresh ---
+class SnapshotManager:
+    """
+    The snapshot a worker serves from, kept current by a background thread.
+
+    The thread reloads the file when another worker (or a cron build) replaced
+    it, and rebuilds it once it is older than `refresh_s`; a lock file next to
+    the snapshot makes sure only one worker per host does the upstream work.
+    Requests keep using the snapshot they picked up while a new one is built.
+    """
+
+    RETRY_S = 300.0  # after a failed build
+    LOCK_STALE_S = 1800.0  # a lock older than this belongs to a build that died
+
+    def __init__(self, path, areas: List[str], places: List[str], build: Optional[Callable[[Path], Dict]] = None,
+                 refresh_s: float = 6 * 3600, check_s: float = 60.0, on_load: Optional[Callable[[Snapshot], None]] = None):
+        """
+        `build(path)` writes a fresh snapshot to `path` (see build_snapshot);
+        `on_load(snapshot)` is called after each snapshot is loaded.
+        """
+        self.path = Path(path)
+        self.areas = list(areas)
+        self.places = list(places)
+        self.build = build
+        self.refresh_s = refresh_s
+        self.check_s = check_s
+        self.on_load = on_load
+        self._snapshot: Optional[Snapshot] = None
+        self._file_key = None
+        self._next_build = 0.0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stats = {"hits": 0, "geocode_hits": 0, "loads": 0, "builds": 0, "build_errors": 0, "load_errors": 0,
+                       "last_build_s": None}
+        self.reload_if_changed()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.areas) or self._snapshot is not None
+
+    def current(self) -> Optional[Snapshot]:
+        # Started lazily, and again after a fork (preloading servers fork after import)
+        if self._pid != os.getpid() and self.enabled:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    threading.Thread(target=self._run, name="locator-snapshot", daemon=True).start()
+        return self._snapshot
+
+    def bump(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def reload_if_changed(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key == self._file_key:
+            return False
+        try:
+            snapshot = Snapshot(self.path)
+        except Exception as e:
+            print("Warning: locator snapshot not loaded:", e)
+            self.bump("load_errors")
+            self._file_key = key  # do not retry the same broken file every check
+            return False
+        self._snapshot, self._file_key = snapshot, key  # one reference swap; in-flight requests keep the old one
+        self.bump("loads")
+        print(f"Loaded locator snapshot: {len(snapshot)} pharmacies, {len(snapshot.geocodes)} geocodes, "
+              f"{len(snapshot.areas)} areas")
+        if self.on_load is not None:
+            self.on_load(snapshot)
+        return True
+
+    def due(self) -> bool:
+        if not self.areas or self.build is None or time.time() < self._next_build:
+            return False
+        snap = self._snapshot
+        if snap is None:
+            return True
+        if snap.spec.get("areas") != self.areas or snap.spec.get("places") != self.places:
+            return True  # configured areas changed since the build
+        return time.time() - snap.built_at >= self.refresh_s
+
+    def _acquire(self) -> Optional[int]:
+        lock = str(self.path) + ".lock"
+        for _ in range(2):
+            try:
+                return os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(lock).st_mtime < self.LOCK_STALE_S:
+                        return None  # another worker is building; its file is picked up by reload_if_changed
+                    os.unlink(lock)
+                except FileNotFoundError:
+                    pass
+        return None
+
+    def rebuild(self) -> bool:
+        fd = self._acquire()
+        if fd is None:
+            self._next_build = time.time() + self.check_s
+            return False
+        start = time.perf_counter()
+        try:
+            self.build(self.path)
+        except Exception as e:
+            print("Warning: locator snapshot build failed:", e)
+            self.bump("build_errors")
+            self._next_build = time.time() + self.RETRY_S
+            return False
+        finally:
+            os.close(fd)
+            try:
+                os.unlink(str(self.path) + ".lock")
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._stats["builds"] += 1
+            self._stats["last_build_s"] = round(time.perf_counter() - start, 3)
+        return self.reload_if_changed()
+
+    def _run(self):
+        while True:
+            try:
+                self.reload_if_changed()
+                if self.due():
+                    self.rebuild()
+            except Exception as e:
+                print("Warning: locator snapshot refresh failed:", e)
+            self._wake.wait(self.check_s)
+            self._wake.clear()
+
+    def refresh_now(self):
+        """Wake the background thread for an immediate check."""
+        self._next_build = 0.0
+        self._wake.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+        snap = self._snapshot
+        out.update(enabled=self.enabled, areas=self.areas, places=len(self.places), refresh_s=self.refresh_s)
+        out["snapshot"] = snap.stats() if snap is not None else None
+        return out
+
+
+# --- CLI ---
+def main():
+    ap = argparse.ArgumentParser(description="Warm-up snapshots for locator_service")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="geocode and fetch the given areas through the locator's upstreams")
+    b.add_argument("--area", action="append", default=[], help="place name or south,west,north,east (repeatable)")
+    b.add_argument("--place", action="append", default=[], help="extra place name to pre-geocode (repeatable)")
+    b.add_argument("--margin-m", type=float, default=None, help="area covered around a named place")
+    b.add_argument("-o", "--output", default=os.getenv("LOCATOR_SNAPSHOT_PATH", "locator_snapshot.bin"))
+
+    i = sub.add_parser("info", help="print a snapshot's header")
+    i.add_argument("snapshot")
+
+    q = sub.add_parser("query", help="nearest pharmacies from a snapshot")
+    q.add_argument("snapshot")
+    q.add_argument("lat", type=float)
+    q.add_argument("lon", type=float)
+    q.add_argument("--radius", type=float, default=20000)
+    q.add_argument("--limit", type=int, default=5)
+
+    args = ap.parse_args()
+    if args.cmd == "build":
+        import locator_service  # upstream URLs, sessions and caches as the service configures them
+        areas = args.area or locator_service.WARMUP_AREAS
+        places = args.place or locator_service.WARMUP_PLACES
+        margin = args.margin_m if args.margin_m is not None else locator_service.WARMUP_MARGIN_M
+        start = time.perf_counter()
+        header = build_snapshot(args.output, areas, places, geocode=locator_service.geocode_location,
+                                fetch=locator_service.snapshot_fetch, margin_m=margin,
+                                timeout_s=locator_service.SNAPSHOT_TIMEOUT_S)
+        print(f"Wrote {args.output}: {header['count']} pharmacies, {len(header['geocodes'])} geocodes "
+              f"in {time.perf_counter() - start:.2f}s")
+    elif args.cmd == "info":
+        print(json.dumps(Snapshot(args.snapshot).stats(), indent=2, ensure_ascii=False))
+    else:
+        snap = Snapshot(args.snapshot)
+        if not snap.covers(args.lat, args.lon, args.radius):
+            print("Note: search circle extends outside the snapshot areas; the locator would not use it")
+        start = time.perf_counter()
+        results = snap.nearest(args.lat, args.lon, args.radius, args.limit)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"{len(results)} results in {elapsed_us:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# opening_hours.py
+# Compiles OSM opening_hours strings into weekly interval tables for locator_service.
+#
+# A compiled value is a sorted list of [start, end) minutes since Monday 00:00,
+# so "is it open at t" is one bisect. Compilation is cached by the string itself:
+# most pharmacies share a handful of values ("Mo-Sa 09:00-19:30", "24/7", ...).
+#
+# Supported: 24/7, weekday selectors (Mo-Fr, Sa,Su, Fr-Mo), time spans (also past
+# midnight and up to 24:00), off/closed/open, ";" rules that override earlier
+# ones for their days, "," additional rules, "||" (read like ";"), and comments.
+# PH/SH-only rules are skipped (holiday calendars are not known here). Anything
+# else (months, dates, weeks, nth weekdays, sunrise, open ends) makes the value
+# unknown (None) rather than guessing.
+import re
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DAYS = ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]
+MINUTES_PER_DAY = 1440
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+_DAY = r"(?:Mo|Tu|We|Th|Fr|Sa|Su|PH|SH)"
+_DAY_SEL = re.compile(rf"^({_DAY}(?:\s*-\s*{_DAY})?(?:\s*,\s*{_DAY}(?:\s*-\s*{_DAY})?)*)(?=\s|:|$)\s*:?\s*")
+_SPAN = re.compile(r"^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$")
+_ADDITIONAL = re.compile(rf"(?<=[\dfnd])\s*,\s*(?={_DAY}\b)")  # after a time or off/open/closed, not inside "Mo,We"
+_COMMENT = re.compile(r'"[^"]*"')
+
+
+class WeeklyHours:
+    """Open intervals over one week, as parallel sorted start/end minute tuples."""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]]):
+        merged: List[List[int]] = []
+        for s, e in sorted(intervals):
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+        self.starts = tuple(s for s, _ in merged)
+        self.ends = tuple(e for _, e in merged)
+
+    @property
+    def always_open(self) -> bool:
+        return self.starts == (0,) and self.ends == (MINUTES_PER_WEEK,)
+
+    def is_open_minute(self, minute: int) -> bool:
+        i = bisect_right(self.starts, minute) - 1
+        return i >= 0 and minute < self.ends[i]
+
+    def is_open(self, when: datetime) -> bool:
+        return self.is_open_minute(minute_of_week(when))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+def minute_of_week(when: datetime) -> int:
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+def _days(selector: str) -> Optional[List[int]]:
+    """Weekday indexes for a selector like "Mo-Fr,Su"; [] when it names holidays only."""
+    out = []
+    for part in selector.split(","):
+        ends = [d.strip() for d in part.split("-")]
+        if any(d in ("PH", "SH") for d in ends):
+            if len(ends) > 1:
+                return None  # a range into a holiday is not a weekday range
+            continue
+        a = DAYS.index(ends[0])
+        b = DAYS.index(ends[-1])
+        out.extend(DAYS[(a + i) % 7] for i in range((b - a) % 7 + 1))
+    return [DAYS.index(d) for d in dict.fromkeys(out)]
+
+
+def _spans(text: str) -> Optional[List[Tuple[int, int]]]:
+    """Minutes relative to the day's midnight; a span past midnight ends after 1440."""
+    out = []
+    for part in text.split(","):
+        m = _SPAN.match(part.strip())
+        if m is None:
+            return None
+        h1, m1, h2, m2 = (int(x) for x in m.groups())
+        if h1 > 24 or h2 > 48 or m1 > 59 or m2 > 59:
+            return None
+        start, end = h1 * 60 + m1, h2 * 60 + m2
+        if end <= start:
+            end += MINUTES_PER_DAY
+        out.append((start, end))
+    return out
+
+
+@lru_cache(maxsize=8192)
+def compile_opening_hours(text: Optional[str]) -> Optional[WeeklyHours]:
+    """WeeklyHours for an OSM opening_hours value, or None when it is missing or not understood."""
+    if not text:
+        return None
+    value = _COMMENT.sub("", text).strip()
+    if value == "24/7":
+        return WeeklyHours([(0, MINUTES_PER_WEEK)])
+    week: Dict[int, List[Tuple[int, int]]] = {d: [] for d in range(7)}
+    understood = False
+    for rule in re.split(r";|\|\|", value):
+        rule = rule.strip()
+        if not rule:
+            continue
+        for n, part in enumerate(_ADDITIONAL.split(rule)):
+            part = part.strip()
+            m = _DAY_SEL.match(part)
+            if m:
+                days = _days(m.group(1))
+                if days is None:
+                    return None
+                rest = part[m.end():].strip()
+                if not days:
+                    continue  # PH/SH-only rule
+            else:
+                days, rest = list(range(7)), part
+            if rest == "24/7":
+                rest = "00:00-24:00"
+            modifier = ""
+            words = rest.rsplit(None, 1)
+            if words and words[-1] in ("off", "closed", "open"):
+                modifier = words[-1]
+                rest = words[0] if len(words) > 1 else ""
+            if modifier in ("off", "closed"):
+                if rest:
+                    return None  # "10:00-12:00 off" carves holes; not supported
+                spans: List[Tuple[int, int]] = []
+            elif rest == "":
+                spans = [(0, MINUTES_PER_DAY)]
+            else:
+                spans = _spans(rest)
+                if spans is None:
+                    return None
+            for d in days:
+                # A ";" rule replaces what earlier rules said about its days; "," adds to it
+                week[d] = (week[d] if n > 0 else []) + spans
+            understood = True
+    if not understood:
+        return None
+    intervals = []
+    for d, spans in week.items():
+        for s, e in spans:
+            s, e = d * MINUTES_PER_DAY + s, d * MINUTES_PER_DAY + e
+            if e > MINUTES_PER_WEEK:  # Sunday night into Monday morning
+                intervals.append((s, MINUTES_PER_WEEK))
+                intervals.append((0, e - MINUTES_PER_WEEK))
+            else:
+                intervals.append((s, e))
+    return WeeklyHours(intervals)
+
+
+def is_open(text: Optional[str], when: datetime) -> Optional[bool]:
+    """True/False when the value is understood, None when it is missing or unsupported."""
+    hours = compile_opening_hours(text)
+    return None if hours is None else hours.is_open(when)
+
+
+def open_mask(values: Iterable[Optional[str]], when: datetime, include_unknown: bool = False) -> np.ndarray:
+    """Boolean array: which of `values` are open at `when` (unknown ones count as `include_unknown`)."""
+    minute = minute_of_week(when)
+    seen: Dict[Optional[str], bool] = {}
+    out = []
+    for v in values:
+        flag = seen.get(v)
+        if flag is None:
+            hours = compile_opening_hours(v)
+            flag = include_unknown if hours is None else hours.is_open_minute(minute)
+            seen[v] = flag
+        out.append(flag)
+    return np.array(out, dtype=bool)
+
+
+def cache_stats() -> Dict:
+    info = compile_opening_hours.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
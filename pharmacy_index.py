@@ -0,0 +1,495 @@
+# pharmacy_index.py
+# Offline spatial index of amenity=pharmacy elements for locator_service.
+#
+# Build it from an Overpass dump or an OSM XML extract, then point the locator at
+# the result (LOCATOR_INDEX_PATH). Queries whose search circle lies inside the
+# indexed region are answered from memory; anything else still goes to Overpass.
+#
+#   # dump a region with Overpass (south,west,north,east):
+#   curl -d '[out:json][timeout:180];nwr["amenity"="pharmacy"](48.0,1.5,49.5,3.5);out center tags;' \
+#        https://overpass-api.de/api/interpreter > pharmacies.json
+#   python pharmacy_index.py ingest pharmacies.json --bbox 48.0,1.5,49.5,3.5 -o pharmacy_index.json
+#   python pharmacy_index.py ingest ile-de-france.osm.bz2 -o pharmacy_index.json
+#   python pharmacy_index.py query pharmacy_index.json 48.8566 2.3522 --radius 2000
+#
+# Pharmacies are stored as position, OSM identity and the tags a result needs
+# (version 1 files, holding finished result dicts, still load); the index is a
+# fixed-size lat/lon grid, so a query only scans the cells its circle touches.
+import argparse
+import bz2
+import gzip
+import json
+import math
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from opening_hours import open_mask
+
+PHONE_KEYS = ["phone", "contact:phone", "telephone", "tel", "mobile", "contact:mobile"]
+EMAIL_KEYS = ["email", "contact:email", "e-mail"]
+WEBSITE_KEYS = ["website", "contact:website"]
+CONTACT_KEYS = PHONE_KEYS + EMAIL_KEYS + WEBSITE_KEYS
+
+EARTH_RADIUS_M = 6371000.0
+M_PER_DEG_LAT = 111320.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def haversine_np(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """haversine_m from one point to many, in one vectorized pass."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons - lon)
+    a = np.sin(dphi / 2.0) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def format_address_from_tags(tags: Dict) -> str:
+    parts = []
+    if not tags:
+        return ""
+    for key in ("addr:street", "addr:housenumber", "addr:city", "addr:postcode", "addr:country"):
+        v = tags.get(key)
+        if v:
+            parts.append(v)
+    if not parts:
+        for key in ("street", "city", "village", "town"):
+            v = tags.get(key)
+            if v:
+                parts.append(v)
+    return ", ".join(parts)
+
+
+def has_contact(tags: Dict) -> bool:
+    return any(tags.get(k) for k in CONTACT_KEYS)
+
+
+def element_position(elem: Dict) -> Optional[Tuple[float, float]]:
+    if elem.get("type") == "node":
+        lat_e, lon_e = elem.get("lat"), elem.get("lon")
+    else:
+        center = elem.get("center") or {}
+        lat_e, lon_e = center.get("lat"), center.get("lon")
+    if not lat_e or not lon_e:
+        return None
+    return float(lat_e), float(lon_e)
+
+
+def _display_name(tags: Dict) -> str:
+    return tags.get("name") or tags.get("shop") or "Pharmacy"
+
+
+ADDRESS_KEYS = ("postal_code", "city", "village", "street")
+# Tags a result can be rebuilt from; everything else on the element is dropped when persisting
+RESULT_TAG_KEYS = frozenset(("name", "shop", "town", "opening_hours") + ADDRESS_KEYS + tuple(CONTACT_KEYS))
+
+
+class Pharmacy:
+    """
+    One pharmacy as the locator keeps it between fetching and answering: position,
+    OSM identity and the element's tags. Address and contact members are derived
+    only when the result dict is built (to_dict), which happens for the winners.
+    """
+
+    __slots__ = ("name", "lat", "lon", "osm_type", "osm_id", "tags", "fields")
+
+    def __init__(self, name: str, lat: float, lon: float, osm_type, osm_id, tags: Optional[Dict] = None,
+                 fields: Optional[Dict] = None):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.osm_type = osm_type
+        self.osm_id = osm_id
+        self.tags = tags if tags is not None else {}
+        self.fields = fields  # derived members stored ready-made (version 1 index files)
+
+    @classmethod
+    def from_element(cls, elem: Dict) -> Optional["Pharmacy"]:
+        pos = element_position(elem)
+        if pos is None:
+            return None
+        tags = elem.get("tags") or {}
+        return cls(_display_name(tags), pos[0], pos[1], elem.get("type"), elem.get("id"), tags)
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "Pharmacy":
+        fields = {k: v for k, v in record.items() if k not in ("name", "lat", "lon", "osm_type", "osm_id", "distance_m")}
+        return cls(record["name"], record["lat"], record["lon"], record.get("osm_type"), record.get("osm_id"), fields=fields)
+
+    @property
+    def oid(self) -> str:
+        return f"{self.osm_type}/{self.osm_id}"
+
+    @property
+    def opening_hours(self) -> Optional[str]:
+        return (self.fields if self.fields is not None else self.tags).get("opening_hours")
+
+    def result_tags(self) -> Dict:
+        return {k: v for k, v in self.tags.items() if k in RESULT_TAG_KEYS or k.startswith("addr:")}
+
+    def to_dict(self, distance_m: Optional[float] = None) -> Dict:
+        """The locator result dict; distance_m (rounded to 0.1 m) follows lat/lon when given."""
+        out = {"name": self.name, "lat": self.lat, "lon": self.lon}
+        if distance_m is not None:
+            out["distance_m"] = round(distance_m, 1)
+        if self.fields is not None:
+            out.update(self.fields)
+        else:
+            tags = self.tags
+            addr = {k: v for k, v in tags.items() if k.startswith("addr:") or k in ADDRESS_KEYS}
+            out["address_tags"] = addr
+            out["formatted_address"] = format_address_from_tags(tags) or addr
+            out["phone"] = next((tags[k] for k in PHONE_KEYS if tags.get(k)), None)
+            out["email"] = tags.get("email") or tags.get("contact:email")
+            out["website"] = tags.get("website") or tags.get("contact:website")
+            out["opening_hours"] = tags.get("opening_hours")
+        out["osm_type"] = self.osm_type
+        out["osm_id"] = self.osm_id
+        return out
+
+
+def normalize_elements(elements: Iterable[Dict]) -> Tuple[Callable[[int], Pharmacy], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One pass over Overpass elements: (pharmacy_at, lats, lons, contact) for those
+    with coordinates. Only positions and contact flags are extracted up front;
+    pharmacy_at(i) builds the Pharmacy when a ranking actually picks element i.
+    """
+    kept, lats, lons, contact = [], [], [], []
+    for elem in elements:
+        pos = element_position(elem)
+        if pos is None:
+            continue
+        kept.append(elem)
+        lats.append(pos[0])
+        lons.append(pos[1])
+        contact.append(has_contact(elem.get("tags") or {}))
+    return ((lambda i: Pharmacy.from_element(kept[i])), np.array(lats, dtype=np.float64),
+            np.array(lons, dtype=np.float64), np.array(contact, dtype=bool))
+
+
+def element_record(elem: Dict) -> Optional[Dict]:
+    """Overpass element -> locator result fields (everything but distance_m), or None without coordinates."""
+    p = Pharmacy.from_element(elem)
+    return p.to_dict() if p is not None else None
+
+
+def with_distance(record, distance_m: float) -> Dict:
+    if isinstance(record, Pharmacy):
+        return record.to_dict(distance_m)
+    out = {"name": record["name"], "lat": record["lat"], "lon": record["lon"], "distance_m": round(distance_m, 1)}
+    out.update((k, v) for k, v in record.items() if k not in out)
+    return out
+
+
+def rank_contact_first(candidates: Iterable[Tuple[float, bool, Dict]], limit: int) -> List[Dict]:
+    """
+    The locator's ordering rule: pharmacies with any contact tag first, nearest
+    first, then the rest by distance; one entry per OSM object, at most `limit`.
+    `candidates` are (distance_m, has_contact, record) triples; records are
+    Pharmacy objects or result dicts.
+    """
+    if limit <= 0:
+        return []
+    ordered = sorted(candidates, key=lambda c: (not c[1], round(c[0], 1)))
+    final, seen = [], set()
+    for dist, _, record in ordered:
+        oid = record.oid if isinstance(record, Pharmacy) else f"{record.get('osm_type')}/{record.get('osm_id')}"
+        if oid in seen:
+            continue
+        seen.add(oid)
+        final.append(with_distance(record, dist))
+        if len(final) >= limit:
+            break
+    return final
+
+
+def nearest_contact_first(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, contact: np.ndarray,
+                          record_at: Callable[[int], "Pharmacy"], limit: int, radius_m: Optional[float] = None,
+                          mask: Optional[np.ndarray] = None) -> List[Dict]:
+    """
+    rank_contact_first over candidates held as arrays, building records only for the winners.
+
+    Distances for all candidates come from one NumPy pass and argpartition picks
+    the best `limit` keys; the few candidates that can reach the top (ties and
+    rounding margin included) are materialized with `record_at(i)` and ordered
+    by rank_contact_first itself, so the output is exactly the scalar rule's.
+    Candidates where `mask` is False (e.g. closed pharmacies) are dropped before
+    the top-k selection.
+    """
+    n = len(lats)
+    if n == 0 or limit <= 0:
+        return []
+    d = haversine_np(lat, lon, lats, lons)
+    pos = np.arange(n)
+    if mask is not None:
+        pos, d = pos[mask], d[mask]
+        if len(pos) == 0:
+            return []
+    if radius_m is not None:
+        inside = d <= radius_m + 0.01  # exact check below, on the scalar distance
+        pos, d = pos[inside], d[inside]
+        if len(pos) == 0:
+            return []
+    # Contact-first, then distance: contact-less candidates sort after every contact one
+    key = np.where(np.asarray(contact)[pos], 0.0, 4.0e7) + d
+    k = limit
+    while True:
+        if k < len(key):
+            kth = key[np.argpartition(key, k - 1)[k - 1]]
+            chosen = np.flatnonzero(key <= kth + 0.2)  # ties after rounding to 0.1 m
+        else:
+            chosen = np.arange(len(key))
+        chosen = chosen[np.argsort(pos[chosen], kind="stable")]  # keep input order for equal keys
+        candidates = []
+        for j in chosen:
+            i = int(pos[j])
+            record = record_at(i)
+            dist = haversine_m(lat, lon, float(lats[i]), float(lons[i]))
+            if radius_m is None or dist <= radius_m:
+                candidates.append((dist, bool(contact[i]), record))
+        ranked = rank_contact_first(candidates, limit)
+        if len(ranked) >= limit or len(chosen) >= len(key):
+            return ranked
+        k *= 2  # duplicates collapsed; look further down the list
+
+
+class PharmacyIndex:
+    def __init__(self, records: List[Pharmacy], contact: List[bool], region: Tuple[float, float, float, float],
+                 cell_deg: float = 0.05, built_at: Optional[float] = None, source: str = ""):
+        self.records = records
+        self.contact = contact
+        self.region = tuple(region)  # (south, west, north, east)
+        self.cell_deg = cell_deg
+        self.built_at = built_at or time.time()
+        self.source = source
+        self.lats = np.array([r.lat for r in records], dtype=np.float64)
+        self.lons = np.array([r.lon for r in records], dtype=np.float64)
+        self.contact_arr = np.array(contact, dtype=bool)
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, r in enumerate(records):
+            cells.setdefault(self._cell(r.lat, r.lon), []).append(i)
+        self._cells = {cell: np.array(ids, dtype=np.int64) for cell, ids in cells.items()}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    @staticmethod
+    def _circle_bbox(lat: float, lon: float, radius_m: float):
+        dlat = radius_m / M_PER_DEG_LAT
+        dlon = radius_m / (M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+    def covers(self, lat: float, lon: float, radius_m: float) -> bool:
+        """True when the whole search circle lies inside the indexed region."""
+        s, w, n, e = self._circle_bbox(lat, lon, radius_m)
+        rs, rw, rn, re_ = self.region
+        return rs <= s and n <= rn and rw <= w and e <= re_
+
+    def _candidate_ids(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        """Record indices in the grid cells the search circle touches, in record order."""
+        s, w, n, e = self._circle_bbox(lat, lon, radius_m)
+        i0, j0 = self._cell(s, w)
+        i1, j1 = self._cell(n, e)
+        parts = [self._cells[(i, j)] for i in range(i0, i1 + 1) for j in range(j0, j1 + 1) if (i, j) in self._cells]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[Tuple[float, int]]:
+        """(distance_m, record index) for every pharmacy within radius_m."""
+        ids = self._candidate_ids(lat, lon, radius_m)
+        d = haversine_np(lat, lon, self.lats[ids], self.lons[ids])
+        keep = d <= radius_m
+        return list(zip(d[keep].tolist(), ids[keep].tolist()))
+
+    def nearest(self, lat: float, lon: float, radius_m: float, limit: int, open_at=None,
+                include_unknown: bool = False) -> List[Dict]:
+        """Locator results (contact-first, then distance) from the index; only those open at `open_at` if given."""
+        ids = self._candidate_ids(lat, lon, radius_m)
+        mask = None
+        if open_at is not None:
+            mask = open_mask((self.records[i].opening_hours for i in ids), open_at, include_unknown)
+        return nearest_contact_first(lat, lon, self.lats[ids], self.lons[ids], self.contact_arr[ids],
+                                     lambda i: self.records[ids[i]], limit, radius_m=radius_m, mask=mask)
+
+    # --- Build / persist ---
+    @classmethod
+    def from_elements(cls, elements: Iterable[Dict], region=None, cell_deg: float = 0.05, source: str = ""):
+        records, contact, seen = [], [], set()
+        for elem in elements:
+            tags = elem.get("tags") or {}
+            if tags.get("amenity") != "pharmacy":
+                continue
+            oid = f"{elem.get('type')}/{elem.get('id')}"
+            if oid in seen:
+                continue
+            record = Pharmacy.from_element(elem)
+            if record is None:
+                continue
+            seen.add(oid)
+            record.tags = record.result_tags()
+            records.append(record)
+            contact.append(has_contact(tags))
+        if region is None:
+            # Without an explicit bbox, the data's own extent is the covered region
+            if not records:
+                raise ValueError("no pharmacies found and no --bbox given")
+            lats = [r.lat for r in records]
+            lons = [r.lon for r in records]
+            region = (min(lats), min(lons), max(lats), max(lons))
+        return cls(records, contact, region, cell_deg=cell_deg, source=source)
+
+    def save(self, path):
+        payload = {
+            "version": 2,
+            "built_at": self.built_at,
+            "source": self.source,
+            "region": list(self.region),
+            "cell_deg": self.cell_deg,
+            # [osm_type, osm_id, lat, lon, tags]; the name is derived from the tags again on load
+            "pharmacies": [[r.osm_type, r.osm_id, r.lat, r.lon, r.result_tags()] for r in self.records],
+            "contact": self.contact,
+        }
+        tmp = Path(str(path) + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        tmp.replace(path)  # readers never see a half-written index
+
+    @classmethod
+    def load(cls, path) -> "PharmacyIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version", 1) >= 2:
+            records = [Pharmacy(_display_name(tags), lat, lon, t, i, tags) for t, i, lat, lon, tags in payload["pharmacies"]]
+        else:
+            records = [Pharmacy.from_record(r) for r in payload["records"]]  # ready-made result dicts
+        return cls(records, payload["contact"], payload["region"],
+                   cell_deg=payload.get("cell_deg", 0.05), built_at=payload.get("built_at"),
+                   source=payload.get("source", ""))
+
+    def stats(self) -> Dict:
+        return {
+            "pharmacies": len(self.records),
+            "with_contact": sum(self.contact),
+            "region": list(self.region),
+            "cells": len(self._cells),
+            "built_at": self.built_at,
+            "source": self.source,
+        }
+
+
+# --- Readers ---
+def _open(path: Path):
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rb")
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_overpass_json(path: Path) -> List[Dict]:
+    with _open(path) as f:
+        data = json.load(f)
+    return data.get("elements", []) if isinstance(data, dict) else data
+
+
+def read_osm_xml(path: Path) -> Iterable[Dict]:
+    """
+    Stream pharmacy elements out of an .osm XML extract, in Overpass shape.
+    Ways get the centre of their nodes' bounding box (as Overpass `out center`);
+    relations are skipped.
+    """
+    coords: Dict[int, Tuple[float, float]] = {}
+    with _open(path) as f:
+        for _, el in ET.iterparse(f, events=("end",)):
+            if el.tag == "node":
+                lat, lon = float(el.get("lat")), float(el.get("lon"))
+                coords[int(el.get("id"))] = (lat, lon)
+                tags = {t.get("k"): t.get("v") for t in el.findall("tag")}
+                if tags.get("amenity") == "pharmacy":
+                    yield {"type": "node", "id": int(el.get("id")), "lat": lat, "lon": lon, "tags": tags}
+                el.clear()
+            elif el.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in el.findall("tag")}
+                if tags.get("amenity") == "pharmacy":
+                    pts = [coords[int(nd.get("ref"))] for nd in el.findall("nd") if int(nd.get("ref")) in coords]
+                    if pts:
+                        lats, lons = [p[0] for p in pts], [p[1] for p in pts]
+                        center = {"lat": (min(lats) + max(lats)) / 2, "lon": (min(lons) + max(lons)) / 2}
+                        yield {"type": "way", "id": int(el.get("id")), "center": center, "tags": tags}
+                el.clear()
+            elif el.tag == "relation":
+                el.clear()
+
+
+def read_elements(path) -> Iterable[Dict]:
+    path = Path(path)
+    name = path.name.lower()
+    if ".osm" in name and not name.endswith(".json"):
+        return read_osm_xml(path)
+    return read_overpass_json(path)
+
+
+# --- CLI ---
+def _parse_bbox(text: str):
+    s, w, n, e = (float(x) for x in text.split(","))
+    if s >= n or w >= e:
+        raise argparse.ArgumentTypeError("bbox must be south,west,north,east")
+    return s, w, n, e
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline pharmacy index for locator_service")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ing = sub.add_parser("ingest", help="build an index from an Overpass JSON dump or .osm extract")
+    ing.add_argument("source")
+    ing.add_argument("-o", "--output", default="pharmacy_index.json")
+    ing.add_argument("--bbox", type=_parse_bbox, help="covered region as south,west,north,east (default: data extent)")
+    ing.add_argument("--cell-deg", type=float, default=0.05)
+
+    q = sub.add_parser("query", help="nearest pharmacies from an index")
+    q.add_argument("index")
+    q.add_argument("lat", type=float)
+    q.add_argument("lon", type=float)
+    q.add_argument("--radius", type=float, default=20000)
+    q.add_argument("--limit", type=int, default=5)
+
+    args = ap.parse_args()
+    if args.cmd == "ingest":
+        start = time.perf_counter()
+        index = PharmacyIndex.from_elements(read_elements(args.source), region=args.bbox,
+                                            cell_deg=args.cell_deg, source=str(args.source))
+        index.save(args.output)
+        print(f"Indexed {len(index)} pharmacies into {args.output} in {time.perf_counter() - start:.2f}s")
+        print(json.dumps(index.stats(), indent=2))
+    else:
+        index = PharmacyIndex.load(args.index)
+        if not index.covers(args.lat, args.lon, args.radius):
+            print("Note: search circle extends outside the indexed region; the locator would use Overpass")
+        start = time.perf_counter()
+        results = index.nearest(args.lat, args.lon, args.radius, args.limit)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"{len(results)} results in {elapsed_us:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
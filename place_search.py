@@ -0,0 +1,284 @@
+# place_search.py
+# Canonical geocode cache keys and the local place autocomplete of locator_service.
+#
+# The cache key used to be `location.strip().lower()`, so "Lahore, Pakistan",
+# "LAHORE (Pakistan)" and "Lahore" were three upstream calls and three entries.
+# canonical_key() folds spellings of one query together: Unicode NFKC, case and
+# accents folded, punctuation dropped, comma-separated parts sorted, and a
+# final part naming a country split off into a "|cc" suffix. Only a whole part
+# counts: "Île-de-France" and "New Mexico" are places, not a country suffix.
+# The country stays in the key ("Valencia, Venezuela" must not reuse the answer
+# for "Valencia"); instead an unqualified lookup is also stored under the
+# country of its result (see result_keys), so "Lahore" followed by "Lahore,
+# Pakistan" is one upstream call. A key whose last words name the country the
+# result is in ("lahore pakistan") is stored as "lahore|pk" too; "New Mexico",
+# a result in the US, is not cut down to "new".
+#
+# PlaceIndex answers prefix queries over places already geocoded (the SQLite
+# store and the warm-up snapshot) without any upstream call. Its words are one
+# sorted list searched with bisect, which gives the prefix ranges of a trie at a
+# fraction of the memory of one dict per character, each with its list of places.
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Country names (English, French and local forms, accents folded) -> ISO 3166 code.
+# Two-letter codes are left out on purpose: "de", "es" or "al" end too many place names.
+COUNTRIES = {
+    "afghanistan": "af", "algeria": "dz", "algerie": "dz", "argentina": "ar", "argentine": "ar",
+    "australia": "au", "australie": "au", "austria": "at", "autriche": "at", "osterreich": "at",
+    "bangladesh": "bd", "belgium": "be", "belgique": "be", "belgie": "be", "brazil": "br", "bresil": "br",
+    "brasil": "br", "cameroon": "cm", "cameroun": "cm", "canada": "ca", "china": "cn", "chine": "cn",
+    "cote d ivoire": "ci", "ivory coast": "ci", "czechia": "cz", "czech republic": "cz", "denmark": "dk",
+    "danemark": "dk", "egypt": "eg", "egypte": "eg", "england": "gb", "angleterre": "gb", "france": "fr",
+    "germany": "de", "allemagne": "de", "deutschland": "de", "greece": "gr", "grece": "gr", "india": "in",
+    "inde": "in", "indonesia": "id", "indonesie": "id", "iran": "ir", "iraq": "iq", "irak": "iq",
+    "ireland": "ie", "irlande": "ie", "italy": "it", "italie": "it", "italia": "it", "japan": "jp",
+    "japon": "jp", "kenya": "ke", "lebanon": "lb", "liban": "lb", "luxembourg": "lu", "mali": "ml",
+    "mexico": "mx", "mexique": "mx", "morocco": "ma", "maroc": "ma", "netherlands": "nl", "pays bas": "nl",
+    "nederland": "nl", "nigeria": "ng", "norway": "no", "norvege": "no", "pakistan": "pk", "philippines": "ph",
+    "poland": "pl", "pologne": "pl", "polska": "pl", "portugal": "pt", "romania": "ro", "roumanie": "ro",
+    "russia": "ru", "russie": "ru", "saudi arabia": "sa", "arabie saoudite": "sa", "senegal": "sn",
+    "scotland": "gb", "ecosse": "gb", "spain": "es", "espagne": "es", "espana": "es", "sweden": "se",
+    "suede": "se", "switzerland": "ch", "suisse": "ch", "schweiz": "ch", "svizzera": "ch", "syria": "sy",
+    "syrie": "sy", "tunisia": "tn", "tunisie": "tn", "turkey": "tr", "turquie": "tr", "turkiye": "tr",
+    "uae": "ae", "united arab emirates": "ae", "emirats arabes unis": "ae", "uk": "gb", "united kingdom": "gb",
+    "royaume uni": "gb", "great britain": "gb", "ukraine": "ua", "usa": "us", "united states": "us",
+    "united states of america": "us", "etats unis": "us", "venezuela": "ve", "vietnam": "vn", "viet nam": "vn",
+}
+_SEPARATORS = re.compile(r"[\W_]+")
+_COMPONENTS = re.compile(r"[,;:()\[\]/|]+")
+
+
+def fold_tokens(text: str) -> List[str]:
+    """Words of `text` with Unicode compatibility forms, case, accents and punctuation folded away."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _SEPARATORS.sub(" ", text).split()
+
+
+def split_country(parts: List[List[str]]) -> Tuple[List[List[str]], Optional[str]]:
+    """(place components, ISO code) when the last component is a country name and something precedes it."""
+    if len(parts) > 1:
+        code = COUNTRIES.get(" ".join(parts[-1]))
+        if code is not None:
+            return parts[:-1], code
+    return parts, None
+
+
+def canonical_key(location: str) -> str:
+    """Geocode cache key: "bellecour lyon" for "Lyon, Bellecour", "lahore|pk" for "LAHORE (Pakistan)"."""
+    parts = [p for p in (fold_tokens(c) for c in _COMPONENTS.split(unicodedata.normalize("NFKC", location))) if p]
+    parts, country = split_country(parts)
+    # Components are reordered, words inside one are not: "Rue de Paris, Lyon" is not "Rue de Lyon, Paris"
+    key = " ".join(sorted(" ".join(p) for p in parts))
+    return f"{key}|{country}" if country and key else key
+
+
+def country_of(meta: Dict) -> Optional[str]:
+    """ISO code of a Nominatim or Photon result, if it says."""
+    code = (meta.get("address") or {}).get("country_code") or meta.get("countrycode")
+    if code:
+        return str(code).lower()
+    name = meta.get("country") or (meta.get("address") or {}).get("country")
+    return COUNTRIES.get(" ".join(fold_tokens(name))) if name else None
+
+
+def _trailing_country(words: List[str], country: str) -> int:
+    # How many of the last words name `country` (country names are at most 3 words), 0 if none do
+    for n in (3, 2, 1):
+        if len(words) > n and COUNTRIES.get(" ".join(words[-n:])) == country:
+            return n
+    return 0
+
+
+def result_keys(key: str, meta: Dict) -> List[str]:
+    """
+    Keys to store a fresh geocode under: `key`, plus "key|cc" when the query named
+    no country, plus "place|cc" when the key ends with the name of the result's country.
+    """
+    if "|" in key:
+        return [key]
+    country = country_of(meta)
+    if not country:
+        return [key]
+    keys = [key, f"{key}|{country}"]
+    words = key.split()
+    n = _trailing_country(words, country)
+    if n:
+        keys.append(f"{' '.join(words[:-n])}|{country}")
+    return keys
+
+
+def display_name(meta: Dict) -> str:
+    if meta.get("display_name"):
+        return meta["display_name"]
+    # Photon properties
+    parts = [meta.get(k) for k in ("name", "street", "city", "state", "country")]
+    seen = []
+    for p in parts:
+        if p and p not in seen:
+            seen.append(p)
+    return ", ".join(seen)
+
+
+class PlaceIndex:
+    """
+    Prefix search over known places. Each place is indexed under the words of
+    its label (the text it was looked up with) and of the first part of its
+    display name; every query word must prefix-match one of them. Among the
+    first matches found, places whose label starts with the query rank first,
+    then the most used, then the shortest.
+    """
+
+    SHORT_PREFIX = 2  # candidate lists of prefixes this short are kept, they span most of the index
+    SHORT_TOP = 64
+    SETS_AFTER = 200  # candidates tested token by token before the other words' place sets are built
+
+    def __init__(self, max_scan: int = 5000):
+        self.max_scan = max_scan  # candidates examined per query at most
+        self._lock = threading.Lock()
+        self._vocab: List[str] = []  # sorted distinct tokens
+        self._postings: Dict[str, List[int]] = {}  # token -> place ids, ascending
+        self._short: Dict[str, List[int]] = {}
+        self._places: List[Tuple[str, str, float, float, str]] = []  # (folded label, label, lat, lon, display name)
+        self._tokens: List[Tuple[str, ...]] = []
+        self._hits: List[int] = []
+        self._by_key: Dict[str, int] = {}
+        self._stats = {"queries": 0, "suggested": 0, "truncated": 0}
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def _prepare(self, key: str, label: str, meta: Dict):
+        if key in self._by_key or not label.strip():
+            return None
+        name = display_name(meta)
+        words = fold_tokens(label)
+        tokens = tuple(dict.fromkeys(words + fold_tokens(name.split(",")[0])))
+        return (" ".join(words), label.strip(), name, tokens) if tokens else None
+
+    def _append(self, key: str, prepared, lat: float, lon: float) -> int:
+        folded, label, name, tokens = prepared
+        pid = len(self._places)
+        self._places.append((folded, label, float(lat), float(lon), name))
+        self._tokens.append(tokens)
+        self._hits.append(0)
+        self._by_key[key] = pid
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = []
+                insort(self._vocab, token)
+            postings.append(pid)
+        return pid
+
+    def add(self, key: str, label: str, lat: float, lon: float, meta: Dict):
+        """Index one place under its canonical key; a key already present is left alone."""
+        with self._lock:
+            prepared = self._prepare(key, label, meta)
+            if prepared is None:
+                return
+            self._append(key, prepared, lat, lon)
+            for token in prepared[3]:
+                for n in range(1, self.SHORT_PREFIX + 1):
+                    kept = self._short.get(token[:n])
+                    if kept is not None and len(kept) < self.SHORT_TOP:
+                        del self._short[token[:n]]  # the new place would have made the list
+
+    def load(self, places: Iterable[Tuple[str, str, float, float, Dict]]) -> int:
+        """Bulk add of (key, label, lat, lon, meta). Returns the number added."""
+        with self._lock:
+            batch = {}
+            for key, label, lat, lon, meta in places:
+                if key not in batch:
+                    prepared = self._prepare(key, label, meta)
+                    if prepared is not None:
+                        batch[key] = (prepared, lat, lon)
+            for key, (prepared, lat, lon) in batch.items():
+                self._append(key, prepared, lat, lon)
+            self._short.clear()
+        return len(batch)
+
+    def touch(self, key: str):
+        """Count a use of the place (a cache hit), which ranks it higher."""
+        pid = self._by_key.get(key)
+        if pid is not None:
+            self._hits[pid] += 1
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self._vocab, prefix)
+        return lo, bisect_left(self._vocab, prefix + "\U0010ffff", lo)
+
+    def _count(self, prefix: str) -> float:
+        # Places under `prefix` (an upper bound), or inf when the prefix spans too many words to count
+        lo, hi = self._range(prefix)
+        if hi - lo > 64:
+            return float("inf")
+        return sum(len(self._postings[t]) for t in self._vocab[lo:hi])
+
+    def _places_under(self, prefix: str) -> set:
+        lo, hi = self._range(prefix)
+        return set().union(*(self._postings[t] for t in self._vocab[lo:hi]))
+
+    def _candidates(self, prefix: str) -> Iterable[int]:
+        # Place ids with a token starting with `prefix`, ascending (a place may repeat)
+        lo, hi = self._range(prefix)
+        if hi - lo == 1:
+            return self._postings[self._vocab[lo]]
+        merged = heapq.merge(*(self._postings[t] for t in self._vocab[lo:hi]))
+        if len(prefix) > self.SHORT_PREFIX:
+            return merged
+        kept = self._short.get(prefix)
+        if kept is None:
+            kept = self._short[prefix] = []
+            for pid in merged:
+                if not kept or kept[-1] != pid:
+                    kept.append(pid)
+                    if len(kept) == self.SHORT_TOP:
+                        break
+        return kept
+
+    def suggest(self, query: str, limit: int = 5) -> List[Dict]:
+        words = fold_tokens(query)
+        if not words or limit <= 0:
+            return []
+        folded = " ".join(words)
+        wanted = max(4 * limit, 20)
+        with self._lock:
+            self._stats["queries"] += 1
+            # The word with the fewest places drives and the others filter its candidates: by
+            # their tokens at first, then, when matches are scarce, by the set of their places
+            counts = {w: self._count(w) for w in words}
+            driver = min(words, key=lambda w: (counts[w], -len(w)))
+            others, within = [w for w in dict.fromkeys(words) if w != driver], []
+            matched, scanned, last = {}, 0, -1
+            for pid in self._candidates(driver):
+                if pid == last:
+                    continue
+                last = pid
+                scanned += 1
+                if scanned == self.SETS_AFTER and others:
+                    within = [self._places_under(w) for w in others if counts[w] != float("inf")]
+                    others = [w for w in others if counts[w] == float("inf")]
+                if scanned > self.max_scan:
+                    self._stats["truncated"] += 1
+                    break
+                if (all(pid in places for places in within)
+                        and all(any(t.startswith(w) for t in self._tokens[pid]) for w in others)):
+                    label = self._places[pid][0]
+                    matched[pid] = (not label.startswith(folded), -self._hits[pid], len(label), pid)
+                    if len(matched) >= wanted:
+                        break
+            best = sorted(matched, key=matched.get)[:limit]
+            self._stats["suggested"] += len(best)
+            places = [self._places[pid] for pid in best]
+        return [{"label": label, "lat": lat, "lon": lon, "display_name": name}
+                for _, label, lat, lon, name in places]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, places=len(self._places), tokens=len(self._vocab), short_prefixes=len(self._short))
@@ -0,0 +1,267 @@
+# rate_limit.py
+# Cross-worker rate limiting for locator_service's OSM upstreams.
+#
+# Nominatim's usage policy allows about one request per second and Overpass
+# throttles hard, while every worker process used to call them on its own. Each
+# upstream gets one token bucket kept in a small SQLite file (WAL) shared by all
+# workers on the host; taking a token is one short IMMEDIATE transaction.
+#
+# Inside a worker, callers wait in a bounded priority queue and only the head
+# of the queue polls the bucket. Emergency callers sort first; one that finds
+# the bucket empty also claims the next token in the shared row, so routine
+# traffic from other workers holds back until it has it. A call that would
+# wait longer than `max_wait_s` (or finds the queue full) fails fast with
+# RateLimited instead of piling up. A 429 from the upstream pauses its bucket
+# for every worker (Retry-After).
+import contextvars
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    paused_until REAL NOT NULL,
+    claimed_until REAL NOT NULL
+);
+"""
+
+_priority = contextvars.ContextVar("upstream_priority", default=False)
+
+
+class RateLimited(RuntimeError):
+    """Raised instead of calling an upstream when its rate limit cannot be met in time."""
+
+    def __init__(self, upstream: str, reason: str, retry_after_s: float):
+        super().__init__(f"{upstream} rate limited ({reason}); retry after {retry_after_s:.1f}s")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+@contextmanager
+def priority_scope(priority: bool):
+    """Upstream calls made inside the block (in this thread) jump the queue when `priority` is true."""
+    token = _priority.set(bool(priority))
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def with_priority(fn):
+    """`fn` bound to the caller's current priority, for running on pool threads."""
+    priority = _priority.get()
+
+    def run(*args, **kwargs):
+        with priority_scope(priority):
+            return fn(*args, **kwargs)
+    return run
+
+
+class SharedBucket:
+    """One token bucket in a SQLite file; several processes may use the same name."""
+
+    CLAIM_S = 1.0  # how long a priority claim outlives its expected wait (the claimer may give up)
+
+    def __init__(self, path, name: str, rate: float, burst: float = 1.0):
+        self.path = str(path)
+        self.name = name
+        self.rate = rate  # tokens per second
+        self.burst = max(burst, 1.0)
+        self._local = threading.local()  # one connection per thread
+        self._db().executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _update(self, fn) -> float:
+        # fn(row, now) -> result, where row = [tokens, paused_until, claimed_until] is updated in place;
+        # all inside one write transaction
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated, paused_until, claimed_until FROM bucket WHERE name = ?",
+                             (self.name,)).fetchone()
+            tokens, updated, paused_until, claimed_until = row if row is not None else (self.burst, now, 0.0, 0.0)
+            row = [min(self.burst, tokens + max(0.0, now - updated) * self.rate), paused_until, claimed_until]
+            result = fn(row, now)
+            db.execute("INSERT OR REPLACE INTO bucket (name, tokens, updated, paused_until, claimed_until) "
+                       "VALUES (?, ?, ?, ?, ?)", (self.name, row[0], now, row[1], row[2]))
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        return result
+
+    def try_take(self, priority: bool = False) -> float:
+        """0.0 when a token was taken, otherwise the seconds until one may be available."""
+        def take(row, now):
+            tokens, paused_until, claimed_until = row
+            if now < paused_until:
+                wait_s = paused_until - now
+            elif not priority and now < claimed_until:
+                return claimed_until - now  # a priority caller somewhere is waiting for this token
+            elif tokens >= 1.0:
+                row[0] -= 1.0
+                if priority:
+                    row[2] = 0.0
+                return 0.0
+            else:
+                wait_s = (1.0 - tokens) / self.rate
+            if priority:
+                row[2] = max(claimed_until, now + wait_s + self.CLAIM_S)
+            return wait_s
+        return self._update(take)
+
+    def pause(self, seconds: float):
+        """Empty the bucket and stop handing out tokens for `seconds` (upstream said 429)."""
+        def stop(row, now):
+            row[0] = 0.0
+            row[1] = max(row[1], now + seconds)
+        self._update(stop)
+
+    def state(self) -> Dict:
+        row = self._db().execute("SELECT tokens, updated, paused_until, claimed_until FROM bucket WHERE name = ?",
+                                 (self.name,)).fetchone()
+        if row is None:
+            return {"tokens": self.burst, "paused_s": 0.0, "claimed_s": 0.0}
+        tokens, updated, paused_until, claimed_until = row
+        now = time.time()
+        return {"tokens": round(min(self.burst, tokens + max(0.0, now - updated) * self.rate), 3),
+                "paused_s": round(max(0.0, paused_until - now), 3),
+                "claimed_s": round(max(0.0, claimed_until - now), 3)}
+
+
+class UpstreamLimiter:
+    """
+    Bounded priority queue in front of a SharedBucket. `rate <= 0` disables
+    limiting (acquire returns at once and nothing is stored).
+    """
+
+    POLL_S = 0.25  # longest sleep of the queue head, so a new priority caller is noticed
+
+    def __init__(self, name: str, path, rate: float, burst: float = 1.0, max_queue: int = 32, max_wait_s: float = 10.0):
+        self.name = name
+        self.rate = rate
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.bucket = SharedBucket(path, name, rate, burst) if rate > 0 else None
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (0 for priority callers else 1, arrival order)
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=1000)  # seconds waited by recent admitted calls
+        self._stats = {"calls": 0, "priority_calls": 0, "waited": 0, "rejected_queue_full": 0,
+                       "rejected_timeout": 0, "throttled": 0, "errors": 0, "max_queue_seen": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.bucket is not None
+
+    def _reject(self, stat: str, reason: str, retry_after_s: float):
+        with self._cond:
+            self._stats[stat] += 1
+        raise RateLimited(self.name, reason, retry_after_s)
+
+    def acquire(self, priority: Optional[bool] = None, max_wait_s: Optional[float] = None) -> float:
+        """
+        Wait for a token; returns the seconds waited. Raises RateLimited when the
+        queue is full (routine callers only) or the wait would exceed max_wait_s.
+        `priority` defaults to the surrounding priority_scope.
+        """
+        if self.bucket is None:
+            return 0.0
+        priority = _priority.get() if priority is None else priority
+        start = time.monotonic()
+        deadline = start + (self.max_wait_s if max_wait_s is None else max_wait_s)
+        with self._cond:
+            self._stats["calls"] += 1
+            self._stats["priority_calls"] += bool(priority)
+            # Routine callers are turned away when the queue is full or already longer than they may wait
+            if not priority and (len(self._queue) >= self.max_queue or len(self._queue) / self.rate > self.max_wait_s):
+                self._stats["rejected_queue_full"] += 1
+                raise RateLimited(self.name, "queue full", len(self._queue) / self.rate)
+            entry = (0 if priority else 1, next(self._seq))
+            heapq.heappush(self._queue, entry)
+            self._stats["max_queue_seen"] = max(self._stats["max_queue_seen"], len(self._queue))
+            self._cond.notify_all()  # a sleeping head re-checks whether it is still first
+        try:
+            while True:
+                with self._cond:
+                    while self._queue[0] != entry:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("rejected_timeout", "queue wait", 1.0 / self.rate)
+                        self._cond.wait(remaining)
+                try:
+                    wait_s = self.bucket.try_take(priority)  # outside the lock: may wait on other workers
+                except sqlite3.Error as e:
+                    print(f"Warning: {self.name} rate limiter unavailable:", e)
+                    with self._cond:
+                        self._stats["errors"] += 1
+                    wait_s = 0.0  # fail open rather than refuse every call
+                if wait_s <= 0:
+                    waited = time.monotonic() - start
+                    with self._cond:
+                        self._waits.append(waited)
+                        self._stats["waited"] += waited > 0.001
+                    return waited
+                if time.monotonic() + wait_s > deadline:
+                    self._reject("rejected_timeout", "wait too long", wait_s)
+                with self._cond:
+                    self._cond.wait(min(wait_s, self.POLL_S))
+        finally:
+            with self._cond:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def throttled(self, retry_after_s: float):
+        """The upstream answered 429: pause the shared bucket for every worker."""
+        with self._cond:
+            self._stats["throttled"] += 1
+        if self.bucket is not None:
+            try:
+                self.bucket.pause(retry_after_s)
+            except sqlite3.Error as e:
+                print(f"Warning: {self.name} rate limiter unavailable:", e)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            out = dict(self._stats)
+            waits = sorted(self._waits)
+            out["queued"] = len(self._queue)
+        out.update(enabled=self.enabled, rate=self.rate, max_queue=self.max_queue, max_wait_s=self.max_wait_s)
+        if waits:
+            out["wait_ms"] = {"p50": round(waits[len(waits) // 2] * 1000, 1),
+                              "p95": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))] * 1000, 1),
+                              "max": round(waits[-1] * 1000, 1)}
+        if self.bucket is not None:
+            try:
+                out.update(self.bucket.state(), burst=self.bucket.burst)
+            except sqlite3.Error:
+                pass
+        return out
+
+
+def retry_after_s(response, default: float) -> float:
+    """Seconds from a Retry-After header (delta-seconds form), else `default`."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", default)))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,147 @@
+# red_flags.py
+# Multi-pattern red-flag matcher used by triageAgent.
+#
+# The lexicon is compiled once into an Aho-Corasick automaton, so scanning a
+# request costs one pass over the text no matter how many phrases are loaded.
+import os
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_LEXICON_PATH = Path(__file__).resolve().parent / "red_flags.txt"
+
+# Used when the default lexicon file is missing
+BUILTIN_RED_FLAGS = [
+    "difficulty breathing", "shortness of breath", "chest pain", "severe bleeding",
+    "unconscious", "fainting", "sudden weakness", "slurred speech", "confused",
+    "loss of consciousness", "severe allergic reaction", "unable to wake"
+]
+
+
+# Phone keyboards type curly apostrophes ("can’t breathe"); fold them onto '
+_APOSTROPHES = str.maketrans({"\u2019": "'", "\u2018": "'", "\u02bc": "'"})
+
+
+def _normalize_phrase(phrase: str) -> str:
+    return " ".join(phrase.lower().translate(_APOSTROPHES).split())
+
+
+def load_lexicon(path: Optional[Path] = None) -> List[Tuple[str, str]]:
+    """
+    Read a lexicon file into (phrase, canonical_flag) pairs.
+
+    One entry per line; `variant | canonical` maps a synonym or misspelling
+    onto the flag reported back. Blank lines and `#` comments are ignored.
+    A path given explicitly (argument or RED_FLAGS_PATH) must exist; only a
+    missing default file falls back to the built-in phrases.
+    """
+    configured = path or os.getenv("RED_FLAGS_PATH")
+    path = Path(configured or DEFAULT_LEXICON_PATH)
+    if not path.exists():
+        if configured:
+            raise FileNotFoundError(f"red-flag lexicon not found: {path}")
+        return [(f, f) for f in BUILTIN_RED_FLAGS]
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            phrase, _, canonical = line.partition("|")
+            phrase = _normalize_phrase(phrase)
+            canonical = _normalize_phrase(canonical) or phrase
+            if phrase:
+                entries.append((phrase, canonical))
+    return entries
+
+
+class RedFlagMatcher:
+    """Aho-Corasick automaton over lowercased phrases with word-boundary checks."""
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> list of (phrase_length, canonical_flag)
+        self._out: List[List[Tuple[int, str]]] = [[]]
+        self.size = 0
+        for phrase, canonical in entries:
+            self._add(phrase, canonical)
+        self._build()
+
+    def _add(self, phrase: str, canonical: str):
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if (len(phrase), canonical) not in self._out[node]:
+            self._out[node].append((len(phrase), canonical))
+            self.size += 1
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Dict]:
+        """
+        Return every lexicon match in `text` as {flag, match, start, end}, ordered by position.
+
+        Matching is case-insensitive, curly apostrophes match straight ones and
+        whitespace runs in the text are treated as single spaces; spans index
+        into the original string.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        # Collapse whitespace runs while remembering where each kept char came from
+        chars: List[str] = []
+        pos: List[int] = []
+        prev_space = True
+        for i, orig in enumerate(text):
+            for ch in orig.lower().translate(_APOSTROPHES):
+                if ch.isspace():
+                    if prev_space:
+                        continue
+                    ch = " "
+                    prev_space = True
+                else:
+                    prev_space = False
+                chars.append(ch)
+                pos.append(i)
+        n = len(chars)
+
+        matches = []
+        node = 0
+        for i, ch in enumerate(chars):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            for length, canonical in out[node]:
+                start = i - length + 1
+                if start > 0 and chars[start - 1].isalnum():
+                    continue
+                if i + 1 < n and chars[i + 1].isalnum():
+                    continue
+                matches.append({
+                    "flag": canonical,
+                    "match": text[pos[start]:pos[i] + 1],
+                    "start": pos[start],
+                    "end": pos[i] + 1,
+                })
+        matches.sort(key=lambda m: (m["start"], -m["end"]))
+        return matches
@@ -0,0 +1,191 @@
+# resilience.py
+# Failure handling for upstream model calls: per-attempt timeouts, a circuit
+# breaker that fails fast while the upstream is down, and optional hedging
+# (a second attempt fired once the first is slower than usual).
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_timeout_s`, letting one probe call through;
+    half_open -> closed if the probe succeeds, back to open if it fails.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            self._state = "half_open"
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._state = "closed"
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._stats["opened"] += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["state"] = self._current_state()
+            out["consecutive_failures"] = self._failures
+            return out
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, for picking a hedge delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def hedged_call(pool: ThreadPoolExecutor, fn, args=(), timeout_s: float = 30.0,
+                hedge_delay_s: Optional[float] = None, stats: Optional[Dict] = None):
+    """
+    Run fn(*args) on `pool` and return the first successful result within `timeout_s`.
+
+    With a hedge delay, a second attempt is started when the first has not
+    finished after that long (or as soon as the first fails). Losing attempts
+    are cancelled if they have not started; a started thread cannot be
+    interrupted, so its result is simply dropped.
+    """
+    deadline = time.monotonic() + timeout_s
+    attempts = [pool.submit(fn, *args)]
+    hedge_pending = hedge_delay_s is not None and hedge_delay_s < timeout_s
+    last_error: Optional[BaseException] = None
+    hedge = None
+
+    while attempts:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        wait_s = min(remaining, hedge_delay_s) if hedge_pending else remaining
+        done, _ = wait(attempts, timeout=wait_s, return_when=FIRST_COMPLETED)
+        for fut in done:
+            attempts.remove(fut)
+            if fut.exception() is None:
+                for other in attempts:
+                    other.cancel()
+                if stats is not None and fut is hedge:
+                    stats["hedge_wins"] = stats.get("hedge_wins", 0) + 1
+                return fut.result()
+            last_error = fut.exception()
+        if hedge_pending and (not done or not attempts):
+            # First attempt is slow, or already failed: fire the hedge
+            hedge_pending = False
+            hedge = pool.submit(fn, *args)
+            attempts.append(hedge)
+            if stats is not None:
+                stats["hedges"] = stats.get("hedges", 0) + 1
+
+    for fut in attempts:
+        fut.cancel()
+    if last_error is not None and not attempts:
+        raise last_error
+    raise TimeoutError(f"upstream call exceeded {timeout_s}s")
+
+
+def race_first(pool: ThreadPoolExecutor, calls, hedge_delay_s: float, timeout_s: float = 30.0,
+               stats: Optional[Dict] = None):
+    """
+    Hedged race across different upstreams: `calls` is a list of (fn, args).
+
+    calls[0] starts at once; each following call starts after `hedge_delay_s`
+    or as soon as every running call has failed or returned None. The first
+    non-None result wins and the rest are cancelled (dropped, if already
+    running). Returns None when every call fails, comes back empty, or the
+    deadline passes.
+    """
+    deadline = time.monotonic() + timeout_s
+    pending = list(calls)
+    running = {}
+    next_start = time.monotonic()
+
+    try:
+        while pending or running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if pending and (now >= next_start or not running):
+                fn, args = pending.pop(0)
+                position = len(calls) - len(pending) - 1
+                running[pool.submit(fn, *args)] = position
+                next_start = now + hedge_delay_s
+                if stats is not None and position:
+                    stats["hedges"] = stats.get("hedges", 0) + 1
+                continue
+            wait_s = deadline - now
+            if pending:
+                wait_s = min(wait_s, max(0.0, next_start - now))
+            done, _ = wait(list(running), timeout=wait_s, return_when=FIRST_COMPLETED)
+            for fut in done:
+                position = running.pop(fut)
+                if fut.exception() is None and fut.result() is not None:
+                    if stats is not None:
+                        key = "primary_wins" if position == 0 else "hedge_wins"
+                        stats[key] = stats.get(key, 0) + 1
+                    return fut.result()
+    finally:
+        for fut in running:
+            fut.cancel()
+    return None
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# Top-level modules, and the fake upstream servers under benchmarks/
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# locator_service reads its files and upstreams at import: keep them out of the
+# working tree, with no offline index, snapshot or rate limiting.
+_work = tempfile.mkdtemp(prefix="locator-tests-")
+for name, value in {
+    "LOCATOR_CACHE_PATH": os.path.join(_work, "locator_cache.json"),
+    "LOCATOR_GEOCODE_DB": os.path.join(_work, "geocode.sqlite3"),
+    "LOCATOR_INDEX_PATH": os.path.join(_work, "no-index.json"),
+    "LOCATOR_SNAPSHOT_PATH": os.path.join(_work, "no-snapshot.bin"),
+    "LOCATOR_RATE_LIMIT_DB": os.path.join(_work, "ratelimit.sqlite3"),
+    "LOCATOR_RATE_LIMIT": "0",
+    "LOCATOR_NOMINATIM_URL": "http://127.0.0.1:9/search",
+    "LOCATOR_PHOTON_URL": "http://127.0.0.1:9/api/",
+    "LOCATOR_OVERPASS_URL": "http://127.0.0.1:9/api/interpreter",
+}.items():
+    os.environ[name] = value
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """triageAgent with a fresh cache and single flight, and no local model; tests stub the Gemini calls."""
+    import triageAgent
+    from triage_cache import SingleFlight, TriageCache
+
+    monkeypatch.setattr(triageAgent, "triage_cache", TriageCache(64, 3600.0))
+    monkeypatch.setattr(triageAgent, "single_flight", SingleFlight(5.0))
+    monkeypatch.setattr(triageAgent, "local_model", None)
+    return triageAgent
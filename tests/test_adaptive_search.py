@@ -0,0 +1,90 @@
+import json
+import random
+from datetime import datetime
+
+import pytest
+
+import locator_service as loc
+from fake_overpass_server import DEFAULT_FIXTURE, run_query
+
+with open(DEFAULT_FIXTURE, "r", encoding="utf-8") as f:
+    ELEMENTS = json.load(f)["elements"]
+
+
+def full_radius(lat, lon, radius, limit, open_at=None):
+    """What one query at the caller's radius returns."""
+    elements = run_query(ELEMENTS, loc.plan_overpass_query(lat, lon, radius))[0]
+    return loc._rank_elements(elements, lat, lon, limit, open_at=open_at)
+
+
+@pytest.fixture
+def overpass(monkeypatch):
+    queries = []
+
+    def fetch(query):
+        queries.append(query)
+        elements = run_query(ELEMENTS, query)[0]
+        return elements, len(json.dumps(elements))
+
+    monkeypatch.setattr(loc, "_fetch_overpass_sized", fetch)
+    monkeypatch.setattr(loc, "pharmacy_index", None)
+    monkeypatch.setattr(loc, "ADAPTIVE_START_M", 1000.0)
+    monkeypatch.setattr(loc, "ADAPTIVE_GROWTH", 2.0)
+    return queries
+
+
+def random_queries(n, seed=7):
+    rng = random.Random(seed)
+    return [(45.70 + rng.random() * 0.12, 4.78 + rng.random() * 0.15,
+             rng.choice([800, 1500, 3000, 5000, 12000, 20000]), rng.choice([1, 3, 5, 10, 25]))
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize("lat, lon, radius, limit", random_queries(60))
+def test_same_answer_as_one_full_radius_query(overpass, lat, lon, radius, limit):
+    results, info = loc.find_pharmacies_adaptive(lat, lon, radius, limit)
+    assert info["exact"] is True
+    assert results == full_radius(lat, lon, radius, limit)
+
+
+def test_fewer_than_k_within_the_max_radius(overpass):
+    lat, lon, radius, limit = 45.7640, 4.8357, 1500, 500
+    expected = full_radius(lat, lon, radius, limit)
+    assert 0 < len(expected) < limit
+    results, info = loc.find_pharmacies_adaptive(lat, lon, radius, limit)
+    assert results == expected
+    # Every ring was needed, ending at the caller's radius
+    assert [r["radius_m"] for r in info["rings"]] == loc.ring_radii(radius)
+
+
+def test_nothing_within_the_max_radius(overpass):
+    results, info = loc.find_pharmacies_adaptive(44.0, 2.0, 5000, 5)  # far from the fixture
+    assert results == [] == full_radius(44.0, 2.0, 5000, 5)
+    assert info["exact"] is True and info["rings"][-1]["radius_m"] == 5000
+
+
+def test_dense_area_stops_before_the_full_radius(overpass):
+    lat, lon, radius, limit = 45.7640, 4.8357, 20000, 3
+    results, info = loc.find_pharmacies_adaptive(lat, lon, radius, limit)
+    assert results == full_radius(lat, lon, radius, limit)
+    assert len(info["rings"]) < len(loc.ring_radii(radius))
+
+
+@pytest.mark.parametrize("lat, lon, radius, limit", random_queries(15, seed=11))
+def test_same_answer_with_open_at(overpass, lat, lon, radius, limit):
+    open_at = datetime(2024, 3, 5, 21, 30)  # a Tuesday evening: many pharmacies closed
+    results, _ = loc.find_pharmacies_adaptive(lat, lon, radius, limit, open_at=open_at)
+    assert results == full_radius(lat, lon, radius, limit, open_at=open_at)
+
+
+def test_failed_ring_is_flagged_not_exact(overpass, monkeypatch):
+    fetch = loc._fetch_overpass_sized
+
+    def second_ring_fails(query):
+        if overpass:
+            raise ConnectionError("overpass down")
+        return fetch(query)
+
+    monkeypatch.setattr(loc, "_fetch_overpass_sized", second_ring_fails)
+    results, info = loc.find_pharmacies_adaptive(45.7640, 4.8357, 20000, 500)
+    assert info["exact"] is False and len(info["rings"]) == 1
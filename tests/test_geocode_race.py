@@ -0,0 +1,98 @@
+# Race mode of locator_service.geocode_location (LOCATOR_GEOCODE_HEDGE) against
+# the fake Nominatim/Photon servers. Every test geocodes places of its own, so
+# the geocode store never answers.
+import itertools
+import time
+
+import pytest
+
+import locator_service as loc
+from fake_geocoder_server import FakeGeocoderServer
+
+HEDGE_DELAY_S = 0.2
+_places = itertools.count()
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = FakeGeocoderServer(jitter_ms=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def geocoders(server, monkeypatch):
+    server.update(nominatim_latency_ms=20, photon_latency_ms=20, nominatim_error_rate=0.0, photon_error_rate=0.0,
+                  nominatim_empty_rate=0.0, photon_empty_rate=0.0)
+    server.reset_stats()
+    monkeypatch.setattr(loc, "NOMINATIM_URL", server.nominatim_url)
+    monkeypatch.setattr(loc, "PHOTON_URL", server.photon_url)
+    monkeypatch.setattr(loc, "GEOCODE_HEDGE", True)
+    monkeypatch.setattr(loc, "GEOCODE_HEDGE_DELAY_S", HEDGE_DELAY_S)
+    monkeypatch.setattr(loc, "geocode_stats", dict.fromkeys(loc.geocode_stats, 0))
+    return server
+
+
+def geocode():
+    place = f"Race test place {next(_places)}"
+    start = time.monotonic()
+    result = loc.geocode_location(place)
+    return place, result, time.monotonic() - start
+
+
+def source(meta):
+    # Photon properties carry osm_key; Nominatim items carry place_id
+    return "photon" if "osm_key" in meta else "nominatim"
+
+
+def test_fast_primary_wins_without_a_hedge(geocoders):
+    _, result, _ = geocode()
+    assert source(result[2]) == "nominatim"
+    assert geocoders.stats["photon"] == 0
+    assert loc.geocode_stats["primary_wins"] == 1 and loc.geocode_stats["hedges"] == 0
+
+
+def test_slow_primary_loses_to_the_hedge(geocoders):
+    geocoders.update(nominatim_latency_ms=1500)
+    _, result, elapsed = geocode()
+    assert source(result[2]) == "photon"
+    assert HEDGE_DELAY_S <= elapsed < 1.0
+    assert loc.geocode_stats["hedge_wins"] == 1 and loc.geocode_stats["photon"] == 1
+
+
+def test_empty_primary_answer_does_not_win(geocoders):
+    geocoders.update(nominatim_empty_rate=1.0)
+    _, result, elapsed = geocode()
+    assert source(result[2]) == "photon"
+    assert elapsed < HEDGE_DELAY_S  # Photon starts as soon as Nominatim comes back empty
+
+
+def test_primary_error_falls_to_photon(geocoders):
+    geocoders.update(nominatim_error_rate=1.0)
+    _, result, elapsed = geocode()
+    assert source(result[2]) == "photon"
+    assert elapsed < HEDGE_DELAY_S
+
+
+def test_hedge_error_leaves_the_slow_primary(geocoders):
+    geocoders.update(nominatim_latency_ms=500, photon_error_rate=1.0)
+    _, result, elapsed = geocode()
+    assert source(result[2]) == "nominatim"
+    assert elapsed >= 0.45
+    assert geocoders.stats["photon"] == 1 and loc.geocode_stats["primary_wins"] == 1
+
+
+def test_both_empty_is_not_found(geocoders):
+    geocoders.update(nominatim_empty_rate=1.0, photon_empty_rate=1.0)
+    place, result, _ = geocode()
+    assert result is None
+    assert geocoders.stats["nominatim"] == 1 and geocoders.stats["photon"] == 1
+    assert loc.geocode_stats["failed"] == 1
+    assert loc.geocode_store.get(loc.canonical_key(place)) is None
+
+
+def test_both_errors_is_not_found(geocoders):
+    geocoders.update(nominatim_error_rate=1.0, photon_error_rate=1.0)
+    _, result, _ = geocode()
+    assert result is None
+    assert loc.geocode_stats["failed"] == 1
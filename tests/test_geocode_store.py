@@ -0,0 +1,28 @@
+import json
+
+from geocode_store import GeocodeStore
+
+LEGACY = {"lyon": {"lat": 45.76, "lon": 4.83, "meta": {"display_name": "Lyon, France"}}}
+
+
+def test_migrates_legacy_json_once(tmp_path):
+    legacy = tmp_path / "locator_cache.json"
+    legacy.write_text(json.dumps(LEGACY), encoding="utf-8")
+    store = GeocodeStore(tmp_path / "geocode.sqlite3")
+    assert store.migrate_json(legacy) == 1
+    assert store.get("lyon")[:2] == (45.76, 4.83)
+    assert store.migrate_json(legacy) == 0
+    # Another worker sharing the file sees the marker too
+    assert GeocodeStore(tmp_path / "geocode.sqlite3").migrate_json(legacy) == 0
+
+
+def test_unreadable_legacy_json_is_retried(tmp_path):
+    legacy = tmp_path / "locator_cache.json"
+    legacy.write_text(json.dumps(LEGACY)[:20], encoding="utf-8")  # half-written
+    store = GeocodeStore(tmp_path / "geocode.sqlite3")
+    assert store.migrate_json(legacy) == 0
+    assert store.get("lyon") is None
+
+    legacy.write_text(json.dumps(LEGACY), encoding="utf-8")
+    assert store.migrate_json(legacy) == 1
+    assert store.get("lyon") is not None
@@ -0,0 +1,43 @@
+# Cold-import budget for the triage service (TRIAGE_IMPORT_BUDGET_MS, default
+# 600ms, median of 3 fresh interpreters). google.generativeai takes most of a
+# second to import on its own, so it must stay out of the import path.
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_MS = float(os.getenv("TRIAGE_IMPORT_BUDGET_MS", "600"))
+RUNS = 3
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed * 1000, int("google.generativeai" in sys.modules))
+"""
+
+
+def measure(module: str):
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("GEMINI_API_KEY", "GOOGLE_API_KEY", "TRIAGE_WARMUP", "TRIAGE_LOCAL_MODEL_PATH")}
+    env["PYTHONPATH"] = str(ROOT)
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE.format(module=module)],
+        cwd=str(ROOT), env=env, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    ms, genai = proc.stdout.split()
+    return float(ms), genai == "1"
+
+
+@pytest.mark.parametrize("module", ["triageAgent", "triage_asgi"])
+def test_cold_import_within_budget(module):
+    samples = [measure(module) for _ in range(RUNS)]
+    assert not any(genai for _, genai in samples), "google.generativeai imported at module import"
+    median = statistics.median(ms for ms, _ in samples)
+    assert median <= BUDGET_MS, f"import {module}: median {median:.0f}ms over the {BUDGET_MS:.0f}ms budget"
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from json_extract import IncrementalJSONExtractor, extract_json_array, extract_json_object
+
+CORPUS = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "model_outputs.jsonl"
+with open(CORPUS, "r", encoding="utf-8") as f:
+    CASES = [json.loads(line) for line in f if line.strip()]
+TRUNCATED = '{"urgency":"EMERGENCY","possible_conditions":["x"'
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c["name"] for c in CASES])
+def test_model_output_corpus(case):
+    assert extract_json_object(case["output"]) == case["expected"]
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c["name"] for c in CASES])
+def test_streamed_in_chunks(case):
+    ex = IncrementalJSONExtractor()
+    got = None
+    for i in range(0, len(case["output"]), 7):
+        got = ex.feed(case["output"][i:i + 7])
+        if got is not None:
+            break
+    assert got == case["expected"]
+
+
+def test_truncated_object_is_not_an_answer():
+    assert extract_json_object(TRUNCATED) is None
+    assert extract_json_object(TRUNCATED, allow_partial=True) == {"urgency": "EMERGENCY"}
+
+
+def test_truncated_array_is_not_an_answer():
+    text = '[{"id": 0, "urgency": "LOW"}, {"id": 1, "urg'
+    assert extract_json_array(text) is None
+    assert extract_json_array(text, allow_partial=True) == [{"id": 0, "urgency": "LOW"}]
+
+
+def test_truncated_model_output_is_not_cached(monkeypatch):
+    import triageAgent
+    from triage_cache import TriageCache
+
+    cache = TriageCache(16, 3600.0)
+    monkeypatch.setattr(triageAgent, "triage_cache", cache)
+    monkeypatch.setattr(triageAgent, "local_model", None)
+    result = triageAgent.triage_from_raw("sore throat", TRUNCATED)
+    assert result == triageAgent.UNPARSEABLE_RESPONSE
+    assert cache.get(triageAgent.cache_key("sore throat")) is None
+
+    complete = TRUNCATED + '],"recommended_actions":["emergency"],"explanation":"x"}'
+    assert triageAgent.triage_from_raw("sore throat", complete)["urgency"] == "EMERGENCY"
+    assert cache.get(triageAgent.cache_key("sore throat")) is not None
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+import triage_classifier
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "data" / "triage_examples.csv"
+GUESS = {"urgency": "LOW", "possible_conditions": [], "recommended_actions": ["self_care"],
+         "explanation": "Assessed by the offline triage model; please seek care if symptoms worsen."}
+
+
+class StubLocalModel:
+    def __init__(self, confidence):
+        self.confidence = confidence
+
+    def predict(self, text):
+        return dict(GUESS), self.confidence
+
+
+@pytest.fixture
+def gemini_down(agent, monkeypatch):
+    def fail(symptoms):
+        raise TimeoutError("gemini timed out")
+
+    monkeypatch.setattr(agent, "call_gemini_generate", fail)
+    monkeypatch.setattr(agent, "local_stats", {"answered": 0, "deferred": 0, "fallbacks": 0, "fallbacks_declined": 0})
+    monkeypatch.setattr(agent, "LOCAL_CONFIDENCE", 0.9)
+    monkeypatch.setattr(agent, "FALLBACK_CONFIDENCE", 0.7)
+    return agent
+
+
+def test_confident_local_guess_is_the_fallback(gemini_down, monkeypatch):
+    agent = gemini_down
+    monkeypatch.setattr(agent, "local_model", StubLocalModel(0.8))  # below the local bar, above the fallback one
+    assert agent.triage_text("itchy eyes and sneezing") == GUESS
+    assert agent.local_stats["deferred"] == 1 and agent.local_stats["fallbacks"] == 1
+
+
+def test_unconfident_local_guess_falls_back_to_moderate(gemini_down, monkeypatch):
+    agent = gemini_down
+    monkeypatch.setattr(agent, "local_model", StubLocalModel(0.4))
+    result = agent.triage_text("itchy eyes and sneezing")
+    assert result == agent.UNAVAILABLE_RESPONSE and result["urgency"] == "MODERATE"
+    assert agent.local_stats["fallbacks"] == 0 and agent.local_stats["fallbacks_declined"] == 1
+
+
+def test_unparseable_answer_uses_the_same_gate(agent, monkeypatch):
+    monkeypatch.setattr(agent, "call_gemini_generate", lambda symptoms: "no json here")
+    monkeypatch.setattr(agent, "FALLBACK_CONFIDENCE", 0.7)
+    monkeypatch.setattr(agent, "local_model", StubLocalModel(0.5))
+    assert agent.triage_text("itchy eyes") == agent.UNPARSEABLE_RESPONSE
+
+
+def test_no_local_model_gives_the_canned_answer(gemini_down):
+    assert gemini_down.triage_text("itchy eyes") == gemini_down.UNAVAILABLE_RESPONSE
+
+
+def test_holdout_split_is_stratified_and_disjoint():
+    texts, urgencies, actions = triage_classifier.read_csv(str(EXAMPLES))
+    train, held = triage_classifier.split_holdout(texts, urgencies, actions, 0.2)
+    assert len(train[0]) + len(held[0]) == len(texts)
+    assert not set(train[0]) & set(held[0])
+    assert sorted(held[1]) == sorted(u for u in triage_classifier.URGENCIES for _ in range(3))
+    assert triage_classifier.split_holdout(texts, urgencies, actions, 0.2) == (train, held)
@@ -0,0 +1,158 @@
+import json
+import threading
+
+import pytest
+
+import locator_service as loc
+from fake_overpass_server import DEFAULT_FIXTURE, run_query
+from rate_limit import RateLimited
+
+with open(DEFAULT_FIXTURE, "r", encoding="utf-8") as f:
+    ELEMENTS = json.load(f)["elements"]
+
+PLACES = {  # canonical key -> (lat, lon)
+    "bellecour lyon": (45.7578, 4.8320),
+    "lyon part dieu": (45.7606, 4.8594),
+    "croix rousse lyon": (45.7797, 4.8270),
+    "villeurbanne": (45.7719, 4.8902),
+}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Stub geocoder (counts calls per text) and fixture-backed Overpass."""
+    state = {"geocoded": [], "overpass": 0}
+    lock = threading.Lock()
+
+    def geocode(text, use_snapshot=True):
+        with lock:
+            state["geocoded"].append(text)
+        key = loc.canonical_key(text)
+        if key == "busy town":
+            raise RateLimited("nominatim", "queue full", 1.5)
+        if key not in PLACES:
+            return None
+        lat, lon = PLACES[key]
+        return lat, lon, {"display_name": text}
+
+    def overpass(query):
+        with lock:
+            state["overpass"] += 1
+        return run_query(ELEMENTS, query)[0]
+
+    monkeypatch.setattr(loc, "geocode_location", geocode)
+    monkeypatch.setattr(loc, "_run_overpass_query", overpass)
+    monkeypatch.setattr(loc, "tile_cache", None)
+    monkeypatch.setattr(loc, "pharmacy_index", None)
+    monkeypatch.setattr(loc.snapshots, "current", lambda: None)
+    return state
+
+
+def single(lat, lon, radius=loc.DEFAULT_RADIUS_M, limit=loc.DEFAULT_LIMIT):
+    return loc._rank_elements(run_query(ELEMENTS, loc.plan_overpass_query(lat, lon, radius))[0], lat, lon, limit)
+
+
+def post(items, **options):
+    r = loc.app.test_client().post("/locator/batch", json=dict(options, items=items))
+    return r.status_code, r.get_json()
+
+
+def test_each_distinct_location_is_geocoded_once(upstream):
+    items = ["Bellecour, Lyon", "lyon: bellecour", " LYON (Bellecour) ", "Part-Dieu, Lyon", "part dieu, lyon",
+             "Villeurbanne"] * 5
+    status, out = post(items, radius_m=1500, limit=3)
+    assert status == 200
+    assert out["count"] == 30 and out["unique_locations"] == 3
+    assert len(upstream["geocoded"]) == 3
+    assert all(item["status"] == "ok" for item in out["items"])
+
+
+def test_results_in_input_order_and_same_as_single_lookups(upstream):
+    items = ["Villeurbanne", "Bellecour, Lyon", {"id": "p7", "location": "Croix-Rousse, Lyon", "limit": 2},
+             {"lat": 45.7485, "lon": 4.8467}, "Part-Dieu, Lyon"]
+    status, out = post(items, radius_m=2000, limit=4)
+    assert status == 200
+    expected = [
+        single(*PLACES["villeurbanne"], 2000, 4),
+        single(*PLACES["bellecour lyon"], 2000, 4),
+        single(*PLACES["croix rousse lyon"], 2000, 2),
+        single(45.7485, 4.8467, 2000, 4),
+        single(*PLACES["lyon part dieu"], 2000, 4),
+    ]
+    assert [item["results"] for item in out["items"]] == expected
+    assert out["items"][0]["query_location"]["input"] == "Villeurbanne"
+    assert out["items"][2]["id"] == "p7"
+
+
+def test_raw_points_skip_geocoding(upstream):
+    status, out = post([{"lat": 45.7640, "lon": 4.8357}, {"lat": "45.7650", "lon": "4.8370", "id": 2}])
+    assert status == 200 and upstream["geocoded"] == []
+    assert out["unique_locations"] == 0
+    assert out["items"][0]["query_location"] == {"lat": 45.7640, "lon": 4.8357}
+    assert out["items"][1]["id"] == 2 and out["items"][1]["status"] == "ok"
+
+
+def test_nearby_points_share_one_lookup(upstream):
+    points = [{"lat": 45.7640 + i * 0.0005, "lon": 4.8357} for i in range(6)]
+    status, out = post(points, radius_m=1000)
+    assert out["lookups"] == 1 and upstream["overpass"] == 1
+    for point, item in zip(points, out["items"]):
+        assert item["results"] == single(point["lat"], point["lon"], 1000)
+
+
+def test_per_item_errors_leave_the_rest_alone(upstream):
+    items = [
+        "Bellecour, Lyon",
+        42,
+        {"id": "empty"},
+        {"lat": 95.0, "lon": 4.8},
+        {"location": "Villeurbanne", "radius_m": "far"},
+        "Nowhere at all",
+        {"id": "b", "location": "Busy town"},
+        "Villeurbanne",
+    ]
+    status, out = post(items)
+    assert status == 200
+    got = [(item["status"], item.get("message")) for item in out["items"]]
+    assert got[0] == ("ok", None) and got[-1] == ("ok", None)
+    assert got[1] == ("error", "item must be a string or an object")
+    assert got[2] == ("error", "No location provided") and out["items"][2]["id"] == "empty"
+    assert got[3] == ("error", "lat/lon out of range")
+    assert got[4][0] == "error"
+    assert got[5] == ("error", "Could not geocode location")
+    busy = out["items"][6]
+    assert busy["status"] == "error" and busy["retry_after_s"] == 1.5 and busy["id"] == "b"
+    assert all(item["results"] == [] for item in out["items"][1:7])
+
+
+def test_rate_limited_lookup_fails_only_its_group(upstream, monkeypatch):
+    group = loc.find_pharmacies_group
+
+    def lookup(points, radius=loc.DEFAULT_RADIUS_M, limit=loc.DEFAULT_LIMIT):
+        if points[0][0] > 45.77:
+            raise RateLimited("overpass", "upstream returned 429", 4.0)
+        return group(points, radius, limit)
+
+    monkeypatch.setattr(loc, "find_pharmacies_group", lookup)
+    status, out = post(["Bellecour, Lyon", "Croix-Rousse, Lyon"], radius_m=1000)
+    assert out["items"][0]["status"] == "ok"
+    assert out["items"][1]["status"] == "error" and out["items"][1]["retry_after_s"] == 4.0
+
+
+def test_fields_and_compact_apply_per_item(upstream):
+    status, out = post(["Bellecour, Lyon"], fields="name,distance_m", compact=True, limit=2)
+    item = out["items"][0]
+    assert "raw_geocode" not in item["query_location"]
+    assert all(set(r) <= {"name", "distance_m"} for r in item["results"])
+
+
+@pytest.mark.parametrize("payload", [{"items": []}, {"items": "Lyon"}, {}, []])
+def test_empty_or_invalid_batch_is_a_400(upstream, payload):
+    r = loc.app.test_client().post("/locator/batch", json=payload)
+    assert r.status_code == 400
+
+
+def test_too_many_items_is_a_400(upstream, monkeypatch):
+    monkeypatch.setattr(loc, "BATCH_MAX_ITEMS", 3)
+    status, out = post(["Villeurbanne"] * 4)
+    assert status == 400 and upstream["geocoded"] == []
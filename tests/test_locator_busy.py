@@ -0,0 +1,46 @@
+# A rate-limited /locator request answers 503 with Retry-After, whichever JSON encoder is in use.
+import pytest
+
+import locator_service as loc
+from rate_limit import RateLimited
+
+ENCODERS = ["json", pytest.param("orjson", marks=pytest.mark.skipif(loc.orjson is None, reason="orjson not installed"))]
+
+
+def busy(*args, **kwargs):
+    raise RateLimited("nominatim", "queue full", 2.2)
+
+
+@pytest.fixture
+def client():
+    return loc.app.test_client()
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+@pytest.mark.parametrize("fmt", ["json", "ndjson"])
+def test_busy_geocoder(client, monkeypatch, encoder, fmt):
+    monkeypatch.setattr(loc, "JSON_ENCODER", encoder)
+    monkeypatch.setattr(loc, "geocode_location", busy)
+    r = client.post("/locator", json={"location": "Lyon", "format": fmt})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "3"
+    body = r.get_json()
+    assert body["status"] == "error" and body["retry_after_s"] == 2.2 and body["results"] == []
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_busy_overpass(client, monkeypatch, encoder):
+    monkeypatch.setattr(loc, "JSON_ENCODER", encoder)
+    monkeypatch.setattr(loc, "geocode_location", lambda text, use_snapshot=True: (45.76, 4.83, {}))
+    monkeypatch.setattr(loc, "find_pharmacies", busy)
+    r = client.post("/locator", json={"location": "Lyon"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "3"
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_json_response_status(encoder, monkeypatch):
+    monkeypatch.setattr(loc, "JSON_ENCODER", encoder)
+    with loc.app.app_context():
+        resp = loc.json_response({"status": "error"}, status=404)
+    assert resp.status_code == 404 and resp.get_json() == {"status": "error"}
@@ -0,0 +1,144 @@
+import json
+import random
+from datetime import datetime
+
+import pytest
+
+import locator_service as loc
+from fake_overpass_server import DEFAULT_FIXTURE, run_query
+from locator_snapshot import Snapshot, SnapshotManager, build_snapshot
+
+with open(DEFAULT_FIXTURE, "r", encoding="utf-8") as f:
+    ELEMENTS = json.load(f)["elements"]
+
+AREA = "45.68,4.74,45.84,4.96"  # south,west,north,east around the fixture
+LYON = (45.7578, 4.8320, {"display_name": "Lyon, France"})
+
+
+def geocode(text):
+    return LYON if text.lower().startswith("lyon") else None
+
+
+def fetch(query):
+    return run_query(ELEMENTS, query)[0]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    build_snapshot(path, [AREA], ["Lyon"], geocode=geocode, fetch=fetch)
+    return path
+
+
+def test_build_then_load_matches_overpass(snapshot_path):
+    snap = Snapshot(snapshot_path)
+    assert len(snap) > 0 and snap.geocode("lyon") == LYON
+    rng = random.Random(3)
+    mismatches = 0
+    for _ in range(300):
+        lat, lon = 45.72 + rng.random() * 0.08, 4.80 + rng.random() * 0.12
+        radius, limit = rng.choice([300, 800, 1500, 3000]), rng.choice([1, 3, 5, 10])
+        assert snap.covers(lat, lon, radius)
+        direct = loc._rank_elements(fetch(loc.plan_overpass_query(lat, lon, radius)), lat, lon, limit)
+        mismatches += snap.nearest(lat, lon, radius, limit) != direct
+    assert mismatches == 0
+
+
+def test_open_at_matches_overpass(snapshot_path):
+    snap = Snapshot(snapshot_path)
+    open_at = datetime(2024, 3, 10, 11, 0)  # Sunday morning
+    for lat, lon in [(45.7640, 4.8357), (45.7485, 4.8467), (45.7797, 4.8522)]:
+        direct = loc._rank_elements(fetch(loc.plan_overpass_query(lat, lon, 3000)), lat, lon, 5, open_at=open_at)
+        assert snap.nearest(lat, lon, 3000, 5, open_at=open_at) == direct
+
+
+@pytest.mark.parametrize("damage", ["truncate_header", "truncate_arrays", "truncate_prefix", "bad_magic", "garbage"])
+def test_corrupt_or_truncated_file_is_rejected(snapshot_path, damage):
+    raw = snapshot_path.read_bytes()
+    if damage == "truncate_header":
+        raw = raw[:-20]
+    elif damage == "truncate_arrays":
+        raw = raw[:len(raw) // 2]
+    elif damage == "truncate_prefix":
+        raw = raw[:10]
+    elif damage == "bad_magic":
+        raw = b"NOTASNAP" + raw[8:]
+    else:
+        raw = b"\xff" * 4096
+    snapshot_path.write_bytes(raw)
+    with pytest.raises(ValueError):
+        Snapshot(snapshot_path)
+
+
+def manager(path):
+    return SnapshotManager(path, [], [], check_s=3600)
+
+
+def test_reload_swaps_the_snapshot(snapshot_path, tmp_path):
+    mgr = manager(snapshot_path)
+    old = mgr._snapshot
+    assert old is not None and mgr.stats()["loads"] == 1
+    assert mgr.reload_if_changed() is False
+
+    # Another worker writes a smaller snapshot over it
+    other = tmp_path / "other.bin"
+    build_snapshot(other, ["45.75,4.82,45.77,4.85"], [], geocode=geocode, fetch=fetch)
+    other.replace(snapshot_path)
+    assert mgr.reload_if_changed() is True
+    new = mgr._snapshot
+    assert new is not old and len(new) < len(old)
+    # A request still holding the old snapshot keeps working on it
+    assert old.nearest(45.7640, 4.8357, 1000, 3)
+    assert mgr.stats()["loads"] == 2
+
+
+def test_corrupt_replacement_keeps_the_current_snapshot(snapshot_path):
+    mgr = manager(snapshot_path)
+    current = mgr._snapshot
+    snapshot_path.write_bytes(snapshot_path.read_bytes()[:-50])
+    assert mgr.reload_if_changed() is False
+    assert mgr._snapshot is current
+    assert mgr.stats()["load_errors"] == 1
+    assert mgr.reload_if_changed() is False  # the same broken file is not retried
+    assert mgr.stats()["load_errors"] == 1
+
+
+def test_failed_fetch_never_replaces_a_snapshot(snapshot_path):
+    before = snapshot_path.read_bytes()
+
+    def failing(query):
+        raise ConnectionError("overpass down")
+
+    with pytest.raises(ConnectionError):
+        build_snapshot(snapshot_path, [AREA], [], geocode=geocode, fetch=failing)
+    assert snapshot_path.read_bytes() == before
+
+
+def test_build_uses_the_configured_snapshot_timeout(tmp_path, monkeypatch):
+    posts = []
+
+    class Reply:
+        status_code = 200
+        content = b'{"elements": []}'
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"elements": []}
+
+    def post(url, data=None, timeout=None):
+        posts.append((data, timeout))
+        return Reply()
+
+    monkeypatch.setattr(loc.overpass_session, "post", post)
+    monkeypatch.setattr(loc, "WARMUP_AREAS", [AREA])
+    monkeypatch.setattr(loc, "WARMUP_PLACES", [])
+    monkeypatch.setattr(loc, "SNAPSHOT_TIMEOUT_S", 600.0)
+    monkeypatch.setattr(loc, "OVERPASS_TIMEOUT_S", 12.0)
+    loc._build_snapshot(tmp_path / "snap.bin")
+    query, timeout = posts[-1]
+    assert "[timeout:600]" in query and timeout > 600
+    # Ordinary searches keep the per-request Overpass timeout
+    loc._fetch_overpass(loc.plan_overpass_query(45.76, 4.83, 1000))
+    assert posts[-1][1] == 12.0
@@ -0,0 +1,152 @@
+from datetime import datetime
+
+import pytest
+
+import locator_service as loc
+from opening_hours import compile_opening_hours, is_open, open_mask
+
+# 2024-03-04 is a Monday
+MON, TUE, WED, THU, FRI, SAT, SUN = 4, 5, 6, 7, 8, 9, 10
+
+
+def at(day, hour, minute=0):
+    return datetime(2024, 3, day, hour, minute)
+
+
+@pytest.mark.parametrize("when, expected", [
+    (at(FRI, 21, 59), False),
+    (at(FRI, 22, 0), True),
+    (at(FRI, 23, 30), True),
+    (at(SAT, 1, 59), True),  # Friday's span runs into Saturday
+    (at(SAT, 2, 0), False),
+    (at(SAT, 23, 0), False),
+    (at(THU, 23, 0), False),
+])
+def test_span_past_midnight(when, expected):
+    assert is_open("Fr 22:00-02:00", when) is expected
+
+
+def test_sunday_night_wraps_into_monday():
+    assert is_open("Su 22:00-03:00", at(MON, 2, 30)) is True
+    assert is_open("Su 22:00-03:00", at(MON, 3, 0)) is False
+
+
+def test_semicolon_rule_overrides_its_days():
+    hours = "Mo-Fr 09:00-18:00; We 10:00-12:00"
+    assert is_open(hours, at(WED, 9, 30)) is False
+    assert is_open(hours, at(WED, 11, 0)) is True
+    assert is_open(hours, at(WED, 13, 0)) is False
+    assert is_open(hours, at(TUE, 9, 30)) is True
+
+
+def test_comma_rule_adds_to_its_days():
+    hours = "Mo-Fr 09:00-12:00, We 14:00-16:00"
+    assert is_open(hours, at(WED, 10, 0)) is True
+    assert is_open(hours, at(WED, 15, 0)) is True
+    assert is_open(hours, at(TUE, 15, 0)) is False
+
+
+def test_off_closes_its_days():
+    hours = "Mo-Su 08:00-20:00; Su off"
+    assert is_open(hours, at(SUN, 12, 0)) is False
+    assert is_open(hours, at(SAT, 12, 0)) is True
+    assert is_open("Mo-Sa 09:00-19:00; Sa closed", at(SAT, 12, 0)) is False
+
+
+def test_24_7():
+    assert compile_opening_hours("24/7").always_open
+    assert all(is_open("24/7", at(day, hour)) for day in (MON, WED, SUN) for hour in (0, 12, 23))
+    assert is_open("Mo-Fr 24/7; Sa-Su off", at(TUE, 3, 0)) is True
+    assert is_open("Mo-Fr 24/7; Sa-Su off", at(SAT, 3, 0)) is False
+
+
+def test_public_holiday_rules_are_skipped():
+    assert is_open("Mo-Fr 09:00-18:00; PH off", at(MON, 10, 0)) is True
+    assert is_open("Mo-Fr,PH 09:00-18:00", at(TUE, 10, 0)) is True
+    assert is_open("Mo-Fr,PH 09:00-18:00", at(SAT, 10, 0)) is False
+    # Holidays alone say nothing about a normal week
+    assert compile_opening_hours("PH 10:00-12:00") is None
+
+
+@pytest.mark.parametrize("value", [
+    None, "", "garbage", "Jan-Mar Mo 10:00-12:00", "sunrise-sunset", "Mo-Fr 09:00+",
+    "Mo-Fr 08:00-18:00 10:00-12:00 off", "Mo[1] 09:00-12:00", "Mo-PH 09:00-12:00", "25:00-26:00",
+])
+def test_unparseable_values_are_unknown(value):
+    assert compile_opening_hours(value) is None
+    assert is_open(value, at(MON, 10, 0)) is None
+
+
+def test_unknown_values_follow_include_unknown():
+    values = ["24/7", "garbage", None, "Mo-Fr 09:00-18:00"]
+    assert open_mask(values, at(SUN, 12, 0)).tolist() == [True, False, False, False]
+    assert open_mask(values, at(SUN, 12, 0), include_unknown=True).tolist() == [True, True, True, False]
+
+
+# ---------- /locator ----------
+LAT, LON = 45.7640, 4.8357
+
+
+def pharmacy(osm_id, dlat, hours):
+    tags = {"amenity": "pharmacy", "name": f"P{osm_id}", "phone": f"+33 4 00 00 00 {osm_id:02d}"}
+    if hours is not None:
+        tags["opening_hours"] = hours
+    return {"type": "node", "id": osm_id, "lat": LAT + dlat, "lon": LON, "tags": tags}
+
+
+ELEMENTS = [
+    pharmacy(1, 0.001, "Mo-Fr 09:00-19:00"),  # nearest, closed evenings and weekends
+    pharmacy(2, 0.002, "unparseable; whatever"),  # unknown hours
+    pharmacy(3, 0.003, "Mo-Su 20:00-02:00"),  # night pharmacy
+    pharmacy(4, 0.004, "24/7"),
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(loc, "geocode_location", lambda text, use_snapshot=True: (LAT, LON, {}))
+    monkeypatch.setattr(loc, "_run_overpass_query", lambda query: ELEMENTS)
+    monkeypatch.setattr(loc, "tile_cache", None)
+    monkeypatch.setattr(loc, "pharmacy_index", None)
+    monkeypatch.setattr(loc.snapshots, "current", lambda: None)
+    monkeypatch.setattr(loc, "LOCATOR_TIMEZONE", "")
+    return loc.app.test_client()
+
+
+def names(client, **payload):
+    r = client.post("/locator", json=dict({"location": "Lyon", "limit": 1}, **payload))
+    assert r.status_code == 200
+    return [(p["name"], p.get("open")) for p in r.get_json()["results"]]
+
+
+def test_without_a_time_the_nearest_wins(client):
+    assert names(client) == [("P1", None)]
+
+
+def test_open_at_filters_before_the_top_k_cut(client):
+    # Saturday 23:00: the two nearest are closed or unknown, so the night pharmacy is the top-1
+    assert names(client, open_at="2024-03-09T23:00:00") == [("P3", True)]
+    assert names(client, open_at="2024-03-09T23:00:00", limit=2) == [("P3", True), ("P4", True)]
+    assert names(client, open_at="2024-03-09T12:00:00") == [("P4", True)]
+    assert names(client, open_at="2024-03-04T10:00:00") == [("P1", True)]
+
+
+def test_include_unknown_keeps_unparseable_hours(client):
+    assert names(client, open_at="2024-03-09T12:00:00", include_unknown=True) == [("P2", None)]
+
+
+def test_open_now(client, monkeypatch):
+    class Now(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2024, 3, 10, 1, 30, tzinfo=tz)
+
+    monkeypatch.setattr(loc, "datetime", Now)
+    assert names(client, open_now=True, timezone="Europe/Paris") == [("P3", True)]
+
+
+def test_bad_open_at_is_a_400(client):
+    r = client.post("/locator", json={"location": "Lyon", "open_at": "next tuesday"})
+    assert r.status_code == 400
+    r = client.post("/locator", json={"location": "Lyon", "open_now": True, "timezone": "Mars/Olympus"})
+    assert r.status_code == 400
@@ -0,0 +1,137 @@
+import json
+import random
+
+import pytest
+
+import locator_service as loc
+from fake_overpass_server import DEFAULT_FIXTURE, run_query
+from pharmacy_index import (CONTACT_KEYS, PHONE_KEYS, PharmacyIndex, format_address_from_tags, haversine_m,
+                            read_elements)
+
+with open(DEFAULT_FIXTURE, "r", encoding="utf-8") as f:
+    ELEMENTS = json.load(f)["elements"]
+
+REGION = (45.68, 4.74, 45.84, 4.96)
+
+
+def baseline_find(lat, lon, radius, limit):
+    """The locator before the index: contact-tagged pharmacies by distance, then the rest, one Overpass query each."""
+
+    def records(elements, seen):
+        out = []
+        for elem in elements:
+            oid = f"{elem.get('type')}/{elem.get('id')}"
+            if oid in seen:
+                continue
+            seen.add(oid)
+            pos = (elem.get("lat"), elem.get("lon")) if elem["type"] == "node" else \
+                ((elem.get("center") or {}).get("lat"), (elem.get("center") or {}).get("lon"))
+            if not pos[0] or not pos[1]:
+                continue
+            tags = elem.get("tags") or {}
+            addr = {k: v for k, v in tags.items() if k.startswith("addr:") or k in ("postal_code", "city", "village", "street")}
+            out.append({
+                "name": tags.get("name") or tags.get("shop") or "Pharmacy",
+                "lat": float(pos[0]), "lon": float(pos[1]),
+                "distance_m": round(haversine_m(lat, lon, float(pos[0]), float(pos[1])), 1),
+                "address_tags": addr,
+                "formatted_address": format_address_from_tags(tags) or addr,
+                "phone": next((tags[k] for k in PHONE_KEYS if tags.get(k)), None),
+                "email": tags.get("email") or tags.get("contact:email"),
+                "website": tags.get("website") or tags.get("contact:website"),
+                "opening_hours": tags.get("opening_hours"),
+                "osm_type": elem.get("type"), "osm_id": elem.get("id"),
+            })
+        return sorted(out, key=lambda r: r["distance_m"])
+
+    seen = set()
+    contact_query = "".join(f'{t}["amenity"="pharmacy"]["{k}"](around:{radius},{lat},{lon});'
+                            for k in CONTACT_KEYS for t in ("node", "way", "relation"))
+    with_contact = records(run_query(ELEMENTS, contact_query)[0], seen)
+    if len(with_contact) >= limit:
+        return with_contact[:limit]
+    rest = records(run_query(ELEMENTS, f'nwr["amenity"="pharmacy"](around:{radius},{lat},{lon});')[0], set(seen))
+    return (with_contact + rest)[:limit]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return PharmacyIndex.from_elements(ELEMENTS, region=REGION, cell_deg=0.01)
+
+
+def random_queries(n, seed=5):
+    rng = random.Random(seed)
+    return [(45.72 + rng.random() * 0.08, 4.80 + rng.random() * 0.12, rng.choice([300, 1000, 2500, 5000]),
+             rng.choice([1, 3, 5, 10, 30])) for _ in range(n)]
+
+
+def test_index_matches_the_baseline_locator(index):
+    mismatches = [q for q in random_queries(200) if index.nearest(*q) != baseline_find(*q)]
+    assert mismatches == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    path = tmp_path / "index.json"
+    index.save(path)
+    loaded = PharmacyIndex.load(path)
+    assert len(loaded) == len(index) and loaded.region == index.region
+    for q in random_queries(30, seed=9):
+        assert loaded.nearest(*q) == index.nearest(*q)
+
+
+def test_version_1_files_still_load(index, tmp_path):
+    path = tmp_path / "index-v1.json"
+    path.write_text(json.dumps({
+        "region": list(REGION), "cell_deg": 0.01, "contact": index.contact,
+        "records": [r.to_dict() for r in index.records],
+    }), encoding="utf-8")
+    loaded = PharmacyIndex.load(path)
+    for q in random_queries(20, seed=4):
+        assert loaded.nearest(*q) == index.nearest(*q)
+
+
+def test_ingest_skips_duplicates_and_other_amenities():
+    elements = [
+        {"type": "node", "id": 1, "lat": 45.76, "lon": 4.83, "tags": {"amenity": "pharmacy", "name": "A"}},
+        {"type": "node", "id": 1, "lat": 45.76, "lon": 4.83, "tags": {"amenity": "pharmacy", "name": "A"}},
+        {"type": "node", "id": 2, "lat": 45.77, "lon": 4.84, "tags": {"amenity": "hospital"}},
+        {"type": "way", "id": 3, "tags": {"amenity": "pharmacy"}},  # no centre
+        {"type": "way", "id": 4, "center": {"lat": 45.75, "lon": 4.85}, "tags": {"amenity": "pharmacy", "phone": "1"}},
+    ]
+    index = PharmacyIndex.from_elements(elements)
+    assert [r.oid for r in index.records] == ["node/1", "way/4"]
+    assert index.region == (45.75, 4.83, 45.76, 4.85)  # the data's extent without a bbox
+
+
+def test_reads_an_osm_xml_extract(tmp_path):
+    path = tmp_path / "extract.osm"
+    path.write_text("""<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="45.7600" lon="4.8300"><tag k="amenity" v="pharmacy"/><tag k="name" v="Node pharmacy"/></node>
+  <node id="2" lat="45.7700" lon="4.8400"/>
+  <node id="3" lat="45.7800" lon="4.8600"/>
+  <node id="4" lat="45.7000" lon="4.8000"><tag k="amenity" v="cafe"/></node>
+  <way id="10"><nd ref="2"/><nd ref="3"/><tag k="amenity" v="pharmacy"/><tag k="phone" v="+33"/></way>
+  <relation id="20"><tag k="amenity" v="pharmacy"/></relation>
+</osm>
+""", encoding="utf-8")
+    elements = list(read_elements(path))
+    assert [(e["type"], e["id"]) for e in elements] == [("node", 1), ("way", 10)]
+    assert elements[1]["center"] == pytest.approx({"lat": 45.775, "lon": 4.85})
+
+
+def test_locator_uses_the_index_only_inside_its_region(index, monkeypatch):
+    queries = []
+
+    def overpass(query):
+        queries.append(query)
+        return run_query(ELEMENTS, query)[0]
+
+    monkeypatch.setattr(loc, "pharmacy_index", index)
+    monkeypatch.setattr(loc, "tile_cache", None)
+    monkeypatch.setattr(loc, "_run_overpass_query", overpass)
+    assert loc.find_pharmacies_overpass(45.7640, 4.8357, 2000, 5) == baseline_find(45.7640, 4.8357, 2000, 5)
+    assert queries == []
+    # Circle crossing the region's edge: live Overpass
+    assert loc.find_pharmacies_overpass(45.8350, 4.8357, 2000, 5) == baseline_find(45.8350, 4.8357, 2000, 5)
+    assert len(queries) == 1
@@ -0,0 +1,84 @@
+import pytest
+
+from place_search import PlaceIndex, canonical_key, result_keys
+
+
+@pytest.mark.parametrize("spellings", [
+    ["Lahore", "lahore", " LAHORE "],
+    ["Lahore, Pakistan", "LAHORE (Pakistan)", " lahore ,  PAKISTAN ", "Lahore; Pakistan"],
+    ["Saint-Étienne, France", "saint etienne, FRANCE", "SAINT-ÉTIENNE (France)"],
+    ["Lyon", "Ｌｙｏｎ"],
+    ["Bellecour, Lyon", "Lyon, Bellecour", "lyon: bellecour"],
+])
+def test_spellings_of_one_place_share_a_key(spellings):
+    assert len({canonical_key(s) for s in spellings}) == 1
+
+
+@pytest.mark.parametrize("place, key", [
+    ("Lahore, Pakistan", "lahore|pk"),
+    ("Mexico City, Mexico", "mexico city|mx"),
+    ("Valencia, Venezuela", "valencia|ve"),
+    # A country name inside a place name, or a country on its own, is not a suffix
+    ("Île-de-France", "ile de france"),
+    ("New Mexico", "new mexico"),
+    ("Albuquerque, New Mexico", "albuquerque new mexico"),
+    ("Paris, Île-de-France", "ile de france paris"),
+    ("France", "france"),
+    ("lahore pakistan", "lahore pakistan"),  # no comma: one component (result_keys adds "lahore|pk")
+])
+def test_country_suffix_only_from_a_whole_final_part(place, key):
+    assert canonical_key(place) == key
+
+
+def test_country_words_in_place_names_keep_places_apart():
+    assert canonical_key("Île-de-France") != canonical_key("Île-de, France")
+    assert canonical_key("New Mexico") != canonical_key("New, Mexico")
+    assert canonical_key("New Mexico") != canonical_key("New")
+
+
+def test_component_order_not_word_order():
+    assert canonical_key("Rue de Paris, Lyon") != canonical_key("Rue de Lyon, Paris")
+
+
+def test_unqualified_lookup_also_stored_under_its_country():
+    assert result_keys("lahore", {"address": {"country_code": "PK"}}) == ["lahore", "lahore|pk"]
+    assert result_keys("lahore|pk", {"address": {"country_code": "pk"}}) == ["lahore|pk"]
+    assert result_keys("new mexico", {"country": "United States"}) == ["new mexico", "new mexico|us"]
+
+
+def test_trailing_country_words_also_stored_as_a_country_key():
+    # "lahore pakistan" keeps its own key (test above) and gains the alias "Lahore, Pakistan" looks up
+    assert result_keys("lahore pakistan", {"address": {"country_code": "pk"}}) == [
+        "lahore pakistan", "lahore pakistan|pk", "lahore|pk"]
+    assert canonical_key("Lahore, Pakistan") in result_keys(canonical_key("lahore pakistan"), {"countrycode": "PK"})
+    assert result_keys("dubai united arab emirates", {"country": "United Arab Emirates"})[-1] == "dubai|ae"
+    # Only the result's own country: "New Mexico" is in the US, not Mexico
+    assert result_keys("new mexico", {"address": {"country_code": "us"}}) == ["new mexico", "new mexico|us"]
+    assert result_keys("albuquerque new mexico", {"countrycode": "US"}) == [
+        "albuquerque new mexico", "albuquerque new mexico|us"]
+    # A country on its own is not a place plus a country
+    assert result_keys("pakistan", {"countrycode": "PK"}) == ["pakistan", "pakistan|pk"]
+
+
+def test_prefix_suggestions():
+    index = PlaceIndex()
+    for i, label in enumerate(["Pharmacie Bellecour, Lyon", "Bellevue, Genève", "Lyon Part-Dieu"]):
+        index.add(canonical_key(label), label, 45.0 + i, 4.8, {})
+    assert [s["label"] for s in index.suggest("bell lyo", 5)] == ["Pharmacie Bellecour, Lyon"]
+    assert {s["label"] for s in index.suggest("bel", 5)} == {"Pharmacie Bellecour, Lyon", "Bellevue, Genève"}
+
+
+def test_place_with_country_words_then_comma_form_is_one_upstream_call(monkeypatch):
+    import locator_service as loc
+
+    calls = []
+
+    def upstream(source, location, limited):
+        calls.append(location)
+        return source, (31.5, 74.3, {"address": {"country_code": "pk"}})
+
+    monkeypatch.setattr(loc, "_geocode_from", upstream)
+    monkeypatch.setattr(loc, "GEOCODE_HEDGE", False)
+    assert loc.geocode_location("Testabad Pakistan")[:2] == (31.5, 74.3)
+    assert loc.geocode_location("Testabad, Pakistan")[:2] == (31.5, 74.3)
+    assert calls == ["Testabad Pakistan"]
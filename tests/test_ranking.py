@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+import locator_service as loc
+from bench_locator_ranking import CENTER, synthetic_elements
+from opening_hours import open_mask
+from pharmacy_index import (Pharmacy, element_position, element_record, has_contact, haversine_m,
+                            nearest_contact_first, normalize_elements, rank_contact_first)
+
+
+def scalar_rank(elements, lat, lon, limit, radius_m=None, open_at=None):
+    """Baseline: a full record and haversine_m for every element, then rank_contact_first over all of them."""
+    candidates = []
+    for elem in elements:
+        record = element_record(elem)
+        if record is None:
+            continue
+        if open_at is not None and not open_mask([record["opening_hours"]], open_at)[0]:
+            continue
+        dist = haversine_m(lat, lon, record["lat"], record["lon"])
+        if radius_m is None or dist <= radius_m:
+            candidates.append((dist, has_contact(elem.get("tags") or {}), record))
+    return rank_contact_first(candidates, limit)
+
+
+def arrays(elements):
+    kept = [e for e in elements if element_position(e) is not None]
+    pos = [element_position(e) for e in kept]
+    return (np.array([p[0] for p in pos]), np.array([p[1] for p in pos]),
+            np.array([has_contact(e.get("tags") or {}) for e in kept]), [Pharmacy.from_element(e) for e in kept])
+
+
+def test_contact_first_then_distance():
+    ranked = rank_contact_first([
+        (50.0, False, {"name": "near, no contact", "lat": 0, "lon": 0, "osm_type": "node", "osm_id": 1}),
+        (900.0, True, {"name": "far, phone", "lat": 0, "lon": 0, "osm_type": "node", "osm_id": 2}),
+        (300.0, True, {"name": "mid, phone", "lat": 0, "lon": 0, "osm_type": "node", "osm_id": 3}),
+        (300.04, True, {"name": "same object again", "lat": 0, "lon": 0, "osm_type": "node", "osm_id": 3}),
+    ], 10)
+    assert [r["name"] for r in ranked] == ["mid, phone", "far, phone", "near, no contact"]
+    assert [r["distance_m"] for r in ranked] == [300.0, 900.0, 50.0]
+
+
+def test_ties_keep_input_order_and_limit_applies_after_dedupe():
+    rows = [(100.0, True, {"name": str(i), "lat": 0, "lon": 0, "osm_type": "node", "osm_id": i % 3}) for i in range(6)]
+    assert [r["name"] for r in rank_contact_first(rows, 3)] == ["0", "1", "2"]
+    assert rank_contact_first(rows, 0) == []
+
+
+@pytest.mark.parametrize("n", [10, 1000, 20000])
+@pytest.mark.parametrize("limit", [1, 5, 50])
+def test_vectorized_matches_the_scalar_ranking(n, limit):
+    elements = synthetic_elements(n, 20000, seed=n)
+    lat, lon = CENTER[0] + 0.01, CENTER[1] - 0.02
+    expected = scalar_rank(elements, lat, lon, limit)
+    assert loc._rank_elements(elements, lat, lon, limit) == expected
+    lats, lons, contact, records = arrays(elements)
+    assert nearest_contact_first(lat, lon, lats, lons, contact, records.__getitem__, limit) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_radius_cut_matches_the_scalar_ranking(seed):
+    elements = synthetic_elements(3000, 20000, seed=seed)
+    rng = random.Random(seed)
+    lat, lon = CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.05, 0.05)
+    radius = rng.choice([500, 2000, 8000])
+    record_at, lats, lons, contact = normalize_elements(elements)
+    got = nearest_contact_first(lat, lon, lats, lons, contact, record_at, 10, radius_m=radius)
+    assert got == scalar_rank(elements, lat, lon, 10, radius_m=radius)
+
+
+def test_open_mask_filters_before_the_cut():
+    from datetime import datetime
+    elements = synthetic_elements(2000, 5000, seed=3)
+    when = datetime(2024, 3, 10, 11, 0)  # Sunday: "Mo-Sa" pharmacies are closed
+    record_at, lats, lons, contact = normalize_elements(elements)
+    mask = open_mask((record_at(i).opening_hours for i in range(len(lats))), when)
+    got = nearest_contact_first(CENTER[0], CENTER[1], lats, lons, contact, record_at, 5, mask=mask)
+    assert got == scalar_rank(elements, CENTER[0], CENTER[1], 5, open_at=when)
+
+
+def test_duplicates_and_identical_positions():
+    # Overpass can return one object twice, and pharmacies in one building share coordinates
+    base = synthetic_elements(200, 3000, seed=1)
+    twins = [dict(e, id=10_000 + e["id"]) for e in base[:50]]
+    elements = base + base[:80] + twins
+    random.Random(2).shuffle(elements)
+    for limit in (1, 5, 60, 500):
+        assert loc._rank_elements(elements, *CENTER, limit) == scalar_rank(elements, *CENTER, limit)
+
+
+def test_limit_beyond_the_candidates_and_empty_input():
+    elements = synthetic_elements(7, 1000, seed=4)
+    assert len(loc._rank_elements(elements, *CENTER, 50)) == 7
+    assert loc._rank_elements(elements, *CENTER, 50) == scalar_rank(elements, *CENTER, 50)
+    assert loc._rank_elements([], *CENTER, 5) == []
+    assert loc._rank_elements(elements, *CENTER, 0) == []
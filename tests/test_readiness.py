@@ -0,0 +1,88 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+class FlakyGenai:
+    """Stands in for google.generativeai: get_genai() fails `failures` times, then returns this client."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.pings = 0
+
+    def get_genai(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("connection refused")
+        return SimpleNamespace(get_model=self.ping)
+
+    def ping(self, name):
+        self.pings += 1
+
+
+@pytest.fixture
+def warmup(agent, monkeypatch):
+    """WARMUP on, fast backoff, and no warm-up thread started yet (the WSGI case)."""
+    monkeypatch.setattr(agent, "WARMUP", True)
+    monkeypatch.setattr(agent, "WARMUP_RETRY_S", 0.01)
+    monkeypatch.setattr(agent, "WARMUP_RETRY_MAX_S", 0.04)
+    monkeypatch.setattr(agent, "readiness", {"client": False, "warmed_up": False, "warm_up_attempts": 0, "error": None})
+    monkeypatch.setattr(agent, "_warm_up_thread", None)
+    return agent
+
+
+def wait_ready(client, timeout_s=2.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        r = client.get("/readyz")
+        if r.status_code == 200:
+            return r
+        time.sleep(0.01)
+    return r
+
+
+def test_first_probe_starts_the_warm_up_under_wsgi(warmup, monkeypatch):
+    genai = FlakyGenai(failures=0)
+    monkeypatch.setattr(warmup, "get_genai", genai.get_genai)
+    client = warmup.app.test_client()
+    r = wait_ready(client)
+    assert r.status_code == 200 and r.get_json()["ready"] is True
+    assert genai.pings == 1 and warmup.readiness["warm_up_attempts"] == 1
+
+
+def test_failed_warm_up_is_retried_until_it_succeeds(warmup, monkeypatch):
+    genai = FlakyGenai(failures=3)
+    monkeypatch.setattr(warmup, "get_genai", genai.get_genai)
+    client = warmup.app.test_client()
+    first = client.get("/readyz")
+    assert first.status_code == 503 and first.get_json()["ready"] is False
+    r = wait_ready(client)
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["warm_up_attempts"] == 4 and body["error"] is None
+    assert genai.pings == 1
+
+
+def test_probes_share_one_warm_up_thread(warmup, monkeypatch):
+    genai = FlakyGenai(failures=10 ** 6)
+    monkeypatch.setattr(warmup, "get_genai", genai.get_genai)
+    thread = warmup.start_warm_up()
+    for _ in range(5):
+        assert warmup.readiness_status()[0] is False
+        assert warmup.start_warm_up() is thread
+    # Backoff keeps a broken client from being hammered
+    time.sleep(0.2)
+    assert warmup.readiness["warm_up_attempts"] < 12
+    genai.failures = 0
+    assert wait_ready(warmup.app.test_client()).status_code == 200
+    thread.join(1)
+    assert not thread.is_alive()
+
+
+def test_without_warmup_ready_means_the_client_is_configured(agent, monkeypatch):
+    monkeypatch.setattr(agent, "WARMUP", False)
+    monkeypatch.setattr(agent, "get_genai", FlakyGenai(failures=1).get_genai)
+    client = agent.app.test_client()
+    assert client.get("/readyz").status_code == 503
+    assert client.get("/readyz").status_code == 200
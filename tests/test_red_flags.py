@@ -0,0 +1,34 @@
+import pytest
+
+from red_flags import BUILTIN_RED_FLAGS, DEFAULT_LEXICON_PATH, RedFlagMatcher, load_lexicon
+
+
+def test_configured_path_must_exist(tmp_path, monkeypatch):
+    missing = tmp_path / "red_flag.txt"
+    monkeypatch.setenv("RED_FLAGS_PATH", str(missing))
+    with pytest.raises(FileNotFoundError):
+        load_lexicon()
+    monkeypatch.delenv("RED_FLAGS_PATH")
+    with pytest.raises(FileNotFoundError):
+        load_lexicon(missing)
+
+
+def test_missing_default_falls_back_to_builtin(tmp_path, monkeypatch):
+    monkeypatch.delenv("RED_FLAGS_PATH", raising=False)
+    monkeypatch.setattr("red_flags.DEFAULT_LEXICON_PATH", tmp_path / "absent.txt")
+    assert load_lexicon() == [(f, f) for f in BUILTIN_RED_FLAGS]
+
+
+def test_curly_apostrophes_match():
+    matcher = RedFlagMatcher(load_lexicon(DEFAULT_LEXICON_PATH))
+    text = "My dad can’t breathe and won’t wake up"
+    found = matcher.find_all(text)
+    assert [m["flag"] for m in found] == ["difficulty breathing", "unable to wake"]
+    assert text[found[0]["start"]:found[0]["end"]] == "can’t breathe"
+
+
+def test_curly_apostrophes_in_lexicon(tmp_path):
+    path = tmp_path / "lexicon.txt"
+    path.write_text("can’t swallow | airway obstruction\n", encoding="utf-8")
+    matcher = RedFlagMatcher(load_lexicon(path))
+    assert [m["flag"] for m in matcher.find_all("I can't swallow")] == ["airway obstruction"]
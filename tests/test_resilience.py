@@ -0,0 +1,176 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, LatencyTracker, hedged_call
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def guarded(breaker, fn):
+    """The call pattern triageAgent.guarded_generate uses around the breaker."""
+    if not breaker.allow():
+        raise resilience.CircuitOpenError(breaker.name)
+    try:
+        result = fn()
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def failing():
+    raise ConnectionError("upstream down")
+
+
+def test_breaker_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker("m", failure_threshold=3, reset_timeout_s=30)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            guarded(breaker, failing)
+    assert breaker.state == "closed"
+    with pytest.raises(ConnectionError):
+        guarded(breaker, failing)
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("m", failure_threshold=3)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            guarded(breaker, failing)
+    guarded(breaker, lambda: "ok")
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            guarded(breaker, failing)
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_rejects_without_calling(clock):
+    breaker = CircuitBreaker("m", failure_threshold=1, reset_timeout_s=30)
+    with pytest.raises(ConnectionError):
+        guarded(breaker, failing)
+    calls = []
+    clock.now += 29
+    for _ in range(5):
+        with pytest.raises(resilience.CircuitOpenError):
+            guarded(breaker, lambda: calls.append(1))
+    assert calls == []
+    assert breaker.stats()["rejected"] == 5
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("m", failure_threshold=1, reset_timeout_s=30)
+    with pytest.raises(ConnectionError):
+        guarded(breaker, failing)
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # a second caller while the probe is out
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("m", failure_threshold=2, reset_timeout_s=30)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            guarded(breaker, failing)
+    clock.now += 30
+    with pytest.raises(ConnectionError):
+        guarded(breaker, failing)  # the probe
+    assert breaker.state == "open"
+    clock.now += 10
+    with pytest.raises(resilience.CircuitOpenError):
+        guarded(breaker, lambda: "ok")
+    clock.now += 20
+    assert guarded(breaker, lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_latency_tracker_p95():
+    tracker = LatencyTracker(window=100, min_samples=20)
+    for i in range(19):
+        tracker.observe(0.01)
+    assert tracker.quantile(0.95) is None
+    for i in range(81):
+        tracker.observe(0.01 if i < 76 else 0.2)
+    assert tracker.quantile(0.95) == pytest.approx(0.2)
+
+
+def test_hedge_fires_after_p95_delay():
+    tracker = LatencyTracker(window=100, min_samples=20)
+    for i in range(100):
+        tracker.observe(0.05 + i * 0.001)
+    delay = tracker.quantile(0.95)
+    started = []
+    lock = threading.Lock()
+
+    def upstream():
+        with lock:
+            started.append(time.monotonic())
+            first = len(started) == 1
+        if first:
+            time.sleep(1.0)  # the slow tail
+            return "slow"
+        return "fast"
+
+    stats = {}
+    with ThreadPoolExecutor(4) as pool:
+        t0 = time.monotonic()
+        assert hedged_call(pool, upstream, timeout_s=5, hedge_delay_s=delay, stats=stats) == "fast"
+        elapsed = time.monotonic() - t0
+    assert len(started) == 2
+    assert delay <= started[1] - t0 < delay + 0.3
+    assert elapsed < 0.8
+    assert stats == {"hedges": 1, "hedge_wins": 1}
+
+
+def test_no_hedge_when_the_call_is_fast():
+    stats = {}
+    with ThreadPoolExecutor(2) as pool:
+        assert hedged_call(pool, lambda: "ok", timeout_s=5, hedge_delay_s=0.5, stats=stats) == "ok"
+    assert stats == {}
+
+
+def test_hedge_fires_at_once_when_the_first_attempt_fails():
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return "ok"
+
+    stats = {}
+    with ThreadPoolExecutor(2) as pool:
+        t0 = time.monotonic()
+        assert hedged_call(pool, flaky, timeout_s=5, hedge_delay_s=2.0, stats=stats) == "ok"
+    assert attempts[1] - t0 < 0.5
+    assert stats == {"hedges": 1, "hedge_wins": 1}
+
+
+def test_timeout_without_hedge():
+    with ThreadPoolExecutor(1) as pool:
+        with pytest.raises(TimeoutError):
+            hedged_call(pool, time.sleep, (0.5,), timeout_s=0.1)
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from triage_cache import SingleFlight
+
+
+def test_waiters_share_the_leaders_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow(x):
+        calls.append(x)
+        release.wait(5)
+        return x * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow, 21))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == [42] * 8 and calls == [21]
+    assert flight.stats()["inflight"] == 0
+
+
+def test_waiter_runs_the_call_itself_when_the_leader_is_lost():
+    flight = SingleFlight(wait_s=0.1)
+    flight.begin("k")  # a leader that never runs or abandons its call
+    start = time.monotonic()
+    assert flight.do("k", lambda: "own") == "own"
+    assert time.monotonic() - start < 1
+    assert flight.stats()["wait_timeouts"] == 1
+    # The lost call no longer catches new callers
+    assert flight.do("k", lambda: "next") == "next"
+    assert flight.stats()["wait_timeouts"] == 1
+
+
+def test_abandon_only_fails_calls_that_have_not_started():
+    flight = SingleFlight()
+    fut, leader = flight.begin("k")
+    assert leader and flight.abandon("k", fut, RuntimeError("gone"))
+    with pytest.raises(RuntimeError):
+        fut.result(timeout=1)
+    # A worker that picks the abandoned call up later does not call the model
+    with pytest.raises(RuntimeError):
+        flight.run("k", fut, pytest.fail, "should not run")
+
+    fut, _ = flight.begin("k")
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    t = threading.Thread(target=flight.run, args=("k", fut, slow))
+    t.start()
+    started.wait(5)
+    assert not flight.abandon("k", fut, RuntimeError("too late"))
+    release.set()
+    t.join()
+    assert fut.result(timeout=1) == "done"
+
+
+def test_cancelled_asgi_leader_does_not_block_later_requests(monkeypatch):
+    import triageAgent as agent
+    import triage_asgi
+
+    release = threading.Event()
+
+    def model(text):
+        release.wait(5)
+        return {"urgency": "LOW", "text": text}
+
+    monkeypatch.setattr(agent, "single_flight", SingleFlight(wait_s=5))
+    monkeypatch.setattr(agent, "_model_triage_uncoalesced", model)
+    monkeypatch.setattr(agent, "red_flag_triage", lambda text: None)
+    monkeypatch.setattr(agent, "cached_triage", lambda text: None)
+    monkeypatch.setattr(agent, "local_triage", lambda text: None)
+    monkeypatch.setattr(triage_asgi, "gate", triage_asgi.ModelGate(1, 10, 5.0))
+
+    async def scenario():
+        busy = asyncio.ensure_future(triage_asgi.triage_text_async("holds the only model slot"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(triage_asgi.triage_text_async("client goes away"))
+        await asyncio.sleep(0.05)
+        queued.cancel()  # the client disconnected while waiting for a slot
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        release.set()
+        return await busy
+
+    assert asyncio.run(scenario())["urgency"] == "LOW"
+    assert agent.single_flight.stats()["inflight"] == 0
+    start = time.monotonic()
+    assert agent.single_flight.do(agent.cache_key("client goes away"), lambda: "fresh") == "fresh"
+    assert time.monotonic() - start < 1
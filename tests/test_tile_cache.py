@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import locator_service as loc
+from fake_overpass_server import DEFAULT_FIXTURE, run_query
+from rate_limit import RateLimited
+from tile_cache import TileCache
+
+with open(DEFAULT_FIXTURE, "r", encoding="utf-8") as f:
+    ELEMENTS = json.load(f)["elements"]
+
+QUERIES = [  # (lat, lon, radius_m, limit) around the fixture's area
+    (45.7640, 4.8357, 1000, 5), (45.7640, 4.8357, 5000, 5), (45.7578, 4.8320, 2000, 10),
+    (45.7797, 4.8522, 3000, 5), (45.7485, 4.8467, 800, 3), (45.6970, 4.8870, 5000, 5),
+    (45.8050, 4.7700, 10000, 20), (45.7640, 4.8357, 300, 5),
+]
+
+
+class Overpass:
+    """Fixture-backed fetch; `fail` makes every call raise it."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = None
+
+    def __call__(self, query):
+        self.calls += 1
+        if self.fail is not None:
+            raise self.fail
+        return run_query(ELEMENTS, query)[0]
+
+
+def direct(lat, lon, radius, limit):
+    return loc._rank_elements(run_query(ELEMENTS, loc.plan_overpass_query(lat, lon, radius))[0], lat, lon, limit)
+
+
+@pytest.fixture
+def overpass(monkeypatch):
+    fetch = Overpass()
+    monkeypatch.setattr(loc, "tile_cache", TileCache(fetch))
+    monkeypatch.setattr(loc, "pharmacy_index", None)
+    monkeypatch.setattr(loc, "_run_overpass_query", lambda query: run_query(ELEMENTS, query)[0])
+    return fetch
+
+
+@pytest.mark.parametrize("lat, lon, radius, limit", QUERIES)
+def test_tiles_match_the_direct_query(overpass, lat, lon, radius, limit):
+    assert loc.find_pharmacies_overpass(lat, lon, radius, limit) == direct(lat, lon, radius, limit)
+
+
+def test_tiles_match_the_direct_query_when_warm(overpass):
+    for q in QUERIES:
+        loc.find_pharmacies_overpass(*q)
+    calls = overpass.calls
+    for q in QUERIES:
+        assert loc.find_pharmacies_overpass(*q) == direct(*q)
+    assert overpass.calls == calls
+
+
+def test_partial_tile_failure_is_not_a_partial_answer():
+    fetch = Overpass()
+    cache = TileCache(fetch)
+    assert cache.candidates(45.7640, 4.8357, 1000) is not None
+    fetch.fail = ConnectionError("overpass down")
+    # Overlaps the cached tiles but needs more of them
+    assert cache.candidates(45.7640, 4.8357, 5000) is None
+    stats = cache.stats()
+    assert stats["fetch_errors"] == 1 and stats["circles"] == 1
+    # Once Overpass is back the circle is answered and cached in full
+    fetch.fail = None
+    records = cache.candidates(45.7640, 4.8357, 5000)[0]
+    inside = run_query(ELEMENTS, loc.plan_overpass_query(45.7640, 4.8357, 5000))[0]
+    assert {(e["type"], e["id"]) for e in inside} <= {(r.osm_type, r.osm_id) for r in records}
+    assert cache.stats()["circles"] == 2
+
+
+def test_failed_tile_fetch_falls_back_to_direct_overpass(overpass):
+    lat, lon, radius, limit = 45.7640, 4.8357, 5000, 5
+    loc.find_pharmacies_overpass(lat, lon, 1000, limit)  # some of the tiles are cached
+    overpass.fail = ConnectionError("overpass down")
+    assert loc.find_pharmacies_overpass(lat, lon, radius, limit) == direct(lat, lon, radius, limit)
+
+
+def test_failed_tile_fetch_in_a_group_falls_back_too(overpass):
+    points = [(45.7640, 4.8357), (45.7650, 4.8370)]
+    expected = [direct(la, lo, 1000, 5) for la, lo in points]
+    overpass.fail = ConnectionError("overpass down")
+    assert loc.find_pharmacies_group(points, radius=1000, limit=5) == expected
+
+
+def test_rate_limited_tile_fetch_is_raised(overpass):
+    overpass.fail = RateLimited("overpass", "queue full", 2.0)
+    with pytest.raises(RateLimited):
+        loc.find_pharmacies_overpass(45.7640, 4.8357, 1000, 5)
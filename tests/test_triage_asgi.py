@@ -0,0 +1,131 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import triage_asgi
+
+ANSWER = {"urgency": "LOW", "possible_conditions": ["Common cold"], "recommended_actions": ["pharmacy", "rest"],
+          "explanation": "Rest, fluids — and see a doctor if it lasts."}
+
+
+async def call(method, path, payload=None):
+    """One request through the ASGI app: (status, headers, body)."""
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await triage_asgi.app({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+@pytest.fixture
+def model(agent, monkeypatch):
+    """A stub Gemini that answers ANSWER after `delay_s`, or waits for `release` when it is set."""
+    state = {"delay_s": 0.0, "release": None, "calls": 0}
+
+    def generate(symptoms):
+        state["calls"] += 1
+        if state["release"] is not None:
+            state["release"].wait(5)
+        time.sleep(state["delay_s"])
+        return json.dumps(ANSWER)
+
+    monkeypatch.setattr(agent, "call_gemini_generate", generate)
+    return state
+
+
+def use_gate(monkeypatch, max_concurrency=4, max_queue=16, budget_s=5.0):
+    gate = triage_asgi.ModelGate(max_concurrency, max_queue, budget_s)
+    monkeypatch.setattr(triage_asgi, "gate", gate)
+    return gate
+
+
+@pytest.mark.parametrize("payload", [
+    {"text": "sore throat and a runny nose"},
+    {"text": "   "},
+    {"nothing": 1},
+])
+def test_same_bytes_as_flask(agent, model, monkeypatch, payload):
+    use_gate(monkeypatch)
+    flask = agent.app.test_client().post("/triage", json=payload)
+    agent.triage_cache._mem.clear()
+    status, headers, body = asyncio.run(call("POST", "/triage", payload))
+    assert status == flask.status_code
+    assert body == flask.data
+    assert headers[b"content-type"] == b"application/json"
+
+
+def test_sheds_with_retry_after_when_the_queue_is_full(agent, model, monkeypatch):
+    use_gate(monkeypatch, max_concurrency=1, max_queue=1)
+    model["release"] = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(call("POST", "/triage", {"text": "first patient"}))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(call("POST", "/triage", {"text": "second patient"}))
+        await asyncio.sleep(0.05)
+        shed = await call("POST", "/triage", {"text": "third patient"})
+        model["release"].set()
+        return shed, await running, await queued
+
+    shed, running, queued = asyncio.run(scenario())
+    assert shed[0] == 503 and shed[1][b"retry-after"] == b"1"
+    assert running[0] == queued[0] == 200
+    assert triage_asgi.gate.stats["shed"] == 1
+
+
+def test_latency_budget_falls_back_to_moderate(agent, model, monkeypatch):
+    use_gate(monkeypatch, budget_s=0.1)
+    model["delay_s"] = 0.5
+    start = time.monotonic()
+    status, _, body = asyncio.run(call("POST", "/triage", {"text": "slow answer please"}))
+    assert time.monotonic() - start < 0.4
+    assert status == 200 and json.loads(body) == agent.UNAVAILABLE_RESPONSE
+    assert json.loads(body)["urgency"] == "MODERATE"
+    assert triage_asgi.gate.stats["budget_exceeded"] == 1
+
+
+def test_queued_leader_timeout_abandons_its_flight(agent, model, monkeypatch):
+    use_gate(monkeypatch, max_concurrency=1, budget_s=0.2)
+    model["release"] = threading.Event()
+
+    async def scenario():
+        busy = asyncio.ensure_future(triage_asgi.triage_text_async("holds the model slot"))
+        await asyncio.sleep(0.05)
+        # Leader for its text, but no slot frees up within the budget
+        result = await triage_asgi.triage_text_async("never gets a slot")
+        model["release"].set()
+        await busy  # over budget as well, once the slot was held that long
+        return result
+
+    result = asyncio.run(scenario())
+    assert result == agent.UNAVAILABLE_RESPONSE
+    key = agent.cache_key("never gets a slot")
+    assert key not in agent.single_flight._calls
+    # The next request with that text leads a new call instead of waiting on the dead one
+    model["release"] = None
+    start = time.monotonic()
+    assert agent.model_triage("never gets a slot") == ANSWER
+    assert time.monotonic() - start < 1
+
+
+def test_red_flags_skip_the_model(agent, model, monkeypatch):
+    use_gate(monkeypatch)
+    status, _, body = asyncio.run(call("POST", "/triage", {"text": "he has chest pain"}))
+    assert status == 200 and json.loads(body)["urgency"] == "EMERGENCY"
+    assert model["calls"] == 0
+
+
+def test_unknown_route(agent):
+    status, _, body = asyncio.run(call("GET", "/nope"))
+    assert status == 404 and json.loads(body) == {"error": "not found"}
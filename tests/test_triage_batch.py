@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+TEXTS = ["sore throat", "itchy eyes", "mild headache", "runny nose"]
+
+
+def answer(text):
+    """What the stub model says about one patient."""
+    return {"urgency": "LOW", "possible_conditions": [text.title()], "recommended_actions": ["self_care"],
+            "explanation": f"About {text}."}
+
+
+@pytest.fixture
+def model(agent, monkeypatch):
+    """Stub Gemini. `batch_reply(items)` builds the batch answer; single calls always answer correctly."""
+    state = {"batch_calls": [], "single_calls": [], "batch_reply": None}
+
+    def batch(items):
+        state["batch_calls"].append(list(items))
+        return state["batch_reply"](items)
+
+    def single(symptoms):
+        state["single_calls"].append(symptoms)
+        return json.dumps(answer(symptoms))
+
+    monkeypatch.setattr(agent, "call_gemini_generate_batch", batch)
+    monkeypatch.setattr(agent, "call_gemini_generate", single)
+    return state
+
+
+def objects(items):
+    return [dict(answer(text), id=i) for i, text in items]
+
+
+def post(agent, items):
+    r = agent.app.test_client().post("/triage/batch", json={"items": items})
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def test_one_call_answers_every_item(agent, model):
+    model["batch_reply"] = lambda items: json.dumps(objects(items))
+    out = agent.triage_batch(TEXTS)
+    assert out["results"] == [answer(t) for t in TEXTS]
+    assert out["model_calls"] == 1 and out["model_calls_saved"] == 3
+    assert model["single_calls"] == []
+
+
+def test_reordered_ids_are_matched_by_id(agent, model):
+    model["batch_reply"] = lambda items: json.dumps(objects(items)[::-1])
+    assert agent.triage_batch(TEXTS)["results"] == [answer(t) for t in TEXTS]
+    assert model["single_calls"] == []
+
+
+def test_missing_ids_are_retried_one_by_one(agent, model):
+    model["batch_reply"] = lambda items: json.dumps([o for o in objects(items) if o["id"] != 2])
+    out = agent.triage_batch(TEXTS)
+    assert out["results"] == [answer(t) for t in TEXTS]
+    assert model["single_calls"] == ["mild headache"]
+    assert out["model_calls"] == 2
+
+
+def test_duplicated_ids_keep_the_first_answer(agent, model):
+    def reply(items):
+        wrong = dict(answer("something else"), id=0, urgency="EMERGENCY")
+        return json.dumps(objects(items) + [wrong])
+
+    model["batch_reply"] = reply
+    out = agent.triage_batch(TEXTS)
+    assert out["results"][0] == answer("sore throat")
+    assert model["single_calls"] == []
+
+
+def test_unknown_and_malformed_ids_are_ignored(agent, model):
+    def reply(items):
+        good = [o for o in objects(items) if o["id"] != 1]
+        return json.dumps(good + [dict(answer("x"), id=99), dict(answer("y"), id="one"), "not an object"])
+
+    model["batch_reply"] = reply
+    out = agent.triage_batch(TEXTS)
+    assert out["results"] == [answer(t) for t in TEXTS]
+    assert model["single_calls"] == ["itchy eyes"]
+
+
+def test_partial_model_answer_is_not_trusted(agent, model):
+    # Cut off mid-array: every item goes through the single-item path, nothing from the fragment is cached
+    model["batch_reply"] = lambda items: json.dumps(objects(items))[:-40]
+    out = agent.triage_batch(TEXTS)
+    assert out["results"] == [answer(t) for t in TEXTS]
+    assert sorted(model["single_calls"]) == sorted(TEXTS)
+    assert out["model_calls"] == 1 + len(TEXTS)
+
+
+def test_failed_batch_call_falls_back_to_single_calls(agent, model):
+    def reply(items):
+        raise TimeoutError("gemini timed out")
+
+    model["batch_reply"] = reply
+    assert agent.triage_batch(TEXTS)["results"] == [answer(t) for t in TEXTS]
+    assert sorted(model["single_calls"]) == sorted(TEXTS)
+
+
+def test_duplicate_texts_share_one_model_item(agent, model):
+    model["batch_reply"] = lambda items: json.dumps(objects(items))
+    out = agent.triage_batch(["Sore throat", "sore throat!", "itchy eyes"])
+    assert [text for _, text in model["batch_calls"][0]] == ["Sore throat", "itchy eyes"]
+    assert out["results"][0] == out["results"][1] == answer("Sore throat")
+    assert out["results"][0] is not out["results"][1]
+
+
+def test_results_cached_under_the_single_request_key(agent, model):
+    model["batch_reply"] = lambda items: json.dumps(objects(items))
+    post(agent, [{"id": "a", "text": t} for t in TEXTS])
+    # Only the per-patient keys are stored: no batch-prompt entry, no echoed ids
+    assert sorted(agent.triage_cache._mem) == sorted(agent.cache_key(t) for t in TEXTS)
+    for text in TEXTS:
+        assert agent.triage_cache.get(agent.cache_key(text)) == answer(text)
+    # A later /triage with the same symptoms is a cache hit, not a model call
+    r = agent.app.test_client().post("/triage", json={"text": "Sore throat!"})
+    assert r.get_json() == answer("sore throat")
+    assert model["single_calls"] == [] and len(model["batch_calls"]) == 1
+
+
+def test_endpoint_echoes_ids_and_reports_empty_items(agent, model):
+    model["batch_reply"] = lambda items: json.dumps(objects(items))
+    out = post(agent, [{"id": 7, "text": "sore throat"}, "itchy eyes", {"id": 9, "text": "  "}])
+    assert out["count"] == 3
+    assert out["results"][0] == dict(answer("sore throat"), id=7)
+    assert out["results"][1] == answer("itchy eyes")
+    assert out["results"][2] == {"error": "no text provided", "id": 9}
+
+
+def test_red_flags_never_reach_the_model(agent, model):
+    model["batch_reply"] = lambda items: json.dumps(objects(items))
+    out = agent.triage_batch(["crushing chest pain", "runny nose"])
+    assert out["results"][0]["urgency"] == "EMERGENCY"
+    assert [text for _, text in model["batch_calls"][0]] == ["runny nose"]
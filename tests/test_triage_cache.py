@@ -0,0 +1,127 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import triage_cache
+from triage_cache import TriageCache, normalize_symptoms
+
+ANSWER = {"urgency": "LOW", "possible_conditions": ["Common cold"], "recommended_actions": ["pharmacy"],
+          "explanation": "Rest and fluids."}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(triage_cache, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Headache, fever!", "fever headache"),
+    ("  SORE   throat ", "sore throat"),
+    ("throat sore", "Sore-Throat"),
+    ("ｆｅｖｅｒ", "fever"),  # full-width forms
+])
+def test_normalization_folds_spellings(a, b):
+    assert normalize_symptoms(a) == normalize_symptoms(b)
+
+
+def test_normalization_keeps_different_symptoms_apart():
+    assert normalize_symptoms("chest pain") != normalize_symptoms("chest")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TriageCache(max_entries=3)
+    for key in "abc":
+        cache.put(key, ANSWER)
+    assert cache.get("a") is not None  # "b" is now the least recently used
+    cache.put("d", ANSWER)
+    cache.put("e", ANSWER)
+    assert cache.get("b") is None and cache.get("c") is None
+    assert all(cache.get(k) is not None for k in "ade")
+    stats = cache.stats()
+    assert stats["evictions"] == 2 and stats["size"] == 3
+
+
+def test_ttl_expiry(clock):
+    cache = TriageCache(ttl_s=60)
+    cache.put("k", ANSWER)
+    clock.now += 59
+    assert cache.get("k") == ANSWER
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_returned_values_are_copies():
+    cache = TriageCache()
+    cache.put("k", ANSWER)
+    cache.get("k")["urgency"] = "EMERGENCY"
+    assert cache.get("k")["urgency"] == "LOW"
+
+
+def test_disk_hit_after_restart(tmp_path):
+    path = tmp_path / "triage.sqlite3"
+    TriageCache(disk_path=path).put("k", ANSWER)
+    fresh = TriageCache(disk_path=path)
+    assert fresh.get("k") == ANSWER
+    assert fresh.get("k") == ANSWER
+    stats = fresh.stats()
+    assert stats["disk_hits"] == 1 and stats["hits"] == 1
+
+
+def test_expired_disk_rows_are_not_served(tmp_path, clock):
+    path = tmp_path / "triage.sqlite3"
+    TriageCache(ttl_s=60, disk_path=path).put("k", ANSWER)
+    clock.now += 61
+    assert TriageCache(ttl_s=60, disk_path=path).get("k") is None
+
+
+def test_disk_tier_is_bounded(tmp_path, clock):
+    path = tmp_path / "triage.sqlite3"
+    cache = TriageCache(max_entries=4, ttl_s=3600, disk_path=path, disk_max_entries=10, evict_every=5)
+    for i in range(50):
+        clock.now += 1
+        cache.put(f"k{i}", ANSWER)
+    rows = cache._db.execute("SELECT COUNT(*) FROM triage_cache").fetchone()[0]
+    assert rows <= 10 + cache.evict_every
+    assert cache.stats()["disk_evictions"] >= 50 - rows
+    # The newest rows are the ones kept
+    fresh = TriageCache(max_entries=4, ttl_s=3600, disk_path=path, disk_max_entries=10)
+    assert fresh.get("k49") == ANSWER and fresh.get("k0") is None
+
+
+def test_expired_rows_pruned_without_being_read(tmp_path, clock):
+    path = tmp_path / "triage.sqlite3"
+    cache = TriageCache(ttl_s=60, disk_path=path, evict_every=1000)
+    for i in range(20):
+        cache.put(f"old{i}", ANSWER)
+    clock.now += 120
+    assert TriageCache(ttl_s=60, disk_path=path).stats()["disk_evictions"] == 20
+
+
+def test_endpoint_hit_and_miss_stats(agent, monkeypatch):
+    calls = []
+
+    def model(symptoms):
+        calls.append(symptoms)
+        return json.dumps(ANSWER)
+
+    monkeypatch.setattr(agent, "call_gemini_generate", model)
+    client = agent.app.test_client()
+    first = client.post("/triage", json={"text": "Sore throat, runny nose"}).get_json()
+    second = client.post("/triage", json={"text": "runny nose sore throat!"}).get_json()
+    assert first == second == ANSWER
+    assert len(calls) == 1
+    stats = client.get("/triage/stats").get_json()["cache"]
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["stores"] == 1
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,276 @@
+# tile_cache.py
+# Geohash-tile cache of Overpass pharmacy results for locator_service.
+#
+# Each cached tile holds every pharmacy whose coordinates fall inside that
+# geohash cell. A search circle is answered by unioning the tiles that cover it
+# and filtering on true distance; only tiles that are missing (or expired) are
+# fetched, in one Overpass request. A child tile is also served from a cached
+# ancestor (geohash prefix). On top of that, recent complete answers are kept as
+# circles, so a smaller circle inside a cached larger one needs no tile work.
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pharmacy_index import Pharmacy, has_contact, haversine_m
+from rate_limit import RateLimited
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+M_PER_DEG_LAT = 111320.0
+
+
+# --- Geohash ---
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            ch = ch * 2 + (lon >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if lon >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = ch * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def tile_size(precision: int) -> Tuple[float, float]:
+    """(dlat, dlon) of a geohash cell at `precision`, in degrees."""
+    total = 5 * precision
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_bbox(gh: str) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a geohash cell."""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in gh:
+        v = _BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (v >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def circle_bbox(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    dlat = radius_m / M_PER_DEG_LAT
+    dlon = radius_m / (M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def covering_tiles(bbox: Tuple[float, float, float, float], precision: int) -> List[List[str]]:
+    """Geohash cells covering `bbox`, as rows (south to north) of cells (west to east)."""
+    s, w, n, e = bbox
+    dlat, dlon = tile_size(precision)
+    rows = []
+    lat = (math.floor((s + 90.0) / dlat) * dlat) - 90.0
+    while lat < n:
+        row = []
+        lon = (math.floor((w + 180.0) / dlon) * dlon) - 180.0
+        while lon < e:
+            row.append(geohash_encode(min(lat + dlat / 2, 89.999999), ((lon + dlon / 2 + 180.0) % 360.0) - 180.0, precision))
+            lon += dlon
+        rows.append(row)
+        lat += dlat
+    return rows
+
+
+def precision_for_radius(radius_m: float) -> int:
+    # Keeps a search at roughly 4-50 tiles: ~1.2km cells for small radii, ~39km for the largest
+    if radius_m <= 1500:
+        return 6
+    if radius_m <= 8000:
+        return 5
+    if radius_m <= 40000:
+        return 4
+    return 3
+
+
+# --- Cache ---
+class _Tile:
+    __slots__ = ("records", "lats", "lons", "contact", "nbytes", "fetched_at")
+
+    def __init__(self, records, contact, nbytes, fetched_at):
+        self.records = records
+        # Coordinates and contact flags as arrays, for vectorized ranking
+        self.lats = np.array([r.lat for r in records], dtype=np.float64)
+        self.lons = np.array([r.lon for r in records], dtype=np.float64)
+        self.contact = np.array(contact, dtype=bool)
+        self.nbytes = nbytes  # approximate Overpass payload for this tile
+        self.fetched_at = fetched_at
+
+
+def _union(tiles) -> Tuple[List[Pharmacy], np.ndarray, np.ndarray, np.ndarray]:
+    tiles = list(tiles)
+    if not tiles:
+        return [], np.empty(0), np.empty(0), np.empty(0, dtype=bool)
+    return ([r for t in tiles for r in t.records], np.concatenate([t.lats for t in tiles]),
+            np.concatenate([t.lons for t in tiles]), np.concatenate([t.contact for t in tiles]))
+
+
+class TileCache:
+    def __init__(self, fetch: Callable[[str], List[Dict]], ttl_s: float = 86400.0, max_tiles: int = 4096,
+                 max_circles: int = 256):
+        """`fetch(query)` runs an Overpass query and returns its elements, raising on failure."""
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self.max_tiles = max_tiles
+        self._tiles: "OrderedDict[str, _Tile]" = OrderedDict()
+        self._circles = deque(maxlen=max_circles)  # (lat, lon, radius_m, union, nbytes, created)
+        self._lock = threading.Lock()
+        self._stats = {
+            "queries": 0, "circle_hits": 0, "tile_hits": 0, "tile_misses": 0, "overpass_calls": 0,
+            "fetch_errors": 0, "rate_limited": 0, "evictions": 0, "bytes_fetched": 0, "bytes_saved": 0,
+        }
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl_s <= 0 or now - created < self.ttl_s
+
+    def _cached_tile(self, gh: str, now: float) -> Optional[Tuple[str, _Tile]]:
+        # The tile itself, or the nearest cached ancestor (a shorter geohash prefix)
+        for p in range(len(gh), 0, -1):
+            tile = self._tiles.get(gh[:p])
+            if tile is not None and self._fresh(tile.fetched_at, now):
+                self._tiles.move_to_end(gh[:p])
+                return gh[:p], tile
+        return None
+
+    def candidates(self, lat: float, lon: float, radius_m: float) -> Optional[Tuple[List[Pharmacy], np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        (records, lats, lons, contact) for every pharmacy in the tiles covering the
+        circle; a superset of the circle, so callers still filter on distance.
+        None when a missing tile could not be fetched: the cached tiles alone would
+        be a partial answer.
+        """
+        now = time.time()
+        with self._lock:
+            self._stats["queries"] += 1
+            for c_lat, c_lon, c_radius, union, nbytes, created in reversed(self._circles):
+                if self._fresh(created, now) and haversine_m(lat, lon, c_lat, c_lon) + radius_m <= c_radius:
+                    self._stats["circle_hits"] += 1
+                    self._stats["bytes_saved"] += nbytes
+                    return union
+
+            precision = precision_for_radius(radius_m)
+            rows = covering_tiles(circle_bbox(lat, lon, radius_m), precision)
+            used: Dict[str, _Tile] = {}
+            missing_rows = []
+            for row in rows:
+                missing = []
+                for gh in row:
+                    hit = self._cached_tile(gh, now)
+                    if hit is None:
+                        missing.append(gh)
+                    elif hit[0] not in used:
+                        used[hit[0]] = hit[1]
+                        self._stats["tile_hits"] += 1
+                        self._stats["bytes_saved"] += hit[1].nbytes
+                if missing:
+                    missing_rows.append(missing)
+                    self._stats["tile_misses"] += len(missing)
+
+        if missing_rows:
+            fetched = self._fetch_tiles(missing_rows, precision)
+            if fetched is None:
+                return None
+            used.update(fetched)
+
+        union = _union(used.values())
+        with self._lock:
+            self._circles.append((lat, lon, radius_m, union, sum(t.nbytes for t in used.values()), now))
+        return union
+
+    def _fetch_tiles(self, missing_rows: List[List[str]], precision: int) -> Optional[Dict[str, _Tile]]:
+        """Fetch all missing tiles in one Overpass call; None if it failed (nothing is cached then)."""
+        # Consecutive missing cells in a row share one bbox statement
+        boxes = []
+        for row in missing_rows:
+            run = [row[0]]
+            for gh in row[1:]:
+                prev = geohash_bbox(run[-1])
+                cur = geohash_bbox(gh)
+                if abs(prev[3] - cur[1]) < 1e-9:
+                    run.append(gh)
+                else:
+                    boxes.append(run)
+                    run = [gh]
+            boxes.append(run)
+        statements = []
+        for run in boxes:
+            s, w, n, _ = geohash_bbox(run[0])
+            e = geohash_bbox(run[-1])[3]
+            statements.append(f'nwr["amenity"="pharmacy"]({s},{w},{n},{e});')
+        query = "[out:json][timeout:25];(" + "".join(statements) + ");out center tags;"
+
+        with self._lock:
+            self._stats["overpass_calls"] += 1
+        try:
+            elements = self.fetch(query)
+        except RateLimited:
+            with self._lock:
+                self._stats["rate_limited"] += 1
+            raise  # the caller answers "busy" rather than a partial result
+        except Exception as e:
+            print("Overpass tile fetch failed:", e)
+            with self._lock:
+                self._stats["fetch_errors"] += 1
+            return None
+
+        now = time.time()
+        parts = {gh: ([], [], 0) for row in missing_rows for gh in row}
+        fetched_bytes = 0
+        for elem in elements:
+            record = Pharmacy.from_element(elem)
+            if record is None:
+                continue
+            size = len(json.dumps(elem, separators=(",", ":")))
+            fetched_bytes += size
+            gh = geohash_encode(record.lat, record.lon, precision)
+            if gh not in parts:
+                continue  # a way whose centre lies outside the fetched cells
+            records, contact, nbytes = parts[gh]
+            contact.append(has_contact(record.tags))
+            record.tags = record.result_tags()  # tiles live for hours; keep only what results need
+            records.append(record)
+            parts[gh] = (records, contact, nbytes + size)
+        tiles = {gh: _Tile(records, contact, nbytes, now) for gh, (records, contact, nbytes) in parts.items()}
+
+        with self._lock:
+            self._stats["bytes_fetched"] += fetched_bytes
+            for gh, tile in tiles.items():
+                self._tiles[gh] = tile
+                self._tiles.move_to_end(gh)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+                self._stats["evictions"] += 1
+        return tiles
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["tiles"] = len(self._tiles)
+            out["circles"] = len(self._circles)
+        out["ttl_s"] = self.ttl_s
+        lookups = out["tile_hits"] + out["tile_misses"]
+        out["tile_hit_ratio"] = round(out["tile_hits"] / lookups, 4) if lookups else 0.0
+        # Queries answered without any Overpass call
+        out["hit_ratio"] = round(1 - out["overpass_calls"] / out["queries"], 4) if out["queries"] else 0.0
+        return out
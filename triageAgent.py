@@ -1,51 +1,130 @@
 # agents/triageAgent.py
 import os
 import json
-import re
-from flask import Flask, request, jsonify
+import hashlib
+import threading
+import time
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from red_flags import RedFlagMatcher, load_lexicon
+from json_extract import IncrementalJSONExtractor, extract_json_array, extract_json_object
+from triage_cache import SingleFlight, TriageCache, normalize_symptoms
+from resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, hedged_call
 
 # --- Load environment variables from project root .env ---
 project_root = Path(__file__).resolve().parent.parent  # one level up from /agents
 load_dotenv(project_root / ".env")
 
-# Try importing Google Generative AI client
-try:
-    import google.generativeai as genai
-except Exception as e:
-    raise RuntimeError(
-        "Could not import google.generativeai. "
-        "Install it with: pip install google-generative-ai\n"
-        f"Original error: {e}"
-    )
-
 # --- Configuration from environment ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gemini-1.5")
 PORT = int(os.getenv("TRIAGE_PORT", "9001"))
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")  # another host, e.g. the local fake server
+WARMUP = os.getenv("TRIAGE_WARMUP", "0").lower() in ("1", "true", "yes")
+WARMUP_RETRY_S = float(os.getenv("TRIAGE_WARMUP_RETRY_S", "1"))  # first retry delay, doubled up to the max
+WARMUP_RETRY_MAX_S = float(os.getenv("TRIAGE_WARMUP_RETRY_MAX_S", "60"))
+
+# --- GenAI client factory ---
+# google.generativeai takes most of a second to import, so it is imported and
+# configured on first use instead of at import time. A missing key only fails
+# the calls that need Gemini (they get the usual fallback answer).
+_genai = None
+_genai_lock = threading.Lock()
+readiness = {"client": False, "warmed_up": False, "warm_up_attempts": 0, "error": None}
+
+def get_genai():
+    """The configured google.generativeai module; imports and configures it on first call."""
+    global _genai
+    if _genai is not None:
+        return _genai
+    with _genai_lock:
+        if _genai is None:
+            if not GEMINI_API_KEY:
+                raise RuntimeError("No GEMINI_API_KEY found. Check your .env file!")
+            try:
+                import google.generativeai as genai
+            except Exception as e:
+                raise RuntimeError(
+                    "Could not import google.generativeai. "
+                    "Install it with: pip install google-generative-ai\n"
+                    f"Original error: {e}"
+                )
+            if GEMINI_API_ENDPOINT:
+                genai.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=GEMINI_API_KEY)
+            _genai = genai
+            readiness["client"] = True
+    return _genai
+
+def warm_up() -> bool:
+    """Configure the client and make one cheap request so its connection is open before traffic arrives."""
+    readiness["warm_up_attempts"] += 1
+    try:
+        genai = get_genai()
+        if hasattr(genai, "GenerativeModel"):
+            genai.GenerativeModel(MODEL_NAME).count_tokens("ping", request_options=gemini_request_options())
+        else:
+            genai.get_model(f"models/{MODEL_NAME}")
+    except Exception as e:
+        readiness["error"] = str(e)
+        print("Warning: Gemini warm-up failed:", e)
+        return False
+    readiness["warmed_up"] = True
+    readiness["error"] = None
+    return True
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+def _warm_up_until_ready():
+    delay = WARMUP_RETRY_S
+    while not warm_up():
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_S)
 
-if not GEMINI_API_KEY:
-    raise RuntimeError("No GEMINI_API_KEY found. Check your .env file!")
+def start_warm_up():
+    """Warm up in the background, retrying with backoff; /readyz reports not ready until it has succeeded."""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if not readiness["warmed_up"] and (_warm_up_thread is None or not _warm_up_thread.is_alive()):
+            _warm_up_thread = threading.Thread(target=_warm_up_until_ready, name="gemini-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
 
-# Configure GenAI client
-genai.configure(api_key=GEMINI_API_KEY)
+def readiness_status():
+    """(ready, details) for /readyz."""
+    if WARMUP:
+        # Under a WSGI server nothing else starts the warm-up: the first probe does
+        start_warm_up()
+        ready = readiness["warmed_up"]
+    else:
+        try:
+            get_genai()
+            ready = True
+        except RuntimeError as e:
+            readiness["error"] = str(e)
+            ready = False
+    return ready, dict(readiness, warmup=WARMUP, model=MODEL_NAME)
 
 # --- Flask app setup ---
 app = Flask(__name__)
 
-# Red flag symptoms
-RED_FLAGS = [
-    "difficulty breathing", "shortness of breath", "chest pain", "severe bleeding",
-    "unconscious", "fainting", "sudden weakness", "slurred speech", "confused",
-    "loss of consciousness", "severe allergic reaction", "unable to wake"
-]
+# Red flag symptoms (lexicon file loaded once, compiled into a single matcher)
+RED_FLAG_LEXICON = load_lexicon()
+RED_FLAGS = sorted({canonical for _, canonical in RED_FLAG_LEXICON})
+red_flag_matcher = RedFlagMatcher(RED_FLAG_LEXICON)
+
+def find_red_flags(text: str):
+    """Every red-flag match in `text` with its span, in one pass."""
+    return red_flag_matcher.find_all(text)
 
 def has_red_flag(text: str):
-    t = text.lower()
-    for flag in RED_FLAGS:
-        if flag in t:
-            return True, flag
+    matches = find_red_flags(text)
+    if matches:
+        return True, matches[0]["flag"]
     return False, None
 
 # --- Prompt template ---
@@ -66,73 +145,241 @@ Patient symptoms:
 Respond with valid JSON only.
 """
 
+# Multi-item variant used by /triage/batch: one model call covers many patients
+BATCH_PROMPT_TEMPLATE = """
+You are a medical triage assistant. Below are several independent patients, each introduced by an id in
+square brackets. For EACH patient return a JSON object with these keys:
+
+- id: the patient's id (integer).
+- urgency: one of "EMERGENCY", "MODERATE", or "LOW".
+- possible_conditions: an array of short condition names (2-4 items max).
+- recommended_actions: a short list chosen from: ["emergency","pharmacy","consult_doctor","self_care"].
+- explanation: one or two short sentences explaining the reasoning.
+
+If unsure, choose "MODERATE". If immediate danger, choose "EMERGENCY".
+
+Patients:
+{items}
+
+Respond with a JSON array ONLY, one object per patient, in the same order. No extra words.
+"""
+
+BATCH_SIZE = int(os.getenv("TRIAGE_BATCH_SIZE", "20"))  # patients per model call
+BATCH_PARALLEL = int(os.getenv("TRIAGE_BATCH_PARALLEL", "4"))  # model calls in flight per batch request
+BATCH_MAX_ITEMS = int(os.getenv("TRIAGE_BATCH_MAX_ITEMS", "1000"))
+
+# --- Response cache ---
+# temperature=0.0 makes the model output deterministic per prompt, so near-identical
+# symptom text can be served from here. TRIAGE_CACHE_SIZE=0 disables the cache.
+CACHE_SIZE = int(os.getenv("TRIAGE_CACHE_SIZE", "2048"))
+CACHE_TTL_S = float(os.getenv("TRIAGE_CACHE_TTL_S", "3600"))
+CACHE_DISK_PATH = os.getenv("TRIAGE_CACHE_PATH")  # optional SQLite file, survives restarts
+CACHE_DISK_MAX = int(os.getenv("TRIAGE_CACHE_DISK_MAX", str(8 * CACHE_SIZE)))  # rows kept in that file
+
+# Entries are only valid for the model and prompt that produced them
+_cache_namespace = hashlib.sha1(f"{MODEL_NAME}\n{PROMPT_TEMPLATE}".encode("utf-8")).hexdigest()[:12]
+triage_cache = TriageCache(CACHE_SIZE, CACHE_TTL_S, CACHE_DISK_PATH, CACHE_DISK_MAX) if CACHE_SIZE > 0 else None
+
+# Coalesces identical in-flight model calls (threads and the ASGI mode share it).
+# A thread waits at most TRIAGE_COALESCE_WAIT_S on another request's call before making its own.
+COALESCE_WAIT_S = float(os.getenv("TRIAGE_COALESCE_WAIT_S", "45"))
+single_flight = SingleFlight(COALESCE_WAIT_S)
+
+def cache_key(text: str) -> str:
+    return f"{_cache_namespace}:{normalize_symptoms(text)}"
+
+def cached_triage(text: str):
+    if triage_cache is None:
+        return None
+    return triage_cache.get(cache_key(text))
+
+# --- Local model tier ---
+# Optional offline classifier (see triage_classifier.py). Confident predictions are
+# answered without calling Gemini; when Gemini fails, a reasonably confident one
+# replaces the canned answer.
+LOCAL_MODEL_PATH = os.getenv("TRIAGE_LOCAL_MODEL_PATH")
+LOCAL_CONFIDENCE = float(os.getenv("TRIAGE_LOCAL_CONFIDENCE", "0.9"))
+# Lower bar for the fallback: below it the canned MODERATE answer is safer than a guess
+FALLBACK_CONFIDENCE = float(os.getenv("TRIAGE_FALLBACK_CONFIDENCE", "0.7"))
+
+local_model = None
+if LOCAL_MODEL_PATH:
+    try:
+        from triage_classifier import LocalTriageModel
+        local_model = LocalTriageModel.load(LOCAL_MODEL_PATH)
+    except Exception as e:
+        print("Warning: local triage model disabled:", e)
+
+local_stats = {"answered": 0, "deferred": 0, "fallbacks": 0, "fallbacks_declined": 0}
+
+def local_triage(text: str):
+    """Local answer when the offline model is confident enough, else None."""
+    if local_model is None:
+        return None
+    result, confidence = local_model.predict(text)
+    if confidence >= LOCAL_CONFIDENCE:
+        local_stats["answered"] += 1
+        return result
+    local_stats["deferred"] += 1
+    return None
+
+def fallback_triage(text: str, canned: dict) -> dict:
+    """Answer used when Gemini fails: the local model's guess if confident enough, else the canned response."""
+    if local_model is None:
+        return dict(canned)
+    result, confidence = local_model.predict(text)
+    if confidence < FALLBACK_CONFIDENCE:
+        local_stats["fallbacks_declined"] += 1
+        return dict(canned)
+    local_stats["fallbacks"] += 1
+    return result
+
 # --- Gemini call wrapper ---
-def call_gemini_generate(symptoms: str) -> str:
-    prompt = PROMPT_TEMPLATE.format(symptoms=symptoms)
-    response = genai.generate_text(
-        model=MODEL_NAME,
-        prompt=prompt,
-        temperature=0.0,
-        max_output_tokens=400,
-    )
+# Per-attempt timeout, a circuit breaker per model (fail fast while Gemini is down,
+# probe again after GEMINI_BREAKER_RESET_S) and optional hedging: when a call is
+# slower than GEMINI_HEDGE_DELAY_S (default: observed p95) a second one is fired.
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "20"))
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_S = float(os.getenv("GEMINI_BREAKER_RESET_S", "30"))
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0").lower() in ("1", "true", "yes")
+GEMINI_HEDGE_DELAY_S = float(os.getenv("GEMINI_HEDGE_DELAY_S")) if os.getenv("GEMINI_HEDGE_DELAY_S") else None
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "64"))
+
+_gemini_pool = ThreadPoolExecutor(max_workers=GEMINI_POOL_SIZE, thread_name_prefix="gemini-call")
+_breakers = {}
+gemini_latency = LatencyTracker()
+gemini_stats = {"calls": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0}
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers.setdefault(
+            model, CircuitBreaker(model, GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_S)
+        )
+    return breaker
+
+def hedge_delay():
+    if not GEMINI_HEDGE:
+        return None
+    return GEMINI_HEDGE_DELAY_S if GEMINI_HEDGE_DELAY_S is not None else gemini_latency.quantile(0.95)
+
+def gemini_request_options() -> dict:
+    # No client-side retries: the breaker and hedging decide when to try again
+    return {"timeout": GEMINI_TIMEOUT_S, "retry": None}
+
+def _generate(prompt: str, max_output_tokens: int) -> str:
+    genai = get_genai()
+    if hasattr(genai, "generate_text"):
+        response = genai.generate_text(
+            model=MODEL_NAME,
+            prompt=prompt,
+            temperature=0.0,
+            max_output_tokens=max_output_tokens,
+        )
+    else:
+        # Newer google-generativeai releases dropped generate_text
+        response = genai.GenerativeModel(MODEL_NAME).generate_content(
+            prompt,
+            generation_config={"temperature": 0.0, "max_output_tokens": max_output_tokens},
+            request_options=gemini_request_options(),
+        )
     text = getattr(response, "text", None) or str(response)
     return text
 
-def extract_json_from_text(text: str):
-    match = re.search(r'\{.*\}', text, re.S)
-    if match:
-        try:
-            return json.loads(match.group(0))
-        except Exception:
-            pass
+def guarded_generate(prompt: str, max_output_tokens: int) -> str:
+    get_genai()  # configuration errors are not upstream failures; keep them out of the breaker
+    breaker = breaker_for(MODEL_NAME)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit open for {MODEL_NAME}")
+    gemini_stats["calls"] += 1
+    start = time.monotonic()
     try:
-        return json.loads(text)
+        text = hedged_call(_gemini_pool, _generate, (prompt, max_output_tokens),
+                           timeout_s=GEMINI_TIMEOUT_S, hedge_delay_s=hedge_delay(), stats=gemini_stats)
+    except Exception as e:
+        if isinstance(e, TimeoutError):
+            gemini_stats["timeouts"] += 1
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    gemini_latency.observe(time.monotonic() - start)
+    return text
+
+def call_gemini_generate(symptoms: str) -> str:
+    prompt = PROMPT_TEMPLATE.format(symptoms=symptoms)
+    return guarded_generate(prompt, 400)
+
+def stream_gemini_generate(symptoms: str):
+    """Yield the model output in chunks as it is generated."""
+    genai = get_genai()
+    if not hasattr(genai, "GenerativeModel"):
+        # Client without streaming support: fall back to one blocking call
+        yield call_gemini_generate(symptoms)
+        return
+    breaker = breaker_for(MODEL_NAME)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit open for {MODEL_NAME}")
+    prompt = PROMPT_TEMPLATE.format(symptoms=symptoms)
+    try:
+        model = genai.GenerativeModel(MODEL_NAME)
+        response = model.generate_content(
+            prompt,
+            generation_config={"temperature": 0.0, "max_output_tokens": 400},
+            stream=True,
+            request_options=gemini_request_options(),
+        )
+        for chunk in response:
+            yield getattr(chunk, "text", "") or ""
+    except GeneratorExit:
+        breaker.record_success()  # the caller stopped reading once the object closed
+        raise
     except Exception:
-        return None
+        breaker.record_failure()
+        raise
+    breaker.record_success()
 
-# --- API route ---
-@app.route("/triage", methods=["POST"])
-def triage():
-    payload = request.get_json(force=True)
-    text = payload.get("text", "").strip()
-    if not text:
-        return jsonify({"error":"no text provided"}), 400
+def call_gemini_generate_batch(items) -> str:
+    """`items` is a list of (id, symptoms) pairs."""
+    lines = "\n".join(f'[{i}] """{symptoms}"""' for i, symptoms in items)
+    prompt = BATCH_PROMPT_TEMPLATE.format(items=lines)
+    return guarded_generate(prompt, min(8192, 200 * len(items) + 100))
 
-    # Step 1: check red flags first
+def extract_json_array_from_text(text: str):
+    # A truncated answer is not trusted (results get cached); its items are retried one by one
+    return extract_json_array(text)
+
+def extract_json_from_text(text: str):
+    # Only a closed object is an answer; a cut-off one must not be cached as a real triage
+    return extract_json_object(text)
+
+# --- Triage pipeline ---
+UNAVAILABLE_RESPONSE = {
+    "urgency":"MODERATE",
+    "possible_conditions": [],
+    "recommended_actions":["pharmacy","consult_doctor"],
+    "explanation": "Triage unavailable; please seek care if symptoms worsen."
+}
+
+UNPARSEABLE_RESPONSE = {
+    "urgency":"MODERATE",
+    "possible_conditions": [],
+    "recommended_actions":["pharmacy","consult_doctor"],
+    "explanation":"Could not parse model output. Please consult a healthcare provider if concerned."
+}
+
+def red_flag_triage(text: str):
     red, reason = has_red_flag(text)
-    if red:
-        return jsonify({
-            "urgency": "EMERGENCY",
-            "possible_conditions": [],
-            "recommended_actions": ["emergency"],
-            "explanation": f"Immediate red-flag detected: {reason}. Call emergency services."
-        })
-
-    # Step 2: call Gemini
-    try:
-        raw = call_gemini_generate(text)
-        print("RAW MODEL OUTPUT:", raw)  # debug
-    except Exception as e:
-        print("Gemini call failed:", e)
-        return jsonify({
-            "urgency":"MODERATE",
-            "possible_conditions": [],
-            "recommended_actions":["pharmacy","consult_doctor"],
-            "explanation": "Triage unavailable; please seek care if symptoms worsen."
-        })
-
-    # Step 3: parse JSON
-    parsed = extract_json_from_text(raw)
-    if not parsed:
-        return jsonify({
-            "urgency":"MODERATE",
-            "possible_conditions": [],
-            "recommended_actions":["pharmacy","consult_doctor"],
-            "explanation":"Could not parse model output. Please consult a healthcare provider if concerned."
-        })
-
-    # Normalize
-    urgency = parsed.get("urgency","MODERATE").upper()
+    if not red:
+        return None
+    return {
+        "urgency": "EMERGENCY",
+        "possible_conditions": [],
+        "recommended_actions": ["emergency"],
+        "explanation": f"Immediate red-flag detected: {reason}. Call emergency services."
+    }
+
+def normalize_triage(parsed: dict) -> dict:
+    urgency = str(parsed.get("urgency","MODERATE")).upper()
     if urgency not in ("EMERGENCY","MODERATE","LOW"):
         urgency = "MODERATE"
     possible_conditions = parsed.get("possible_conditions", [])
@@ -142,15 +389,273 @@ def triage():
     if not isinstance(recommended_actions, list):
         recommended_actions = [str(recommended_actions)]
     explanation = parsed.get("explanation", "")
-
-    return jsonify({
+    return {
         "urgency": urgency,
         "possible_conditions": possible_conditions,
         "recommended_actions": recommended_actions,
         "explanation": explanation
-    })
+    }
+
+def triage_from_raw(text: str, raw: str) -> dict:
+    """Parse and normalize one model output; only successful parses are cached."""
+    parsed = extract_json_from_text(raw)
+    if not parsed or not isinstance(parsed, dict):
+        return fallback_triage(text, UNPARSEABLE_RESPONSE)
+    result = normalize_triage(parsed)
+    if triage_cache is not None:
+        triage_cache.put(cache_key(text), result)
+    return result
+
+def _model_triage_uncoalesced(text: str) -> dict:
+    try:
+        raw = call_gemini_generate(text)
+    except Exception as e:
+        print("Gemini call failed:", e)
+        return fallback_triage(text, UNAVAILABLE_RESPONSE)
+    return triage_from_raw(text, raw)
+
+def model_triage(text: str) -> dict:
+    # Identical symptom text already waiting on Gemini shares that call's result
+    try:
+        return dict(single_flight.do(cache_key(text), _model_triage_uncoalesced, text))
+    except Exception as e:
+        # The call we were waiting on was abandoned before it reached Gemini
+        print("Coalesced Gemini call failed:", e)
+        return fallback_triage(text, UNAVAILABLE_RESPONSE)
+
+def triage_text(text: str) -> dict:
+    # Step 1: check red flags first
+    red = red_flag_triage(text)
+    if red:
+        return red
+
+    # Step 2: answer near-identical symptom text from the cache
+    cached = cached_triage(text)
+    if cached:
+        return cached
+
+    # Step 3: confident local prediction
+    local = local_triage(text)
+    if local:
+        return local
+
+    # Step 4: call Gemini, parse and normalize
+    return model_triage(text)
+
+def _batch_chunk_triage(chunk):
+    """
+    Triage one chunk of (id, text) pairs with a single model call.
+    Returns ({id: result}, model_calls); items the batch answer misses are retried one by one.
+    """
+    out = {}
+    calls = 1
+    try:
+        raw = call_gemini_generate_batch(chunk)
+        parsed = extract_json_array_from_text(raw) or []
+    except Exception as e:
+        print("Gemini batch call failed:", e)
+        parsed = []
+
+    texts = dict(chunk)
+    for obj in parsed:
+        if not isinstance(obj, dict):
+            continue
+        try:
+            item_id = int(obj.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if item_id in texts and item_id not in out:
+            result = normalize_triage(obj)
+            out[item_id] = result
+            if triage_cache is not None:
+                triage_cache.put(cache_key(texts[item_id]), result)
+
+    for item_id, text in chunk:
+        if item_id not in out:
+            out[item_id] = model_triage(text)
+            calls += 1
+    return out, calls
+
+def triage_batch(texts) -> dict:
+    """
+    Triage many symptom texts at once, results in input order.
+
+    Red flags and cache hits are resolved first; the remaining distinct texts are
+    packed BATCH_SIZE at a time into multi-item model calls.
+    """
+    results = [None] * len(texts)
+    pending = {}  # cache key -> (first text, [input indexes])
+    for idx, text in enumerate(texts):
+        if not text:
+            results[idx] = {"error": "no text provided"}
+            continue
+        result = red_flag_triage(text) or cached_triage(text) or local_triage(text)
+        if result:
+            results[idx] = result
+            continue
+        key = cache_key(text)
+        if key in pending:
+            pending[key][1].append(idx)
+        else:
+            pending[key] = (text, [idx])
+
+    unique = list(pending.values())
+    model_items = sum(len(idxs) for _, idxs in unique)  # calls a /triage per item would have made
+    chunks = [
+        [(j, unique[j][0]) for j in range(start, min(start + BATCH_SIZE, len(unique)))]
+        for start in range(0, len(unique), max(1, BATCH_SIZE))
+    ]
+
+    model_calls = 0
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_PARALLEL, len(chunks)))) as pool:
+            for out, calls in pool.map(_batch_chunk_triage, chunks):
+                model_calls += calls
+                for j, result in out.items():
+                    for idx in unique[j][1]:
+                        results[idx] = dict(result)
+
+    return {
+        "results": results,
+        "count": len(results),
+        "model_calls": model_calls,
+        "model_calls_saved": model_items - model_calls,
+    }
+
+def triage_stream(text: str):
+    """
+    Yield triage frames as soon as each part is known:
+    the red-flag decision, then urgency (parsed from the token stream), then the final result.
+    The final frame's `result` is exactly what /triage returns.
+    """
+    red, reason = has_red_flag(text)
+    yield {"event": "red_flag", "red_flag": red, "reason": reason}
+    if red:
+        result = red_flag_triage(text)
+        yield {"event": "urgency", "urgency": result["urgency"]}
+        yield {"event": "final", "result": result}
+        return
+
+    known = cached_triage(text) or local_triage(text)
+    if known:
+        yield {"event": "urgency", "urgency": known["urgency"]}
+        yield {"event": "final", "result": known}
+        return
+
+    buf = ""
+    urgency_sent = False
+    extractor = IncrementalJSONExtractor()
+    try:
+        for chunk in stream_gemini_generate(text):
+            buf += chunk
+            done = extractor.feed(chunk) is not None
+            if not urgency_sent:
+                for key, value in extractor.new_members():
+                    if key == "urgency":
+                        urgency_sent = True
+                        yield {"event": "urgency", "urgency": normalize_triage({"urgency": value})["urgency"]}
+                        break
+            if done:
+                break  # the object is closed; no need to wait for the rest of the generation
+    except Exception as e:
+        print("Gemini call failed:", e)
+        result = fallback_triage(text, UNAVAILABLE_RESPONSE)
+    else:
+        result = triage_from_raw(text, buf)
+    if not urgency_sent:
+        yield {"event": "urgency", "urgency": result["urgency"]}
+    yield {"event": "final", "result": result}
+
+def stats_snapshot() -> dict:
+    return {
+        "cache": triage_cache.stats() if triage_cache is not None else {"enabled": False},
+        "local_model": dict(
+            local_stats,
+            enabled=local_model is not None,
+            confidence=LOCAL_CONFIDENCE,
+            fallback_confidence=FALLBACK_CONFIDENCE,
+        ),
+        "single_flight": single_flight.stats(),
+        "gemini": dict(
+            gemini_stats,
+            hedge_delay_s=hedge_delay(),
+            p95_s=gemini_latency.quantile(0.95),
+            breakers={name: b.stats() for name, b in _breakers.items()},
+        ),
+    }
+
+# --- API route ---
+@app.route("/triage", methods=["POST"])
+def triage():
+    payload = request.get_json(force=True)
+    text = payload.get("text", "").strip()
+    if not text:
+        return jsonify({"error":"no text provided"}), 400
+    return jsonify(triage_text(text))
+
+@app.route("/triage/stream", methods=["POST"])
+def triage_stream_endpoint():
+    payload = request.get_json(force=True)
+    text = payload.get("text", "").strip()
+    if not text:
+        return jsonify({"error":"no text provided"}), 400
+
+    # NDJSON by default, Server-Sent Events when the client asks for them
+    sse = "text/event-stream" in (request.headers.get("Accept") or "")
+
+    def frames():
+        for frame in triage_stream(text):
+            line = json.dumps(frame)
+            yield f"event: {frame['event']}\ndata: {line}\n\n" if sse else line + "\n"
+
+    return Response(
+        stream_with_context(frames()),
+        mimetype="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/triage/batch", methods=["POST"])
+def triage_batch_endpoint():
+    payload = request.get_json(force=True)
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return jsonify({"error":"no items provided"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error":f"too many items (max {BATCH_MAX_ITEMS})"}), 400
+
+    # Items are plain strings or {"id": ..., "text": ...}; ids are echoed back
+    texts, ids = [], []
+    for item in items:
+        if isinstance(item, dict):
+            texts.append(str(item.get("text", "")).strip())
+            ids.append(item.get("id"))
+        else:
+            texts.append(str(item or "").strip())
+            ids.append(None)
+
+    out = triage_batch(texts)
+    for result, item_id in zip(out["results"], ids):
+        if item_id is not None:
+            result["id"] = item_id
+    return jsonify(out)
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness only: the process is up and serving requests
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    ready, details = readiness_status()
+    return jsonify(dict(details, ready=ready)), 200 if ready else 503
+
+@app.route("/triage/stats", methods=["GET"])
+def triage_stats():
+    return jsonify(stats_snapshot())
 
 # --- Run server ---
 if __name__ == "__main__":
     print(f"Starting triage_agent on port {PORT}, model={MODEL_NAME}")
+    if WARMUP:
+        start_warm_up()
     app.run(host="0.0.0.0", port=PORT)
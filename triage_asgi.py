@@ -0,0 +1,226 @@
+# triage_asgi.py
+# ASGI serving mode for the triage agent.
+#
+#   uvicorn triage_asgi:app --host 0.0.0.0 --port 9001
+#   python triage_asgi.py
+#
+# Responses are byte-for-byte what the Flask app in triageAgent returns, but a
+# request only holds an event-loop slot while it waits on the model. Outstanding
+# model calls are bounded by a semaphore, each request has a latency budget
+# after which the usual MODERATE fallback is returned, and requests are shed
+# with 503 once too many are queued for a model slot.
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import triageAgent as agent
+
+MAX_CONCURRENCY = int(os.getenv("TRIAGE_MAX_CONCURRENCY", "32"))  # outstanding model calls
+MAX_QUEUE = int(os.getenv("TRIAGE_MAX_QUEUE", "256"))  # requests waiting for a model slot
+LATENCY_BUDGET_S = float(os.getenv("TRIAGE_LATENCY_BUDGET_S", "8"))
+
+
+def dump_json(obj) -> bytes:
+    # Same encoding as Flask's default jsonify (sorted keys, compact, trailing newline)
+    return (json.dumps(obj, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class QueueTimeout(asyncio.TimeoutError):
+    """The latency budget ran out before a model slot freed up; the call never started."""
+
+
+class ModelGate:
+    """Bounds outstanding model calls and sheds load by queue depth."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, budget_s: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.budget_s = budget_s
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        self._sem = None  # created lazily inside the running loop
+        self.queued = 0
+        self.inflight = 0
+        self.stats = {"calls": 0, "shed": 0, "budget_exceeded": 0}
+
+    def overloaded(self) -> bool:
+        return self.queued >= self.max_queue
+
+    async def run(self, fn, *args):
+        """
+        Run blocking `fn(*args)` on the model pool within the latency budget.
+
+        Raises asyncio.TimeoutError when the budget runs out. The slot is only
+        released when the worker thread actually finishes, so abandoned calls
+        still count against the concurrency limit.
+        """
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget_s
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.budget_s)
+        except asyncio.TimeoutError:
+            raise QueueTimeout() from None
+        finally:
+            self.queued -= 1
+
+        self.inflight += 1
+        self.stats["calls"] += 1
+        try:
+            fut = loop.run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self.inflight -= 1
+            self._sem.release()
+            raise
+
+        def _release(_):
+            self.inflight -= 1
+            self._sem.release()
+
+        fut.add_done_callback(_release)
+        return await asyncio.wait_for(asyncio.shield(fut), timeout=max(0.0, deadline - loop.time()))
+
+    def snapshot(self) -> dict:
+        out = dict(self.stats)
+        out.update({
+            "queued": self.queued,
+            "inflight": self.inflight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "latency_budget_s": self.budget_s,
+        })
+        return out
+
+
+gate = ModelGate(MAX_CONCURRENCY, MAX_QUEUE, LATENCY_BUDGET_S)
+
+
+async def triage_text_async(text: str) -> dict:
+    red = agent.red_flag_triage(text)
+    if red:
+        return red
+    known = agent.cached_triage(text) or agent.local_triage(text)
+    if known:
+        return known
+    key = agent.cache_key(text)
+    fut, leader = agent.single_flight.begin(key)
+    try:
+        if leader:
+            try:
+                result = await gate.run(agent.single_flight.run, key, fut, agent._model_triage_uncoalesced, text)
+            except BaseException as e:
+                # Cancelled (client gone), timed out in the queue or refused by a closed pool before
+                # the call started: fail the future so waiters don't hang. A started call completes it.
+                if not isinstance(e, Exception):
+                    e = RuntimeError("triage request cancelled before calling the model")
+                agent.single_flight.abandon(key, fut, e)
+                raise
+        else:
+            # Same text already in flight (from this loop or a Flask thread): wait for it, within budget.
+            # Shielded so giving up never cancels the leader's future for everyone else.
+            waiter = asyncio.wrap_future(fut)
+            waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+            result = await asyncio.wait_for(asyncio.shield(waiter), timeout=gate.budget_s)
+        return dict(result)
+    except (asyncio.TimeoutError, QueueTimeout):
+        gate.stats["budget_exceeded"] += 1
+        return agent.fallback_triage(text, agent.UNAVAILABLE_RESPONSE)
+
+
+# --- ASGI plumbing ---
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return body
+
+
+async def _send(send, status: int, body: bytes, content_type: bytes = b"application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())] + list(headers),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if agent.WARMUP:
+                agent.start_warm_up()  # /readyz stays 503 until it succeeds
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            gate._executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def handle_triage(scope, receive, send):
+    if gate.overloaded():
+        gate.stats["shed"] += 1
+        return await _send(send, 503, dump_json({"error": "triage overloaded, retry shortly"}),
+                           headers=[(b"retry-after", b"1")])
+    try:
+        payload = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        return await _send(send, 400, dump_json({"error": "invalid json"}))
+    if not isinstance(payload, dict):
+        return await _send(send, 400, dump_json({"error": "invalid json"}))
+    text = str(payload.get("text", "")).strip()
+    if not text:
+        return await _send(send, 400, dump_json({"error": "no text provided"}))
+    await _send(send, 200, dump_json(await triage_text_async(text)))
+
+
+async def handle_healthz(scope, receive, send):
+    await _send(send, 200, dump_json({"status": "ok"}))
+
+
+async def handle_readyz(scope, receive, send):
+    # The first check may import the client; keep that off the event loop
+    ready, details = await asyncio.get_running_loop().run_in_executor(None, agent.readiness_status)
+    await _send(send, 200 if ready else 503, dump_json(dict(details, ready=ready)))
+
+
+async def handle_stats(scope, receive, send):
+    out = agent.stats_snapshot()
+    out["server"] = gate.snapshot()
+    await _send(send, 200, dump_json(out))
+
+
+ROUTES = {
+    ("POST", "/triage"): handle_triage,
+    ("GET", "/triage/stats"): handle_stats,
+    ("GET", "/healthz"): handle_healthz,
+    ("GET", "/readyz"): handle_readyz,
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    handler = ROUTES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+    if handler is None:
+        return await _send(send, 404, dump_json({"error": "not found"}))
+    await handler(scope, receive, send)
+
+
+# --- Run server ---
+if __name__ == "__main__":
+    import uvicorn
+
+    print(f"Starting triage_agent (ASGI) on port {agent.PORT}, model={agent.MODEL_NAME}, "
+          f"max_concurrency={MAX_CONCURRENCY}, max_queue={MAX_QUEUE}, budget={LATENCY_BUDGET_S}s")
+    uvicorn.run(app, host="0.0.0.0", port=agent.PORT)
@@ -0,0 +1,228 @@
+# triage_cache.py
+# Response cache for triageAgent, keyed on a normalized form of the symptom text.
+#
+# Memory tier: bounded LRU with a TTL. Optional disk tier: a small SQLite file
+# that survives restarts, pruned of expired and oldest rows every `evict_every`
+# stores. Values are the already-normalized triage dicts.
+# SingleFlight covers the gap before a result is cached: identical requests
+# that arrive while the first is still waiting on the model share its call.
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_symptoms(text: str) -> str:
+    """Fold case, whitespace, punctuation and token order: "Headache, fever!" -> "fever headache"."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    tokens = _NON_WORD.sub(" ", text).split()
+    return " ".join(sorted(tokens))
+
+
+class TriageCache:
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600.0, disk_path: Optional[Path] = None,
+                 disk_max_entries: Optional[int] = None, evict_every: int = 256):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.disk_max_entries = disk_max_entries if disk_max_entries is not None else 8 * max_entries
+        self.evict_every = evict_every  # disk stores between pruning passes
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "stores": 0,
+                       "disk_evictions": 0}
+        self._puts_since_evict = 0
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS triage_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS triage_cache_created ON triage_cache (created)")
+            self._db.commit()
+            self.evict_disk()  # rows left by earlier runs
+
+    def _fresh(self, created: float, now: float) -> bool:
+        return self.ttl_s <= 0 or now - created < self.ttl_s
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                created, value = entry
+                if self._fresh(created, now):
+                    self._mem.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(value)
+                del self._mem[key]
+                self._stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM triage_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    if self._fresh(row[1], now):
+                        value = json.loads(row[0])
+                        self._put_mem(key, value, row[1])
+                        self._stats["disk_hits"] += 1
+                        return dict(value)
+                    self._db.execute("DELETE FROM triage_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Dict):
+        now = time.time()
+        with self._lock:
+            self._put_mem(key, dict(value), now)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO triage_cache (key, value, created) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print("Warning: failed to write triage cache:", e)
+                    return
+                self._puts_since_evict += 1
+                if self._puts_since_evict >= self.evict_every:
+                    self._puts_since_evict = 0
+                    self._evict_disk_locked()
+
+    def evict_disk(self) -> int:
+        """Drop expired rows from the disk tier, then the oldest beyond disk_max_entries. Returns rows removed."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._evict_disk_locked()
+
+    def _evict_disk_locked(self) -> int:
+        removed = 0
+        try:
+            if self.ttl_s > 0:
+                removed += self._db.execute("DELETE FROM triage_cache WHERE created < ?",
+                                            (time.time() - self.ttl_s,)).rowcount
+            excess = self._db.execute("SELECT COUNT(*) FROM triage_cache").fetchone()[0] - self.disk_max_entries
+            if excess > 0:
+                removed += self._db.execute(
+                    "DELETE FROM triage_cache WHERE key IN (SELECT key FROM triage_cache ORDER BY created LIMIT ?)",
+                    (excess,),
+                ).rowcount
+            self._db.commit()
+        except sqlite3.Error as e:
+            print("Warning: triage cache eviction failed:", e)
+        self._stats["disk_evictions"] += removed
+        return removed
+
+    def _put_mem(self, key: str, value: Dict, created: float):
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._mem)
+            out["max_entries"] = self.max_entries
+            out["ttl_s"] = self.ttl_s
+            out["disk"] = self._db is not None
+            if self._db is not None:
+                out["disk_max_entries"] = self.disk_max_entries
+            lookups = out["hits"] + out["disk_hits"] + out["misses"]
+            out["hit_ratio"] = round((out["hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+            return out
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader)
+    runs the function, later callers wait on its result instead of repeating it.
+    Waiting works from threads (Future.result) and from asyncio (asyncio.wrap_future).
+    Threads wait at most `wait_s` (None: no limit), then make the call themselves.
+    """
+
+    def __init__(self, wait_s: Optional[float] = None):
+        self.wait_s = wait_s
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._stats = {"leaders": 0, "deduplicated": 0, "wait_timeouts": 0}
+
+    def begin(self, key: str) -> Tuple[Future, bool]:
+        """Return (future, is_leader). The leader must call run() with that future."""
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self._stats["deduplicated"] += 1
+                return fut, False
+            fut = Future()
+            self._calls[key] = fut
+            self._stats["leaders"] += 1
+            return fut, True
+
+    def run(self, key: str, fut: Future, fn, *args):
+        with self._lock:
+            if fut.done():
+                return fut.result()  # abandoned before it got to run; raises the abandon error
+            fut.set_running_or_notify_cancel()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._complete(key, fut, exc=e)
+            raise
+        self._complete(key, fut, result=result)
+        return result
+
+    def abandon(self, key: str, fut: Future, exc: BaseException) -> bool:
+        """
+        Fail a leader's future whose call has not started, so waiters and later
+        callers move on. A call already running completes the future itself.
+        """
+        with self._lock:
+            if fut.done() or fut.running():
+                return False
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+            fut.set_exception(exc)
+        return True
+
+    def _complete(self, key: str, fut: Future, result=None, exc=None):
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def do(self, key: str, fn, *args):
+        fut, leader = self.begin(key)
+        if leader:
+            return self.run(key, fut, fn, *args)
+        try:
+            return fut.result(timeout=self.wait_s)
+        except FutureTimeout:
+            # The leader is stuck or was lost: stop sending callers to it and make the call here
+            with self._lock:
+                self._stats["wait_timeouts"] += 1
+                if self._calls.get(key) is fut:
+                    del self._calls[key]
+            return fn(*args)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["inflight"] = len(self._calls)
+            return out
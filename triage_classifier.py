@@ -0,0 +1,237 @@
+# triage_classifier.py
+# Small offline triage model: hashed word n-grams -> linear layers in NumPy.
+#
+# Predicts urgency (softmax over EMERGENCY/MODERATE/LOW) and recommended_actions
+# (one sigmoid per action). triageAgent answers high-confidence predictions
+# locally and falls back to it when Gemini is unavailable.
+#
+#   python triage_classifier.py train data/triage_examples.csv -o triage_model.npz
+#   python triage_classifier.py evaluate data/triage_examples.csv -m triage_model.npz
+#
+# `train` holds out --holdout of each urgency class (default 20%) and reports accuracy
+# on it; use those numbers, not training-set accuracy, to pick TRIAGE_*_CONFIDENCE.
+#
+# CSV columns: text, urgency, recommended_actions (separated by ";").
+import argparse
+import csv
+import re
+import sys
+import time
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+URGENCIES = ["EMERGENCY", "MODERATE", "LOW"]
+ACTIONS = ["emergency", "pharmacy", "consult_doctor", "self_care"]
+DEFAULT_FEATURES = 2 ** 16
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def hashed_features(text: str, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sparse (indices, values) of L2-normalized word unigram+bigram counts."""
+    tokens = _TOKEN.findall(text.casefold())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    counts: Dict[int, float] = {}
+    for g in grams:
+        h = zlib.crc32(g.encode("utf-8")) % n_features
+        counts[h] = counts.get(h, 0.0) + 1.0
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    val = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    val /= np.linalg.norm(val)
+    return idx, val
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    e = np.exp(z - z.max())
+    return e / e.sum()
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class LocalTriageModel:
+    def __init__(self, n_features: int = DEFAULT_FEATURES):
+        self.n_features = n_features
+        self.w_urgency = np.zeros((len(URGENCIES), n_features), dtype=np.float32)
+        self.b_urgency = np.zeros(len(URGENCIES), dtype=np.float32)
+        self.w_actions = np.zeros((len(ACTIONS), n_features), dtype=np.float32)
+        self.b_actions = np.zeros(len(ACTIONS), dtype=np.float32)
+
+    # --- inference ---
+    def predict_proba(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        idx, val = hashed_features(text, self.n_features)
+        p_urgency = _softmax(self.w_urgency[:, idx] @ val + self.b_urgency)
+        p_actions = _sigmoid(self.w_actions[:, idx] @ val + self.b_actions)
+        return p_urgency, p_actions
+
+    def predict(self, text: str) -> Tuple[Dict, float]:
+        """Return (triage dict in the /triage shape, urgency confidence)."""
+        p_urgency, p_actions = self.predict_proba(text)
+        k = int(p_urgency.argmax())
+        actions = [a for a, p in zip(ACTIONS, p_actions) if p >= 0.5] or [ACTIONS[int(p_actions.argmax())]]
+        return {
+            "urgency": URGENCIES[k],
+            "possible_conditions": [],
+            "recommended_actions": actions,
+            "explanation": "Assessed by the offline triage model; please seek care if symptoms worsen."
+        }, float(p_urgency[k])
+
+    # --- training ---
+    def fit(self, texts: List[str], urgencies: List[str], actions: List[List[str]],
+            epochs: int = 20, lr: float = 0.5, l2: float = 1e-5, seed: int = 0):
+        feats = [hashed_features(t, self.n_features) for t in texts]
+        y_u = np.array([URGENCIES.index(u) for u in urgencies])
+        y_a = np.array([[1.0 if a in acts else 0.0 for a in ACTIONS] for acts in actions], dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            step = lr / (1.0 + epoch)
+            for i in rng.permutation(len(feats)):
+                idx, val = feats[i]
+                # Softmax cross-entropy for urgency
+                g_u = _softmax(self.w_urgency[:, idx] @ val + self.b_urgency)
+                g_u[y_u[i]] -= 1.0
+                self.w_urgency[:, idx] -= step * (np.outer(g_u, val) + l2 * self.w_urgency[:, idx])
+                self.b_urgency -= step * g_u
+                # Independent logistic losses for actions
+                g_a = _sigmoid(self.w_actions[:, idx] @ val + self.b_actions) - y_a[i]
+                self.w_actions[:, idx] -= step * (np.outer(g_a, val) + l2 * self.w_actions[:, idx])
+                self.b_actions -= step * g_a
+        return self
+
+    # --- persistence ---
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            n_features=np.array(self.n_features),
+            urgencies=np.array(URGENCIES),
+            actions=np.array(ACTIONS),
+            w_urgency=self.w_urgency, b_urgency=self.b_urgency,
+            w_actions=self.w_actions, b_actions=self.b_actions,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalTriageModel":
+        data = np.load(path)
+        if list(data["urgencies"]) != URGENCIES or list(data["actions"]) != ACTIONS:
+            raise ValueError(f"{path} was trained with different labels")
+        model = cls(int(data["n_features"]))
+        model.w_urgency, model.b_urgency = data["w_urgency"], data["b_urgency"]
+        model.w_actions, model.b_actions = data["w_actions"], data["b_actions"]
+        return model
+
+
+def read_csv(path: str):
+    texts, urgencies, actions = [], [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            text = (row.get("text") or "").strip()
+            urgency = (row.get("urgency") or "").strip().upper()
+            if not text or urgency not in URGENCIES:
+                continue
+            texts.append(text)
+            urgencies.append(urgency)
+            acts = [a.strip() for a in (row.get("recommended_actions") or "").split(";")]
+            actions.append([a for a in acts if a in ACTIONS])
+    return texts, urgencies, actions
+
+
+def split_holdout(texts, urgencies, actions, fraction: float = 0.2, seed: int = 0):
+    """Stratified (train, held-out) split; each is a (texts, urgencies, actions) triple."""
+    rng = np.random.default_rng(seed)
+    held = set()
+    for label in URGENCIES:
+        rows = [i for i, u in enumerate(urgencies) if u == label]
+        n = int(round(len(rows) * fraction))
+        held.update(int(i) for i in rng.permutation(rows)[:n])
+
+    def pick(keep):
+        rows = [i for i in range(len(texts)) if (i in held) == keep]
+        return [texts[i] for i in rows], [urgencies[i] for i in rows], [actions[i] for i in rows]
+
+    return pick(False), pick(True)
+
+
+def print_report(report: Dict):
+    print(f"Examples: {report['examples']}")
+    print(f"Urgency accuracy: {report['urgency_accuracy']}  actions exact match: {report['actions_exact_match']}")
+    print("Confusion (rows = true, cols = predicted, order " + "/".join(URGENCIES) + "):")
+    for label, row in zip(URGENCIES, report["confusion"]):
+        print(f"  {label:<9} {row}")
+    print("Coverage / accuracy by confidence threshold (TRIAGE_LOCAL_CONFIDENCE, TRIAGE_FALLBACK_CONFIDENCE):")
+    for t, r in report["by_confidence"].items():
+        print(f"  >= {t:<4}  coverage {r['coverage']:<6} accuracy {r['accuracy']}")
+    print(f"Prediction latency: {report['predict_us']} us/example")
+
+
+def evaluate(model: LocalTriageModel, texts, urgencies, actions) -> Dict:
+    confusion = np.zeros((len(URGENCIES), len(URGENCIES)), dtype=int)
+    scored = []  # (confidence, correct)
+    action_hits = 0
+    start = time.perf_counter()
+    for text, u, acts in zip(texts, urgencies, actions):
+        pred, conf = model.predict(text)
+        confusion[URGENCIES.index(u), URGENCIES.index(pred["urgency"])] += 1
+        scored.append((conf, pred["urgency"] == u))
+        action_hits += set(pred["recommended_actions"]) == set(acts)
+    elapsed = time.perf_counter() - start
+    n = max(1, len(texts))
+
+    thresholds = {}
+    for t in (0.5, 0.7, 0.8, 0.9, 0.95):
+        kept = [ok for conf, ok in scored if conf >= t]
+        thresholds[t] = {
+            "coverage": round(len(kept) / n, 3),
+            "accuracy": round(sum(kept) / len(kept), 3) if kept else None,
+        }
+    return {
+        "examples": len(texts),
+        "urgency_accuracy": round(float(np.trace(confusion)) / n, 3),
+        "actions_exact_match": round(action_hits / n, 3),
+        "confusion": confusion.tolist(),
+        "by_confidence": thresholds,
+        "predict_us": round(elapsed / n * 1e6, 1),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Train or evaluate the offline triage model")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    tr = sub.add_parser("train")
+    tr.add_argument("csv")
+    tr.add_argument("-o", "--output", default="triage_model.npz")
+    tr.add_argument("--features", type=int, default=DEFAULT_FEATURES)
+    tr.add_argument("--epochs", type=int, default=20)
+    tr.add_argument("--lr", type=float, default=0.5)
+    tr.add_argument("--holdout", type=float, default=0.2, help="fraction held out for evaluation (0 = none)")
+    ev = sub.add_parser("evaluate")
+    ev.add_argument("csv")
+    ev.add_argument("-m", "--model", default="triage_model.npz")
+    args = ap.parse_args(argv)
+
+    texts, urgencies, actions = read_csv(args.csv)
+    if not texts:
+        sys.exit(f"No usable rows in {args.csv}")
+
+    if args.cmd == "train":
+        train, held = split_holdout(texts, urgencies, actions, args.holdout) if args.holdout > 0 else (
+            (texts, urgencies, actions), ([], [], []))
+        start = time.perf_counter()
+        model = LocalTriageModel(args.features).fit(*train, epochs=args.epochs, lr=args.lr)
+        model.save(args.output)
+        print(f"Trained on {len(train[0])} examples in {time.perf_counter() - start:.1f}s -> {args.output}")
+        print(f"Training-set urgency accuracy: {evaluate(model, *train)['urgency_accuracy']}")
+        if held[0]:
+            print(f"Held-out evaluation ({len(held[0])} examples, not trained on):")
+            print_report(evaluate(model, *held))
+        return
+
+    print_report(evaluate(LocalTriageModel.load(args.model), texts, urgencies, actions))
+
+
+if __name__ == "__main__":
+    main()